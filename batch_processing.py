@@ -5,20 +5,26 @@ import subprocess
 import click
 import yaml
 
+from runtime_prediction import (RuntimePredictor, load_history,
+                                get_run_priorities)
+
 
 class SafeDict(dict):
     def __missing__(self, key):
         return '{' + key + '}'
 
 
-def write_onejob_file(config,
-                      scratch_folder):
+def get_submit_lines(config,
+                     scratch_folder):
     process_name = '{dataset_number}_{step_name}'.format(**config)
     resources_cfg = config['resources']
 
     lines = []
     lines.append('processname = $(run).{}'.format(process_name))
     lines.append('executable = $(script_file)')
+    if config.get('array_job', False):
+        # a single job script for all runs, which expects the run number
+        lines.append('arguments = $(run)')
     lines.append('getenv         = false')
     log_dir = os.path.join(scratch_folder, 'logs')
     if not os.path.isdir(log_dir):
@@ -71,9 +77,15 @@ def write_onejob_file(config,
         if requirement_line[-3:] == ' &&':
             requirement_line = requirement_line[:-3]
         lines.append(requirement_line)
+    return lines
 
+
+def write_onejob_file(config,
+                      scratch_folder,
+                      onejob_name='OneJob.submit'):
+    lines = get_submit_lines(config, scratch_folder)
     lines.append('queue')
-    onejob_file = os.path.join(scratch_folder, 'OneJob.submit')
+    onejob_file = os.path.join(scratch_folder, onejob_name)
     with open(onejob_file, 'w') as open_file:
         for line in lines:
             open_file.write(line + '\n')
@@ -104,12 +116,28 @@ def write_config_file(config,
     return config_file
 
 
+def get_priorities(step_jobs):
+    """Get the DAGMan priorities of the runs, longest runs first.
+
+    The runtimes are predicted from the telemetry files matching the
+    `runtime_history` patterns of the config of the first step and from
+    the sizes of the input files. Without `runtime_history` no priorities
+    are set and the inputs are not touched.
+    """
+    patterns = step_jobs[0][0].get('runtime_history', None) or []
+    if not patterns:
+        return {}
+    predictor = RuntimePredictor(load_history(patterns))
+    return get_run_priorities(step_jobs, predictor)
+
+
 def write_option_file(config,
                       script_files,
                       run_numbers,
                       job_file,
                       scratch_folder):
     process_name = '{dataset_number}_{step_name}'.format(**config)
+    priorities = get_priorities([(config, script_files, run_numbers)])
 
     lines = []
     for i, script_i in zip(run_numbers, script_files):
@@ -117,6 +145,9 @@ def write_option_file(config,
         lines.append('JOB {} {}'.format(job_name, job_file))
         lines.append('VARS {} script_file="{}" run="{}"'.format(
             job_name, script_i, i))
+        if (config['step'], i) in priorities:
+            lines.append('PRIORITY {} {}'.format(
+                job_name, priorities[(config['step'], i)]))
 
     option_file = os.path.join(scratch_folder, 'dagman.options')
     with open(option_file, 'w') as open_file:
@@ -145,34 +176,428 @@ def create_dagman_files(config,
     os.chmod(run_script, st.st_mode | stat.S_IEXEC)
 
 
-def adjust_resouces(config, script_files, scratch_folder):
+def get_step_category(config):
     resources_cfg = config['resources']
-    if resources_cfg['gpu_steps'] is not None:
-        if config['step_number'] not in config['gpu_steps'].keys():
-            resources_cfg['gpu_steps'][config['step_number']] = 0
-    if resources_cfg['memory'] is not None:
-        if config['step_number'] not in config['memory'].keys():
-            resources_cfg['memory'][config['step_number']] = '1gb'
-    if resources_cfg['cpu_steps'] is not None:
-        if config['step_number'] in config['cpu_steps'].keys():
-            resources_cfg['cpu_steps'][config['step_number']] = 1
-    if resources_cfg['walltime'] is not None:
-        if config['step_number'] in config['walltime'].keys():
-            resources_cfg['walltime'][config['step_number']] = 1
-
-    config.update({
-        'memory': resources_cfg['memory'][config['step_number']],
-        'cpus': resources_cfg['memory'][config['step_number']],
-        'gpus': resources_cfg['memory'][config['step_number']],
-        'walltime': resources_cfg['walltime'][config['step_number']]})
+    if resources_cfg['gpus'] is not None:
+        if resources_cfg['gpus'].get(config['step'], 0) > 0:
+            return 'GPU'
+    return 'CPU'
+
+
+def write_chain_dag_file(step_jobs,
+                         scratch_folder):
+    config = step_jobs[0][0]
+    priorities = get_priorities(step_jobs)
+    lines = []
+    edges = []
+    nodes = {}
+    for step_config, script_files, run_numbers in step_jobs:
+        step = step_config['step']
+        job_file = write_onejob_file(
+            step_config, scratch_folder,
+            onejob_name='OneJob_step{}.submit'.format(step))
+        category = get_step_category(step_config)
+        previous_step = step_config['previous_step']
+        for i, script_i in zip(run_numbers, script_files):
+            job_name = '{}_step{}'.format(i, step)
+            lines.append('JOB {} {}'.format(job_name, job_file))
+            lines.append('VARS {} script_file="{}" run="{}"'.format(
+                job_name, script_i, i))
+            lines.append('CATEGORY {} {}'.format(job_name, category))
+            if (step, i) in priorities:
+                lines.append('PRIORITY {} {}'.format(
+                    job_name, priorities[(step, i)]))
+            nodes[(step, i)] = job_name
+            # runs of the previous step that are not part of the DAG,
+            # e.g. because their output exists, do not need to be waited for
+            if (previous_step, i) in nodes:
+                edges.append('PARENT {} CHILD {}'.format(
+                    nodes[(previous_step, i)], job_name))
+    lines.extend(edges)
+    if 'dagman_max_gpu_jobs' in config.keys():
+        lines.append('MAXJOBS GPU {}'.format(config['dagman_max_gpu_jobs']))
+    if 'dagman_max_cpu_jobs' in config.keys():
+        lines.append('MAXJOBS CPU {}'.format(config['dagman_max_cpu_jobs']))
+
+    dag_file = os.path.join(scratch_folder, 'dagman.options')
+    with open(dag_file, 'w') as open_file:
+        for line in lines:
+            open_file.write(line + '\n')
+    return dag_file
+
+
+def create_chain_dagman_files(step_jobs,
+                              scratch_folder):
+    """Write a single DAG for several steps of a processing chain.
+
+    Each run of a step is a node of the DAG and depends on the same run of
+    the previous step, so a run enters the next step as soon as its own
+    previous step finished. GPU and CPU steps are put into the categories
+    'GPU' and 'CPU', which are throttled by `dagman_max_gpu_jobs` and
+    `dagman_max_cpu_jobs`. Runs with the longest predicted remaining
+    runtime get the highest priority.
+
+    Parameters
+    ----------
+    step_jobs : list of tuple
+        The config, the script files and the run numbers of each step.
+        Dagman options are taken from the config of the first step.
+    scratch_folder : str
+        The folder for the DAG files.
+    """
+    config_file = write_config_file(step_jobs[0][0], scratch_folder)
+    dag_file = write_chain_dag_file(step_jobs, scratch_folder)
+    cmd = 'condor_submit_dag -config {} -notification Complete {}'.format(
+        config_file, dag_file)
+    run_script = os.path.join(scratch_folder, 'start_dagman.sh')
+    with open(run_script, 'w') as open_file:
+        open_file.write(cmd)
+    st = os.stat(run_script)
+    os.chmod(run_script, st.st_mode | stat.S_IEXEC)
+
+
+def write_manifest_file(script_files,
+                        run_numbers,
+                        scratch_folder,
+                        manifest_name='manifest.txt'):
+    manifest_file = os.path.join(scratch_folder, manifest_name)
+    with open(manifest_file, 'w') as open_file:
+        for i, script_i in zip(run_numbers, script_files):
+            open_file.write('{} {}\n'.format(script_i, i))
+    return manifest_file
+
+
+def write_queue_submit_file(config,
+                            manifest_file,
+                            scratch_folder):
+    lines = get_submit_lines(config, scratch_folder)
+    if config.get('condor_max_retries', None):
+        lines.append('max_retries = {}'.format(config['condor_max_retries']))
+    if config.get('condor_max_materialize', None):
+        lines.append('max_materialize = {}'.format(
+            config['condor_max_materialize']))
+    lines.append('queue script_file, run from {}'.format(manifest_file))
+    submit_file = os.path.join(scratch_folder, 'jobs.submit')
+    with open(submit_file, 'w') as open_file:
+        for line in lines:
+            open_file.write(line + '\n')
+    return submit_file
+
+
+def create_condor_files(config,
+                        script_files,
+                        run_numbers,
+                        scratch_folder):
+    """Write a single HTCondor submit file for all runs of a step.
+
+    Instead of one DAG node per run, all jobs are queued from a manifest
+    with one line per run. The jobs of a step do not depend on each
+    other, so no DAG is needed. Failed jobs are retried up to
+    `condor_max_retries` times and at most `condor_max_materialize` jobs
+    are materialized in the schedd at any time.
+    """
+    manifest_file = write_manifest_file(script_files,
+                                        run_numbers,
+                                        scratch_folder)
+    submit_file = write_queue_submit_file(config,
+                                          manifest_file,
+                                          scratch_folder)
+    cmd = 'condor_submit {}'.format(submit_file)
+    run_script = os.path.join(scratch_folder, 'start_condor.sh')
+    with open(run_script, 'w') as open_file:
+        open_file.write(cmd)
+    st = os.stat(run_script)
+    os.chmod(run_script, st.st_mode | stat.S_IEXEC)
+
+
+def adjust_resources(config):
+    """Set the resources of the step as 'memory', 'cpus', 'gpus' and
+    'walltime' in the config.
+
+    Steps without an entry in `config['resources']` get 1gb of memory,
+    1 cpu, 0 gpus and a walltime of 1h. The walltime is given in hours
+    and converted to hh:mm:ss.
+    """
+    resources_cfg = config['resources']
+    step = config['step']
+    resources = {'memory': '1gb', 'cpus': 1, 'gpus': 0, 'walltime': 1}
+    for key in resources.keys():
+        if resources_cfg.get(key, None) is not None:
+            if step in resources_cfg[key].keys():
+                resources[key] = resources_cfg[key][step]
+    walltime = int(round(float(resources['walltime']) * 3600))
+    resources['walltime'] = '{:02d}:{:02d}:{:02d}'.format(
+        walltime // 3600, walltime % 3600 // 60, walltime % 60)
+    config.update(resources)
     return config
 
 
+def write_pbs_array_file(config,
+                         manifest_file,
+                         scratch_folder):
+    process_name = '{dataset_number}_{step_name}'.format(**config)
+    log_dir = os.path.join(scratch_folder, 'logs')
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+
+    node_line = '#PBS -l nodes=1:ppn={}'.format(config['cpus'])
+    if config['gpus'] > 0:
+        node_line += ':gpus={}'.format(config['gpus'])
+    lines = ['#!/bin/bash',
+             '#PBS -N {}'.format(process_name),
+             '#PBS -S /bin/bash',
+             node_line,
+             '#PBS -l mem={}'.format(config['memory']),
+             '#PBS -l walltime={}'.format(config['walltime']),
+             '#PBS -o {}'.format(log_dir),
+             '#PBS -e {}'.format(log_dir)]
+    if 'pbs_queue' in config.keys():
+        lines.append('#PBS -q {}'.format(config['pbs_queue']))
+    # the array index is the line of the run in the manifest
+    lines.extend([
+        'INDEX=${PBS_ARRAYID:-${PBS_ARRAY_INDEX}}',
+        'read SCRIPT_FILE RUN < <(sed -n "$(( INDEX + 1 ))p" {})'.format(
+            manifest_file),
+        'if [ -z "${SCRIPT_FILE}" ]; then',
+        '    echo "No run found for array index ${INDEX}!"',
+        '    exit 1',
+        'fi',
+        'exec "${SCRIPT_FILE}" "${RUN}"'])
+    array_file = os.path.join(scratch_folder, 'pbs_array_job.sh')
+    with open(array_file, 'w') as open_file:
+        for line in lines:
+            open_file.write(line + '\n')
+    st = os.stat(array_file)
+    os.chmod(array_file, st.st_mode | stat.S_IEXEC)
+    return array_file
+
+
 def create_pbs_files(config,
                      script_files,
                      run_numbers,
                      scratch_folder):
-    pass
+    """Write a PBS/Torque array job for all runs of a step.
+
+    The runs are listed in a manifest and the array job executes the
+    script of the run in the line given by the array index. Arrays are
+    limited to `pbs_max_array_size` runs, so large datasets are submitted
+    as several arrays by start_pbs.sh. At most `pbs_max_running` jobs of
+    each array run at the same time.
+    """
+    config = adjust_resources(config)
+    if 'pbs_max_array_size' in config.keys():
+        max_array_size = config['pbs_max_array_size']
+    else:
+        max_array_size = 1000
+    if 'pbs_max_running' in config.keys():
+        max_running = config['pbs_max_running']
+    else:
+        max_running = 500
+    manifest_file = write_manifest_file(script_files,
+                                        run_numbers,
+                                        scratch_folder)
+    array_file = write_pbs_array_file(config, manifest_file, scratch_folder)
+
+    lines = ['#!/bin/bash']
+    for start in range(0, len(run_numbers), max_array_size):
+        stop = min(start + max_array_size, len(run_numbers)) - 1
+        lines.append('qsub -t {}-{}%{} {}'.format(
+            start, stop, max_running, array_file))
+    run_script = os.path.join(scratch_folder, 'start_pbs.sh')
+    with open(run_script, 'w') as open_file:
+        for line in lines:
+            open_file.write(line + '\n')
+    st = os.stat(run_script)
+    os.chmod(run_script, st.st_mode | stat.S_IEXEC)
+
+
+def get_slurm_memory(memory):
+    # '6gb' -> '6G', sbatch only accepts the unit prefix
+    memory = str(memory).strip()
+    if memory[-1:] in 'bB':
+        memory = memory[:-1]
+    return memory.upper()
+
+
+def get_array_chunks(run_numbers, max_array_size):
+    """Split runs into job arrays with task ids below max_array_size.
+
+    The runs are grouped by run_number // max_array_size. The task id is
+    the run number relative to the first run of the group, so the same
+    run has the same task id in the arrays of all steps.
+
+    Returns
+    -------
+    list of tuple
+        The run offset and the array specification, e.g. '0-5,7', of each
+        job array.
+    """
+    chunks = []
+    for run in sorted(run_numbers):
+        offset = run // max_array_size * max_array_size
+        task_id = run - offset
+        if not chunks or chunks[-1][0] != offset:
+            chunks.append((offset, [[task_id, task_id]]))
+        elif chunks[-1][1][-1][1] == task_id - 1:
+            chunks[-1][1][-1][1] = task_id
+        else:
+            chunks[-1][1].append([task_id, task_id])
+    array_chunks = []
+    for offset, ranges in chunks:
+        spec = ','.join(str(start) if start == stop else
+                        '{}-{}'.format(start, stop)
+                        for start, stop in ranges)
+        array_chunks.append((offset, spec))
+    return array_chunks
+
+
+def write_slurm_array_file(config,
+                           manifest_file,
+                           scratch_folder,
+                           array_name='slurm_array_job.sh'):
+    config = adjust_resources(config)
+    process_name = '{dataset_number}_{step_name}'.format(**config)
+    log_dir = os.path.join(scratch_folder, 'logs')
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+
+    lines = ['#!/bin/bash',
+             '#SBATCH --job-name={}'.format(process_name),
+             '#SBATCH --cpus-per-task={}'.format(config['cpus']),
+             '#SBATCH --mem={}'.format(get_slurm_memory(config['memory'])),
+             '#SBATCH --time={}'.format(config['walltime']),
+             '#SBATCH --output={}/%x_%A_%a.out'.format(log_dir),
+             '#SBATCH --error={}/%x_%A_%a.err'.format(log_dir)]
+    if config['gpus'] > 0:
+        lines.append('#SBATCH --gres=gpu:{}'.format(config['gpus']))
+    if 'slurm_partition' in config.keys():
+        lines.append('#SBATCH --partition={}'.format(
+            config['slurm_partition']))
+    lines.extend([
+        'RUN=$(( SLURM_ARRAY_TASK_ID + ${RUN_OFFSET:-0} ))',
+        'SCRIPT_FILE=$(awk -v run=${{RUN}} \'$2 == run {{print $1}}\' '
+        '{})'.format(manifest_file),
+        'if [ -z "${SCRIPT_FILE}" ]; then',
+        '    echo "No script found for run ${RUN}!"',
+        '    exit 1',
+        'fi',
+        # the job templates use PBS_JOBID and _CONDOR_SCRATCH_DIR to
+        # detect batch jobs and to find their scratch folder
+        'export PBS_JOBID=${SLURM_ARRAY_JOB_ID}_${SLURM_ARRAY_TASK_ID}',
+        'export _CONDOR_SCRATCH_DIR=${TMPDIR:-/tmp}/${PBS_JOBID}',
+        'mkdir -p "${_CONDOR_SCRATCH_DIR}"',
+        '"${SCRIPT_FILE}" "${RUN}"',
+        'RC=$?',
+        'rm -rf "${_CONDOR_SCRATCH_DIR}"',
+        'exit ${RC}'])
+    array_file = os.path.join(scratch_folder, array_name)
+    with open(array_file, 'w') as open_file:
+        for line in lines:
+            open_file.write(line + '\n')
+    st = os.stat(array_file)
+    os.chmod(array_file, st.st_mode | stat.S_IEXEC)
+    return array_file
+
+
+def get_sbatch_lines(config,
+                     script_files,
+                     run_numbers,
+                     scratch_folder,
+                     step_label='',
+                     parent_label=None):
+    """Write the files of one step and get the sbatch calls for them.
+
+    Each job array is submitted with --parsable and its job id is stored
+    in the shell variable JOB{step_label}_{offset}. If parent_label is
+    given, the arrays wait for the corresponding task of the array with
+    the same offset of the parent step (--dependency=aftercorr).
+    """
+    if 'slurm_max_array_size' in config.keys():
+        max_array_size = config['slurm_max_array_size']
+    else:
+        max_array_size = 1000
+    if 'slurm_max_running' in config.keys():
+        max_running = config['slurm_max_running']
+    else:
+        max_running = 500
+    manifest_file = write_manifest_file(
+        script_files, run_numbers, scratch_folder,
+        manifest_name='manifest{}.txt'.format(step_label))
+    array_file = write_slurm_array_file(
+        config, manifest_file, scratch_folder,
+        array_name='slurm_array_job{}.sh'.format(step_label))
+
+    lines = []
+    for offset, spec in get_array_chunks(run_numbers, max_array_size):
+        job_var = 'JOB{}_{}'.format(step_label, offset)
+        options = '--parsable --array={}%{} --export=ALL,RUN_OFFSET={}'.format(
+            spec, max_running, offset)
+        parent_var = 'JOB{}_{}'.format(parent_label, offset)
+        if parent_label is not None:
+            options += ' ${{{0}:+--dependency=aftercorr:${{{0}}}}}'.format(
+                parent_var)
+        lines.append('{}=$(sbatch {} {})'.format(job_var, options, array_file))
+        # --parsable prints 'jobid[;cluster]'
+        lines.append('{0}=${{{0}%%;*}}'.format(job_var))
+        lines.append('echo "Submitted ${{{}}}: runs {} + [{}]"'.format(
+            job_var, offset, spec))
+    return lines
+
+
+def write_start_slurm_file(lines, scratch_folder):
+    run_script = os.path.join(scratch_folder, 'start_slurm.sh')
+    with open(run_script, 'w') as open_file:
+        open_file.write('#!/bin/bash\n')
+        for line in lines:
+            open_file.write(line + '\n')
+    st = os.stat(run_script)
+    os.chmod(run_script, st.st_mode | stat.S_IEXEC)
+
+
+def create_slurm_files(config,
+                       script_files,
+                       run_numbers,
+                       scratch_folder):
+    """Write Slurm array jobs for all runs of a step.
+
+    The resources of the step are mapped to --cpus-per-task, --mem,
+    --time and --gres. The task id of a run is its run number modulo
+    `slurm_max_array_size`, the runs are split into several arrays if
+    needed. At most `slurm_max_running` tasks of each array run at the
+    same time.
+    """
+    lines = get_sbatch_lines(config, script_files, run_numbers,
+                             scratch_folder)
+    write_start_slurm_file(lines, scratch_folder)
+
+
+def create_chain_slurm_files(step_jobs,
+                             scratch_folder):
+    """Write Slurm array jobs for several steps of a processing chain.
+
+    The arrays of a step depend on the arrays of its previous step with
+    --dependency=aftercorr, so each run starts a step as soon as the same
+    run finished the previous step.
+
+    Parameters
+    ----------
+    step_jobs : list of tuple
+        The config, the script files and the run numbers of each step.
+    scratch_folder : str
+        The folder for the Slurm files.
+    """
+    lines = []
+    steps = [step_config['step'] for step_config, _, _ in step_jobs]
+    for step_config, script_files, run_numbers in step_jobs:
+        if step_config['previous_step'] in steps:
+            parent_label = '_step{}'.format(step_config['previous_step'])
+        else:
+            parent_label = None
+        lines.extend(get_sbatch_lines(
+            step_config, script_files, run_numbers, scratch_folder,
+            step_label='_step{}'.format(step_config['step']),
+            parent_label=parent_label))
+    write_start_slurm_file(lines, scratch_folder)
 
 
 @click.command()
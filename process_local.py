@@ -4,12 +4,227 @@ import glob
 import signal
 import sys
 import copy
+import json
+import math
+import time
+import asyncio
+from collections import deque
 
 import click
+import yaml
+
+from runtime_prediction import (RuntimePredictor, load_history,
+                                get_run_number, get_input_size,
+                                get_input_sizes)
+
+# resources of a job if nothing is set for its step
+DEFAULT_JOB_RESOURCES = {'cpus': 1, 'memory': '1gb', 'gpus': 0}
+MEMORY_UNITS = {'kb': 1. / 1024, 'mb': 1., 'gb': 1024., 'tb': 1024. ** 2}
+TELEMETRY_FILE = 'telemetry.jsonl'
+
+
+def parse_memory(memory):
+    """Convert a memory string like '6gb' to MB.
+
+    Numbers without a unit are MB, as for HTCondor's request_memory.
+    """
+    if isinstance(memory, (int, float)):
+        return float(memory)
+    memory = memory.strip().lower()
+    for unit, factor in MEMORY_UNITS.items():
+        if memory.endswith(unit):
+            return float(memory[:-len(unit)]) * factor
+    return float(memory)
+
+
+def get_gpu_devices():
+    """Get the ids of the gpus visible to this process."""
+    if 'CUDA_VISIBLE_DEVICES' in os.environ:
+        devices = os.environ['CUDA_VISIBLE_DEVICES'].split(',')
+        return [d.strip() for d in devices if d.strip() != '']
+    devices = [int(d[len('/dev/nvidia'):])
+               for d in glob.glob('/dev/nvidia[0-9]*')]
+    return [str(d) for d in sorted(devices)]
+
+
+def get_available_resources():
+    """Get the cpus, the memory in MB and the gpus of this machine."""
+    memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    return {'cpus': os.cpu_count(),
+            'memory': memory / 1024. ** 2,
+            'gpus': len(get_gpu_devices())}
+
+
+def get_step_resources(config_file, overrides=None):
+    """Get the resources needed by the jobs of a step.
+
+    Parameters
+    ----------
+    config_file : str or None
+        The filled config of the step. If None, the defaults are used.
+    overrides : dict, optional
+        Resources replacing the ones of the config.
+
+    Returns
+    -------
+    dict
+        The 'cpus', the 'memory' in MB and the 'gpus' needed by a job.
+    """
+    resources = dict(DEFAULT_JOB_RESOURCES)
+    if config_file is not None:
+        with open(config_file, 'r') as stream:
+            config = yaml.full_load(stream)
+        resources_cfg = config.get('resources', None) or {}
+        for key in resources.keys():
+            if resources_cfg.get(key, None) is not None:
+                if config['step'] in resources_cfg[key].keys():
+                    resources[key] = resources_cfg[key][config['step']]
+    if overrides is not None:
+        resources.update({key: value for key, value in overrides.items()
+                          if value is not None})
+    resources['memory'] = parse_memory(resources['memory'])
+    return resources
+
+
+def find_config_file(job):
+    """Find the filled config next to the jobs folder of a job script."""
+    processing_folder = os.path.dirname(os.path.dirname(job))
+    for config_file in sorted(glob.glob(
+            os.path.join(processing_folder, '*.yaml'))):
+        with open(config_file, 'r') as stream:
+            config = yaml.full_load(stream)
+        if isinstance(config, dict) and 'step' in config and \
+                'resources' in config:
+            return config_file
+    return None
+
+
+class ProcessGroupTelemetry(object):
+    """Resource usage of a process group sampled from /proc.
+
+    The samples are added by sample_process_groups. Processes are
+    identified by their pid and start time. CPU time and I/O of a process
+    are the last sampled values, so the usage of a process after its last
+    sample is missed.
+
+    Parameters
+    ----------
+    pgid : int
+        The id of the process group.
+    """
+    clock_ticks = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+
+    def __init__(self, pgid):
+        self.pgid = pgid
+        self.peak_rss = 0
+        self.cpu_times = {}
+        self.io_bytes = {}
+
+    def add_process(self, pid, fields):
+        """Add a sample of a process of the group.
+
+        Parameters
+        ----------
+        pid : str
+            The id of the process.
+        fields : list of str
+            The fields of /proc/[pid]/stat after the command.
+
+        Returns
+        -------
+        int
+            The RSS of the process in bytes.
+        """
+        process = (pid, fields[19])
+        self.cpu_times[process] = (int(fields[11]) / self.clock_ticks,
+                                   int(fields[12]) / self.clock_ticks)
+        try:
+            with open('/proc/{}/io'.format(pid)) as f:
+                io = dict(line.split(': ') for line in f)
+        except (IOError, OSError, ValueError):
+            io = None
+        if io is not None:
+            self.io_bytes[process] = (int(io['read_bytes']),
+                                      int(io['write_bytes']))
+        return int(fields[21]) * self.page_size
+
+    def get_summary(self):
+        """Get the peak RSS in MB, the user and system time in seconds and
+        the read and written bytes.
+        """
+        return {
+            'peak_rss': self.peak_rss / 1024. ** 2,
+            'user_time': sum(t[0] for t in self.cpu_times.values()),
+            'system_time': sum(t[1] for t in self.cpu_times.values()),
+            'read_bytes': sum(b[0] for b in self.io_bytes.values()),
+            'write_bytes': sum(b[1] for b in self.io_bytes.values())}
+
+
+def sample_process_groups(telemetries):
+    """Sample the processes of several process groups with one /proc scan.
+
+    Parameters
+    ----------
+    telemetries : dict
+        The ProcessGroupTelemetry of each process group id.
+    """
+    rss = {pgid: 0 for pgid in telemetries.keys()}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open('/proc/{}/stat'.format(pid)) as f:
+                stat = f.read()
+        except (IOError, OSError):
+            # the process ended
+            continue
+        # the command in parentheses may contain spaces
+        fields = stat[stat.rfind(')') + 2:].split()
+        pgid = int(fields[2])
+        if pgid in telemetries:
+            rss[pgid] += telemetries[pgid].add_process(pid, fields)
+    for pgid, telemetry in telemetries.items():
+        telemetry.peak_rss = max(telemetry.peak_rss, rss[pgid])
 
 
 class JobLogBook(object):
-    def __init__(self, n_jobs=1, log_dir=None):
+    """Run job scripts locally.
+
+    A job is started once enough cpus, memory and gpus are free and less
+    than `n_jobs` jobs are running. Jobs that do not fit are skipped for
+    now and later jobs that fit are started instead.
+
+    Each gpu can be shared by `jobs_per_gpu` jobs. A job gets the least
+    used gpus and CUDA_VISIBLE_DEVICES and GPU_DEVICE_ORDINAL are set to
+    their ids in its environment.
+
+    Parameters
+    ----------
+    n_jobs : int, optional
+        Maximal number of parallel jobs.
+    log_dir : str, optional
+        Folder for the job logs and the resume file.
+    resources : dict, optional
+        The available 'cpus', 'memory' in MB and 'gpus'. Defaults to the
+        resources of this machine.
+    job_resources : dict, optional
+        Resources of each job overriding the ones of the step configs.
+    gpu_devices : list of str, optional
+        The ids of the gpus to use. Defaults to the first
+        `resources['gpus']` visible gpus.
+    jobs_per_gpu : int, optional
+        Number of jobs sharing a gpu.
+    sample_interval : float, optional
+        Seconds between samples of the resource usage of the jobs. The
+        usage is written to telemetry.jsonl in `log_dir`.
+    predictor : RuntimePredictor, optional
+        If set, the jobs with the longest predicted runtime are started
+        first.
+    """
+    def __init__(self, n_jobs=1, log_dir=None, resources=None,
+                 job_resources=None, gpu_devices=None, jobs_per_gpu=1,
+                 sample_interval=2., predictor=None):
         self.log_dir = log_dir
         self.logbook = {}
         self.n_jobs = n_jobs
@@ -17,45 +232,204 @@ class JobLogBook(object):
         self.n_finished = 0
         self.log = []
         self._original_sigint = None
+        if resources is None:
+            resources = get_available_resources()
+        if gpu_devices is None:
+            gpu_devices = get_gpu_devices()
+            # more gpus than visible, e.g. if /dev/nvidia* is not present
+            gpu_devices += [str(i) for i in range(len(gpu_devices),
+                                                  resources['gpus'])]
+            gpu_devices = gpu_devices[:resources['gpus']]
+        self.resources = dict(resources, gpus=len(gpu_devices))
+        self.free = dict(self.resources)
+        self.gpu_slots = {device: jobs_per_gpu for device in gpu_devices}
+        self.sample_interval = sample_interval
+        self.predictor = predictor
+        self.job_resources = job_resources
+        self._step_resources = {}
+        self._step_configs = {}
+        self._telemetries = {}
+
+    def get_job_resources(self, job):
+        processing_folder = os.path.dirname(os.path.dirname(job))
+        if processing_folder not in self._step_resources:
+            self._step_resources[processing_folder] = get_step_resources(
+                find_config_file(job), self.job_resources)
+        needed = dict(self._step_resources[processing_folder])
+        # a job that needs more than the machine has runs alone
+        for key, value in needed.items():
+            needed[key] = min(value, self.resources[key])
+        return needed
+
+    def get_step_config(self, job):
+        processing_folder = os.path.dirname(os.path.dirname(job))
+        if processing_folder not in self._step_configs:
+            config = None
+            config_file = find_config_file(job)
+            if config_file is not None:
+                with open(config_file, 'r') as stream:
+                    config = yaml.full_load(stream)
+            self._step_configs[processing_folder] = config
+        return self._step_configs[processing_folder]
+
+    def get_job_input_size(self, job):
+        config = self.get_step_config(job)
+        if config is None:
+            return None
+        return get_input_size(config, get_run_number(job))
+
+    def order_jobs(self, binaries):
+        """Sort the jobs by their predicted runtime, longest first.
+
+        Jobs without history are sorted by the size of their input.
+        """
+        step_jobs = {}
+        for job in binaries:
+            step_jobs.setdefault(
+                os.path.dirname(os.path.dirname(job)), []).append(job)
+        sort_keys = {}
+        for processing_folder, jobs in step_jobs.items():
+            step = os.path.basename(processing_folder)
+            config = self.get_step_config(jobs[0])
+            input_sizes = {}
+            if config is not None:
+                input_sizes = get_input_sizes(
+                    config, [get_run_number(job) for job in jobs])
+            for job in jobs:
+                input_size = input_sizes.get(get_run_number(job), None)
+                runtime = self.predictor.predict(step, input_size, job)
+                sort_keys[job] = (runtime or 0, input_size or 0)
+        return sorted(binaries, key=sort_keys.get, reverse=True)
 
     def process(self, binaries):
+        if self.predictor is not None:
+            binaries = self.order_jobs(binaries)
         self.__binaries = copy.copy(binaries)
         click.echo('Processing {} with max. {} parralel jobs!'.format(
             len(binaries), self.n_jobs))
+        click.echo('Available resources: {cpus} cpus, {memory:.0f} MB, '
+                   '{gpus} gpus'.format(**self.resources))
+        if self.gpu_slots:
+            click.echo('Jobs per gpu: {}'.format(
+                max(self.gpu_slots.values())))
 
         with click.progressbar(length=len(binaries)) as bar:
             bar.update(self.n_finished)
-            for i, job in enumerate(binaries):
-                if os.path.isfile(job) and os.access(job, os.X_OK):
-                    self.__start_subprocess__(job)
-                else:
-                    click.echo('{} is not executable! (Skipped)'.format(job))
-                    self.n_finished += 1
-                    self.log.append([job, 'not_executable'])
-                    del self.__binaries[i]
-                if len(self.running_pid) >= self.n_jobs:
-                    self.__wait__(bar)
-            click.echo('\nAll Jobs started. Wait for last jobs to finish!')
-            while len(self.running_pid) > 0:
-                self.__wait__(bar)
-            bar.update(self.n_finished)
+            asyncio.run(self.__schedule__(binaries, bar))
         click.echo('Finished!')
         if self.log_dir is not None:
             self.__store__()
 
-    def __wait__(self, progressbar=None):
+    async def __schedule__(self, binaries, progressbar):
+        # the jobs of a processing folder need the same resources, so the
+        # remaining jobs of a step are skipped once one of them does not fit
+        pending = {}
+        for job in binaries:
+            if os.path.isfile(job) and os.access(job, os.X_OK):
+                processing_folder = os.path.dirname(os.path.dirname(job))
+                pending.setdefault(processing_folder, deque()).append(
+                    (job, self.get_job_resources(job)))
+            else:
+                click.echo('{} is not executable! (Skipped)'.format(job))
+                self.n_finished += 1
+                self.log.append([job, 'not_executable'])
+                self.__binaries.remove(job)
+                progressbar.update(1)
+
+        # a single task samples the resource usage of all running jobs
+        sampler = asyncio.ensure_future(self.__sample__())
+        try:
+            await self.__run_pending__(pending, progressbar)
+        finally:
+            sampler.cancel()
+
+    async def __sample__(self):
+        while True:
+            if self._telemetries:
+                sample_process_groups(self._telemetries)
+            await asyncio.sleep(self.sample_interval)
+
+    async def __run_pending__(self, pending, progressbar):
+        running = {}
+        while pending or running:
+            for processing_folder in list(pending.keys()):
+                if len(running) >= self.n_jobs:
+                    break
+                jobs = pending[processing_folder]
+                while jobs and len(running) < self.n_jobs and \
+                        self.__fits__(jobs[0][1]):
+                    job, needed = jobs.popleft()
+                    devices = self.__allocate__(needed)
+                    task = asyncio.ensure_future(
+                        self.__run_job__(job, devices))
+                    running[task] = (needed, devices)
+                if not jobs:
+                    del pending[processing_folder]
+                    if not pending:
+                        click.echo('\nAll Jobs started. Wait for last jobs '
+                                   'to finish!')
+            done, _ = await asyncio.wait(
+                running.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                self.__release__(*running.pop(task))
+                progressbar.update(1)
+                task.result()
+
+    def __fits__(self, needed):
+        # the gpus of a job have to be different devices
+        free_gpus = len([d for d, n in self.gpu_slots.items() if n > 0])
+        return free_gpus >= needed['gpus'] and \
+            all(self.free[key] >= needed[key] for key in ['cpus', 'memory'])
+
+    def __allocate__(self, needed):
+        for key in ['cpus', 'memory']:
+            self.free[key] -= needed[key]
+        devices = sorted(self.gpu_slots.keys(),
+                         key=lambda d: -self.gpu_slots[d])[:needed['gpus']]
+        for device in devices:
+            self.gpu_slots[device] -= 1
+        return devices
+
+    def __release__(self, needed, devices):
+        for key in ['cpus', 'memory']:
+            self.free[key] += needed[key]
+        for device in devices:
+            self.gpu_slots[device] += 1
+
+    async def __run_job__(self, job, devices):
+        start_time = time.time()
+        sub_process = await self.__start_subprocess__(job, devices)
+        # the job is the leader of its own process group (os.setpgrp)
+        telemetry = ProcessGroupTelemetry(sub_process.pid)
+        self._telemetries[sub_process.pid] = telemetry
         try:
-            pid, exit_code = os.wait()
-        except OSError:
-            pid, exit_code = os.wait()
-        job_file = self.logbook[pid][1]
-        click.echo('\n{} finished with exit code {}'.format(
-            job_file, exit_code))
-        self.log.append([job_file, exit_code])
+            exit_code = await sub_process.wait()
+        finally:
+            del self._telemetries[sub_process.pid]
+        wall_time = time.time() - start_time
+        click.echo('\n{} finished with exit code {}'.format(job, exit_code))
+        self.log.append([job, exit_code])
         self.n_finished += 1
-        self.__clear_job__(pid)
-        if progressbar is not None:
-            progressbar.update(1)
+        self.__clear_job__(sub_process.pid)
+        if self.log_dir is not None:
+            self.__store_telemetry__(job, exit_code, start_time, wall_time,
+                                     telemetry)
+
+    def __store_telemetry__(self, job, exit_code, start_time, wall_time,
+                            telemetry):
+        processing_folder = os.path.dirname(os.path.dirname(job))
+        record = {'job': job,
+                  'step': os.path.basename(processing_folder),
+                  'exit_code': exit_code,
+                  'start_time': start_time,
+                  'wall_time': wall_time,
+                  'input_size': self.get_job_input_size(job)}
+        record.update(telemetry.get_summary())
+        if processing_folder in self._step_resources:
+            record['requested'] = self._step_resources[processing_folder]
+        path = os.path.join(self.log_dir, TELEMETRY_FILE)
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
 
     def __wait_rest__(self, save=False):
         click.echo('waiting for all subprocesses to finish')
@@ -69,11 +443,15 @@ class JobLogBook(object):
 
         for pid in self.running_pid:
             os.kill(pid, signal.SIGCONT)
-        while True:
+        for pid in list(self.running_pid):
+            job_file = self.logbook[pid][1]
             try:
-                self.__wait__()
-            except OSError:
-                break
+                _, exit_code = os.waitpid(pid, 0)
+            except ChildProcessError:
+                # already collected by the event loop
+                exit_code = ''
+            self.log.append([job_file, exit_code])
+            self.__clear_job__(pid)
         if save:
             self.__store__()
 
@@ -110,28 +488,36 @@ class JobLogBook(object):
         else:
             click.echo('Nothing to do!')
 
-    def __start_subprocess__(self, job):
+    async def __start_subprocess__(self, job, devices=None):
         job_name = os.path.basename(os.path.splitext(job)[0])
         if self.log_dir is not None:
             log_path = os.path.join(self.log_dir, '{}.log'.format(job_name))
             log_file = open(log_path, 'w')
         else:
             log_file = open(os.devnull, 'w')
-        sub_process = subprocess.Popen([job],
-                                       stdout=log_file,
-                                       stderr=subprocess.STDOUT,
-                                       preexec_fn=os.setpgrp)
+        env = None
+        if devices:
+            # read by CUDA/OpenCL and the ppc step, GPU_DEVICE_ORDINAL for
+            # AMD devices
+            env = dict(os.environ)
+            env['CUDA_VISIBLE_DEVICES'] = ','.join(devices)
+            env['GPU_DEVICE_ORDINAL'] = ','.join(devices)
+        sub_process = await asyncio.create_subprocess_exec(
+            job,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            env=env,
+            preexec_fn=os.setpgrp)
         self.logbook[sub_process.pid] = [sub_process,
                                          job,
                                          log_file]
         self.running_pid.append(sub_process.pid)
-        return sub_process.pid
+        return sub_process
 
     def __clear_job__(self, pid):
         sub_process, job, log_file = self.logbook[pid]
         self.running_pid.remove(pid)
-        if self.log_dir is not None:
-            log_file.close()
+        log_file.close()
         del self.logbook[pid]
 
     def register_sigint(self):
@@ -158,6 +544,87 @@ class JobLogBook(object):
         signal.signal(signal.SIGINT, exit_gracefully)
 
 
+def percentile(values, q):
+    """Get the q-th percentile of values by linear interpolation."""
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100.
+    lower = int(math.floor(position))
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower)
+
+
+def summarize_telemetry(records):
+    """Get the distributions of the resource usage of a step.
+
+    Parameters
+    ----------
+    records : list of dict
+        The telemetry of the successful jobs of the step.
+
+    Returns
+    -------
+    list of tuple
+        The name and the list of values of each quantity.
+    dict
+        Resources for the dataset config: 'memory' covering the peak RSS
+        of 99% of the jobs with 20% headroom, 'cpus' for the median cpu
+        usage and 'walltime' in hours for the longest job.
+    """
+    wall_time = [r['wall_time'] for r in records]
+    cpu_time = [r['user_time'] + r['system_time'] for r in records]
+    cpu_usage = [c / w if w > 0 else 0. for c, w in zip(cpu_time, wall_time)]
+    peak_rss = [r['peak_rss'] for r in records]
+    quantities = [
+        ('wall time [h]', [t / 3600. for t in wall_time]),
+        ('cpu time [h]', [t / 3600. for t in cpu_time]),
+        ('cpu usage', cpu_usage),
+        ('peak rss [GB]', [m / 1024. for m in peak_rss]),
+        ('read [GB]', [r['read_bytes'] / 1024. ** 3 for r in records]),
+        ('written [GB]', [r['write_bytes'] / 1024. ** 3 for r in records]),
+    ]
+    suggestion = {
+        'memory': '{}gb'.format(
+            int(math.ceil(percentile(peak_rss, 99) * 1.2 / 1024.))),
+        'cpus': max(1, int(math.ceil(percentile(cpu_usage, 50) - 0.1))),
+        'walltime': int(math.ceil(max(wall_time) / 3600.)),
+    }
+    return quantities, suggestion
+
+
+@click.command()
+@click.argument('telemetry_file', type=click.Path(exists=True))
+def telemetry_summary(telemetry_file):
+    """Show the resource usage of the jobs per step.
+
+    TELEMETRY_FILE is the telemetry.jsonl in the log dir of the local
+    processing.
+    """
+    steps = {}
+    with open(telemetry_file) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                steps.setdefault(record['step'], []).append(record)
+
+    columns = [('min', 0), ('median', 50), ('p90', 90), ('max', 100)]
+    for step, records in sorted(steps.items()):
+        successful = [r for r in records if r['exit_code'] == 0]
+        click.echo('\n{}: {} jobs ({} failed)'.format(
+            step, len(records), len(records) - len(successful)))
+        if not successful:
+            continue
+        quantities, suggestion = summarize_telemetry(successful)
+        click.echo('    {:<16}'.format('') + ''.join(
+            '{:>10}'.format(name) for name, _ in columns))
+        for name, values in quantities:
+            click.echo('    {:<16}'.format(name) + ''.join(
+                '{:>10.3f}'.format(percentile(values, q))
+                for _, q in columns))
+        click.echo('    suggested resources: memory: {memory}, '
+                   'cpus: {cpus}, walltime: {walltime}'.format(**suggestion))
+
+
 @click.command()
 @click.argument('path', type=click.Path(exists=True, resolve_path=True))
 @click.option('-j', '--n_jobs', default=1,
@@ -168,10 +635,60 @@ class JobLogBook(object):
               type=click.Path(resolve_path=True),
               help='Path to a dir where the stdout/stderr should be saved')
 @click.option('--resume/--no-resume', default=False)
-def main(path, binary_pattern, n_jobs, log_path, resume):
+@click.option('--cpus', default=None, type=int,
+              help='Number of cpus to use, default: all')
+@click.option('--memory', default=None,
+              help='Memory to use, e.g. 64gb, default: all')
+@click.option('--gpus', default=None, type=int,
+              help='Number of gpus to use, default: all visible gpus')
+@click.option('--gpu_devices', default=None,
+              help='Comma separated ids of the gpus to use, e.g. 0,2')
+@click.option('--jobs_per_gpu', default=1,
+              help='Number of jobs sharing a gpu')
+@click.option('--sample_interval', default=2.,
+              help='Seconds between samples of the resource usage of the '
+                   'jobs, which is written to telemetry.jsonl in the log '
+                   'dir')
+@click.option('--lpt/--no-lpt', default=True,
+              help='Start the jobs with the longest predicted runtime '
+                   'first, predicted from the telemetry in the log dir and '
+                   '--history or from the input sizes')
+@click.option('--history', multiple=True,
+              help='Glob pattern of telemetry files of earlier runs, can be '
+                   'given several times')
+@click.option('--job_cpus', default=None, type=int,
+              help='Cpus of each job, default: from the step config')
+@click.option('--job_memory', default=None,
+              help='Memory of each job, default: from the step config')
+@click.option('--job_gpus', default=None, type=int,
+              help='Gpus of each job, default: from the step config')
+def main(path, binary_pattern, n_jobs, log_path, resume, cpus, memory, gpus,
+         gpu_devices, jobs_per_gpu, sample_interval, lpt, history,
+         job_cpus, job_memory, job_gpus):
     path = os.path.abspath(path)
 
-    log_book = JobLogBook(n_jobs=n_jobs, log_dir=log_path)
+    resources = get_available_resources()
+    if cpus is not None:
+        resources['cpus'] = cpus
+    if memory is not None:
+        resources['memory'] = parse_memory(memory)
+    if gpus is not None:
+        resources['gpus'] = gpus
+    if gpu_devices is not None:
+        gpu_devices = [d.strip() for d in gpu_devices.split(',')
+                       if d.strip() != '']
+    job_resources = {'cpus': job_cpus, 'memory': job_memory, 'gpus': job_gpus}
+    predictor = None
+    if lpt:
+        patterns = list(history)
+        if log_path is not None:
+            patterns.append(os.path.join(log_path, TELEMETRY_FILE))
+        predictor = RuntimePredictor(load_history(patterns))
+    log_book = JobLogBook(n_jobs=n_jobs, log_dir=log_path,
+                          resources=resources, job_resources=job_resources,
+                          gpu_devices=gpu_devices, jobs_per_gpu=jobs_per_gpu,
+                          sample_interval=sample_interval,
+                          predictor=predictor)
     log_book.register_sigint()
     click.echo('Starting processing!')
     if resume:
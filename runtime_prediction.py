@@ -0,0 +1,227 @@
+import os
+import re
+import glob
+import json
+
+from steps.utils import get_run_folder
+
+# job scripts end with the run number or the first and last run of a bundle
+JOB_RUN_PATTERN = re.compile(r'_(\d+)(-\d+)?\.sh$')
+
+
+def get_run_number(job):
+    """Get the (first) run number of a job script from its name.
+
+    Returns
+    -------
+    int or None
+        The run number, None for array job scripts.
+    """
+    match = JOB_RUN_PATTERN.search(os.path.basename(job))
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def get_infile(config, run_number):
+    if run_number is None or config.get('infile_pattern', None) is None:
+        return None
+    infile = config['infile_pattern'].format(
+        run_number=run_number, run_folder=get_run_folder(run_number))
+    return infile.replace(' ', '0')
+
+
+def get_input_size(config, run_number):
+    """Get the size of the input file of a run.
+
+    Parameters
+    ----------
+    config : dict
+        The filled config of the step.
+    run_number : int or None
+        The run.
+
+    Returns
+    -------
+    int or None
+        The size in bytes, None if the input does not exist (yet).
+    """
+    infile = get_infile(config, run_number)
+    if infile is None:
+        return None
+    try:
+        return os.path.getsize(infile)
+    except OSError:
+        return None
+
+
+def get_input_sizes(config, run_numbers):
+    """Get the sizes of the input files of several runs.
+
+    Each input folder is listed once, so that only existing inputs are
+    stat'ed.
+
+    Parameters
+    ----------
+    config : dict
+        The filled config of the step.
+    run_numbers : list of int or None
+        The runs.
+
+    Returns
+    -------
+    dict
+        The size in bytes of the input of each run, None if the input
+        does not exist (yet).
+    """
+    folder_entries = {}
+    sizes = {}
+    for run_number in run_numbers:
+        infile = get_infile(config, run_number)
+        if infile is None:
+            sizes[run_number] = None
+            continue
+        folder = os.path.dirname(infile)
+        if folder not in folder_entries:
+            try:
+                folder_entries[folder] = {
+                    entry.name: entry for entry in os.scandir(folder)}
+            except OSError:
+                folder_entries[folder] = {}
+        entry = folder_entries[folder].get(os.path.basename(infile), None)
+        sizes[run_number] = entry.stat().st_size if entry else None
+    return sizes
+
+
+def load_history(patterns):
+    """Load the telemetry records of earlier local runs.
+
+    Parameters
+    ----------
+    patterns : list of str
+        Glob patterns of telemetry.jsonl files.
+
+    Returns
+    -------
+    list of dict
+        The records.
+    """
+    records = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.expanduser(pattern))):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        records.append(json.loads(line))
+    return records
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2 == 1:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.
+
+
+class RuntimePredictor(object):
+    """Predict the runtime of jobs from the telemetry of earlier runs.
+
+    The runtime of a job is, in this order, the runtime of the same job
+    script in an earlier run, the input size times the median runtime per
+    input byte of the step or the median runtime of the step.
+
+    Parameters
+    ----------
+    records : list of dict
+        The telemetry records, see load_history. Failed jobs are ignored.
+    """
+    def __init__(self, records=None):
+        self.job_times = {}
+        step_times = {}
+        step_rates = {}
+        for record in records or []:
+            if record.get('exit_code', None) != 0:
+                continue
+            step = record['step']
+            self.job_times[record['job']] = record['wall_time']
+            step_times.setdefault(step, []).append(record['wall_time'])
+            if record.get('input_size', None):
+                step_rates.setdefault(step, []).append(
+                    record['wall_time'] / record['input_size'])
+        self.step_times = {step: median(times)
+                           for step, times in step_times.items()}
+        self.step_rates = {step: median(rates)
+                           for step, rates in step_rates.items()}
+
+    def predict(self, step_name, input_size=None, job=None):
+        """Predict the runtime of a job.
+
+        Parameters
+        ----------
+        step_name : str
+            The name of the step.
+        input_size : int, optional
+            The size of the input file of the job in bytes.
+        job : str, optional
+            The path to the job script.
+
+        Returns
+        -------
+        float or None
+            The runtime in seconds, None if the step has no history.
+        """
+        if job in self.job_times:
+            return self.job_times[job]
+        if input_size and step_name in self.step_rates:
+            return input_size * self.step_rates[step_name]
+        return self.step_times.get(step_name, None)
+
+
+def get_run_priorities(step_jobs, predictor):
+    """Get DAGMan priorities scheduling the longest runs first.
+
+    The priority of a run of a step ranks its predicted remaining runtime,
+    i.e. the runtime of the step plus the longest remaining runtime of the
+    steps depending on it. Runs without history are ranked by their input
+    size.
+
+    Parameters
+    ----------
+    step_jobs : list of tuple
+        The config, the script files and the run numbers of each step.
+        Steps have to follow the steps they depend on.
+    predictor : RuntimePredictor
+        The predictor.
+
+    Returns
+    -------
+    dict
+        The priority (larger is earlier) of each (step, run number). Empty
+        if neither history nor inputs are available.
+    """
+    first_step = step_jobs[0][0]['step']
+    remaining = {}
+    input_sizes = {}
+    known = False
+    for config, script_files, run_numbers in reversed(step_jobs):
+        step = config['step']
+        children = [c['step'] for c, _, _ in step_jobs
+                    if c.get('previous_step', None) == step]
+        step_input_sizes = get_input_sizes(config, run_numbers)
+        for run_number, script_file in zip(run_numbers, script_files):
+            input_size = step_input_sizes[run_number]
+            if step == first_step:
+                input_sizes[run_number] = input_size or 0
+            runtime = predictor.predict(config['step_name'], input_size,
+                                        script_file)
+            known = known or runtime is not None or input_size is not None
+            remaining[(step, run_number)] = (runtime or 0) + max(
+                [remaining.get((child, run_number), 0)
+                 for child in children] + [0])
+    if not known:
+        return {}
+    keys = {node: (runtime, input_sizes.get(node[1], 0))
+            for node, runtime in remaining.items()}
+    ranks = {key: i for i, key in enumerate(sorted(set(keys.values())))}
+    return {node: ranks[key] for node, key in keys.items()}
@@ -12,5 +12,7 @@ setup(
         [console_scripts]
         simulation_scripts_write=simulation_scripts:main
         simulation_scripts_process=process_local:main
+        simulation_scripts_verify=verify_outputs:main
+        simulation_scripts_telemetry=process_local:telemetry_summary
     ''',
 )
@@ -1,15 +1,20 @@
+import copy
 import os
+import re
 import stat
 import string
+from collections import ChainMap, deque
+from concurrent.futures import ThreadPoolExecutor
 
 import click
 import yaml
 import getpass
 
 from batch_processing import create_pbs_files, create_dagman_files
-from steps.utils import get_run_folder
-
-#from batch_processing import adjust_resources
+from batch_processing import create_condor_files, create_chain_dagman_files
+from batch_processing import create_slurm_files, create_chain_slurm_files
+from batch_processing import adjust_resources
+from steps.utils import get_run_folder, MAX_RUN_NUMBER, RUNS_PER_FOLDER
 
 
 DATASET_FOLDER = '{data_folder}/{dataset_number}'
@@ -18,12 +23,171 @@ PREVIOUS_STEP_FOLDER = DATASET_FOLDER + '/{previous_step_name}'
 PROCESSING_FOLDER = DATASET_FOLDER + '/processing/{step_name}'
 SCRIPT_FOLDER = os.path.dirname(os.path.abspath(__file__))
 
+# config fields that change from run to run
+RUN_FIELDS = ('run_number', 'run_folder', 'final_out', 'output_folder')
+# number of threads used to write the job scripts
+N_WRITE_THREADS = 16
+# shell variables holding the run fields in array job scripts
+ARRAY_JOB_VARIABLES = {'run_number': 'RUN_NUMBER',
+                       'run_folder': 'RUN_FOLDER',
+                       'final_out': 'FINAL_OUT',
+                       'output_folder': 'OUTPUT_FOLDER'}
+# computes the run fields in array job scripts (see get_array_job_header)
+ARRAY_JOB_HEADER = '''
+# array job: the run number is passed as first argument (HTCondor) or
+# set by the batch system, the run dependent paths are computed from it
+RUN_NUMBER=${{1:-${{PBS_ARRAYID:-${{PBS_ARRAY_INDEX}}}}}}
+RUN_NUMBER=${{RUN_NUMBER:-${{SLURM_ARRAY_TASK_ID}}}}
+if [ -z "${{RUN_NUMBER}}" ]; then
+    echo 'No run number provided!'
+    exit 1
+fi
+RUN_FOLDER_START=$(( RUN_NUMBER / {runs_per_folder} * {runs_per_folder} ))
+RUN_FOLDER=$(printf '%0{fill}d-%0{fill}d' ${{RUN_FOLDER_START}} \\
+    $(( RUN_FOLDER_START + {runs_per_folder} - 1 )))
+FINAL_OUT={final_out}
+FINAL_OUT=${{FINAL_OUT// /0}}
+OUTPUT_FOLDER=$(dirname "${{FINAL_OUT}}")
+mkdir -p "${{OUTPUT_FOLDER}}"
+'''
+# runs the bundled runs one after another (see write_bundle_files)
+BUNDLE_FOOTER = '''
+BUNDLE_EXIT_CODES=$(mktemp)
+export BUNDLE_EXIT_CODES
+{in_process_runs}for RUN in {runs}; do
+    run_single ${{RUN}}
+    echo "${{RUN}} $?" >> "${{BUNDLE_EXIT_CODES}}"
+done
+BUNDLE_RC=0
+while read RUN RC; do
+    echo "Run ${{RUN}} finished with exit code ${{RC}}"
+    if [ ${{RC}} -ne 0 ]; then
+        BUNDLE_RC=${{RC}}
+    fi
+done < "${{BUNDLE_EXIT_CODES}}"
+rm "${{BUNDLE_EXIT_CODES}}"
+exit ${{BUNDLE_RC}}
+'''
+
 
 class SafeDict(dict):
     def __missing__(self, key):
         return '{' + key + '}'
 
 
+class CompiledTemplate(object):
+    """Format string that is parsed once and rendered for many runs.
+
+    All fields that do not depend on the run are substituted when the
+    template is compiled. Rendering only formats the remaining run fields
+    and joins the pieces. The result is identical to
+    string.Formatter().vformat(template, (), config) with the run values
+    set in config.
+
+    Parameters
+    ----------
+    template : str
+        The format string.
+    config : dict
+        The config used to substitute the static fields. A SafeDict
+        keeps unknown fields, e.g. ${PBS_JOBID}, in the output.
+    run_fields : tuple of str, optional
+        The fields which are substituted in `render`.
+    """
+    def __init__(self, template, config, run_fields=RUN_FIELDS):
+        self.config = config
+        self.formatter = string.Formatter()
+        self.chunks = []
+        self.fields = []
+        literal = []
+        for text, field, spec, conversion in self.formatter.parse(template):
+            literal.append(text)
+            if field is None:
+                continue
+            if re.split(r'[.\[]', field, 1)[0] in run_fields:
+                self.chunks.append(''.join(literal))
+                self.fields.append((field, conversion, spec))
+                literal = []
+            else:
+                field_str = '{' + field
+                if conversion:
+                    field_str += '!' + conversion
+                if spec:
+                    field_str += ':' + spec
+                field_str += '}'
+                literal.append(self.formatter.vformat(field_str, (), config))
+        self.chunks.append(''.join(literal))
+
+    def render(self, **run_values):
+        """Substitute the run fields.
+
+        Parameters
+        ----------
+        **run_values
+            The values of the run fields.
+
+        Returns
+        -------
+        str
+            The rendered template.
+        """
+        values = ChainMap(run_values, self.config)
+        pieces = [self.chunks[0]]
+        for (field, conversion, spec), chunk in zip(self.fields,
+                                                    self.chunks[1:]):
+            obj = self.formatter.get_field(field, (), values)[0]
+            obj = self.formatter.convert_field(obj, conversion)
+            if '{' in spec:
+                spec = self.formatter.vformat(spec, (), values)
+            pieces.append(self.formatter.format_field(obj, spec))
+            pieces.append(chunk)
+        return ''.join(pieces)
+
+    def render_shell(self, variables, quote=False):
+        """Render the run fields as references to shell variables.
+
+        Parameters
+        ----------
+        variables : dict
+            The names of the shell variables holding the run fields.
+        quote : bool, optional
+            If True, the result is a double quoted shell word. Otherwise
+            the static parts are inserted as they are, e.g. for scripts.
+
+        Returns
+        -------
+        str
+            The rendered template.
+
+        Raises
+        ------
+        ValueError
+            If a run field has a conversion or a format spec which can not
+            be expressed with printf.
+        """
+        def escape(text):
+            if not quote:
+                return text
+            return re.sub(r'([\\"$`])', r'\\\1', text)
+
+        pieces = [escape(self.chunks[0])]
+        for (field, conversion, spec), chunk in zip(self.fields,
+                                                    self.chunks[1:]):
+            if field not in variables or conversion or \
+                    not re.match(r'^(0?[0-9]*d)?$', spec):
+                raise ValueError('Field {!r} can not be computed in the job '
+                                 'script'.format(field))
+            if spec:
+                pieces.append('$(printf \'%{}\' "${{{}}}")'.format(
+                    spec, variables[field]))
+            else:
+                pieces.append('${{{}}}'.format(variables[field]))
+            pieces.append(escape(chunk))
+        if quote:
+            return '"' + ''.join(pieces) + '"'
+        return ''.join(pieces)
+
+
 class DefaultDict(dict):
     def __init__(self, start_dict, default):
         dict.__init__(self, start_dict)
@@ -60,6 +224,65 @@ def fetch_chain(chain_name):
     return step_enum, default_config, job_template_enum
 
 
+def parse_steps(steps, step_enum):
+    """Parse a selection of steps like '0-5' or '0,1,11-14'.
+
+    Parameters
+    ----------
+    steps : str
+        Comma separated steps or ranges of steps. Ranges include both ends
+        and only the steps of the chain within the range.
+    step_enum : dict
+        The steps of the processing chain.
+
+    Returns
+    -------
+    list of int
+        The selected steps in ascending order.
+
+    Raises
+    ------
+    click.BadParameter
+        If the selection can not be parsed or contains unknown steps.
+    """
+    selected = set()
+    try:
+        for part in steps.split(','):
+            if '-' in part:
+                start, stop = [int(value) for value in part.split('-')]
+                selected.update(step for step in step_enum
+                                if start <= step <= stop)
+            else:
+                step = int(part)
+                if step not in step_enum:
+                    raise click.BadParameter(
+                        'Step {} is not part of the chain'.format(step))
+                selected.add(step)
+    except ValueError:
+        raise click.BadParameter('Invalid steps {!r}'.format(steps))
+    if not selected:
+        raise click.BadParameter('No steps selected by {!r}'.format(steps))
+    return sorted(selected)
+
+
+def get_previous_step(step, step_enum):
+    # Processing chain can implement different branches. These branches
+    # can be defined by using step numbers greater than 9. If the previous
+    # step is defined in the processing chain, then the files will be used
+    # as input. If it does not exist, files form step % 10 -1 will be used,
+    # unless step % 10 is zero.
+    if step % 10 == 0:
+        # the branch does not have any previous input
+        previous_step = (step % 10) - 1
+
+    else:
+        # the branch can have previous input
+        previous_step = step - 1
+        if previous_step not in step_enum:
+            previous_step = (step % 10) - 1
+    return previous_step
+
+
 def create_filename(cfg, input=False):
     if input:
         step_name = cfg['step_name']
@@ -77,8 +300,206 @@ def create_filename(cfg, input=False):
     return full_path
 
 
+def write_script(script_path, content):
+    with open(script_path, 'w') as f:
+        f.write(content)
+        st = os.fstat(f.fileno())
+        os.fchmod(f.fileno(), st.st_mode | stat.S_IEXEC)
+
+
+def get_array_job_header(outfile_template):
+    """Get the shell code computing the run fields of an array job.
+
+    Parameters
+    ----------
+    outfile_template : CompiledTemplate
+        The compiled outfile pattern.
+
+    Returns
+    -------
+    str
+        The shell code.
+    """
+    return ARRAY_JOB_HEADER.format(
+        runs_per_folder=RUNS_PER_FOLDER,
+        fill=len(str(MAX_RUN_NUMBER - 1)),
+        final_out=outfile_template.render_shell(
+            ARRAY_JOB_VARIABLES, quote=True))
+
+
+def write_array_job_file(template, output_base, outfile_template,
+                         script_name_template):
+    """Write one job script for all runs.
+
+    The run fields of the job template are replaced by shell variables.
+    These are computed by a header inserted after the leading comment
+    lines (shebang and batch system directives) of the template.
+
+    Returns
+    -------
+    str
+        Path to the job script.
+    """
+    header, body = split_job_header(template.render_shell(ARRAY_JOB_VARIABLES))
+    script_name = script_name_template.render(run_number='array')
+    script_path = os.path.join(output_base, script_name)
+    write_script(script_path, '\n'.join(
+        header + [get_array_job_header(outfile_template)] + body))
+    return script_path
+
+
+def split_job_header(content):
+    # the leading comment lines are the shebang and batch system directives
+    lines = content.split('\n')
+    n_header = 0
+    while n_header < len(lines) and lines[n_header].startswith('#'):
+        n_header += 1
+    return lines[:n_header], lines[n_header:]
+
+
+def step_supports_in_process(config):
+    step_file = os.path.join(SCRIPT_FOLDER, 'steps',
+                             '{}.py'.format(config['step_name']))
+    with open(step_file) as f:
+        return 'run_bundle(main)' in f.read()
+
+
+def get_in_process(config):
+    """Check whether the runs of a job are processed in a single process.
+
+    `runs_per_job_in_process` is either a bool for all steps or a dict
+    mapping steps to bools, like the entries of `resources`. A dataset
+    wide True only applies to steps calling utils.run_bundle, other steps
+    fall back to processing the runs one after another in subshells.
+
+    Raises
+    ------
+    ValueError
+        If in-process looping is explicitly set for a step which does not
+        support it.
+    """
+    in_process = config.get('runs_per_job_in_process', False)
+    if isinstance(in_process, dict):
+        if not in_process.get(config['step'], False):
+            return False
+        if not step_supports_in_process(config):
+            raise ValueError('{} does not support in-process looping'.format(
+                config['step_name']))
+        return True
+    if in_process and not step_supports_in_process(config):
+        click.echo('{} does not support in-process looping, the runs are '
+                   'processed one after another!'.format(config['step_name']))
+        return False
+    return bool(in_process)
+
+
+def write_bundle_files(template, output_base, outfile_template,
+                       script_name_template, runs, runs_per_job,
+                       in_process=False):
+    """Write job scripts processing blocks of runs one after another.
+
+    The runs are grouped into blocks of `runs_per_job` consecutive run
+    numbers. The job template is wrapped into a function run in a
+    subshell for each run, so the exit code and the clean up of each run
+    are the same as for a single run. The job fails if any of its runs
+    failed.
+
+    With `in_process`, the job template is only run for the last run of
+    a block. The other runs are passed in BUNDLE_RUNS and processed in the
+    same process by steps using utils.run_bundle.
+
+    Parameters
+    ----------
+    template : CompiledTemplate
+        The compiled job template.
+    output_base : str
+        Folder of the job scripts.
+    outfile_template : CompiledTemplate
+        The compiled outfile pattern.
+    script_name_template : CompiledTemplate
+        The compiled script name.
+    runs : iterable of int
+        The runs to process.
+    runs_per_job : int
+        The number of consecutive run numbers of a block.
+    in_process : bool, optional
+        If True, the runs are processed in one process of the step.
+
+    Returns
+    -------
+    list of str
+        The job scripts.
+    list of int
+        The first run number of the block of each job script.
+    """
+    header, body = split_job_header(template.render_shell(ARRAY_JOB_VARIABLES))
+    function = ['# each run is processed in a subshell, exit only ends it',
+                'run_single() (',
+                get_array_job_header(outfile_template)] + body + [')']
+
+    blocks = {}
+    for i in runs:
+        blocks.setdefault(i // runs_per_job * runs_per_job, []).append(i)
+    scripts = []
+    run_numbers = []
+    for block_start in sorted(blocks.keys()):
+        block_runs = blocks[block_start]
+        if in_process:
+            in_process_runs = 'export BUNDLE_RUNS="{}"\n'.format(
+                ' '.join(str(i) for i in block_runs[:-1]))
+            loop_runs = block_runs[-1:]
+        else:
+            in_process_runs = ''
+            loop_runs = block_runs
+        footer = BUNDLE_FOOTER.format(
+            in_process_runs=in_process_runs,
+            runs=' '.join(str(i) for i in loop_runs))
+        script_name = script_name_template.render(
+            run_number='{}-{}'.format(block_runs[0], block_runs[-1]))
+        script_path = os.path.join(output_base, script_name)
+        write_script(script_path, '\n'.join(header + function + [footer]))
+        scripts.append(script_path)
+        run_numbers.append(block_start)
+    return scripts, run_numbers
+
+
+def iter_pending_runs(outfile_template, run_start, run_stop,
+                      check_existing=False):
+    """Iterate over the runs whose output has to be produced.
+
+    Output folders are shared by the runs of a run folder, so they are only
+    created (and listed for existing files) once.
+
+    Yields
+    ------
+    dict
+        The values of the run fields of the run.
+    """
+    existing_files = {}
+    for i in range(run_start, run_stop):
+        run_folder = get_run_folder(i)
+        final_out = outfile_template.render(run_number=i,
+                                            run_folder=run_folder)
+        final_out = final_out.replace(' ', '0')
+        output_folder = os.path.dirname(final_out)
+        if output_folder not in existing_files:
+            if not os.path.isdir(output_folder):
+                os.makedirs(output_folder)
+            if check_existing:
+                existing_files[output_folder] = set(os.listdir(output_folder))
+            else:
+                existing_files[output_folder] = set()
+        if os.path.basename(final_out) in existing_files[output_folder]:
+            continue
+        yield {'run_number': i,
+               'run_folder': run_folder,
+               'final_out': final_out,
+               'output_folder': output_folder}
+
+
 def write_job_files(config, step, check_existing=False,
-                    run_start=None, run_stop=None):
+                    run_start=None, run_stop=None,
+                    n_threads=N_WRITE_THREADS, array_job=False):
     with open(config['job_template']) as f:
         template = f.read()
     output_base = os.path.join(config['processing_folder'], 'jobs')
@@ -104,29 +525,51 @@ def write_job_files(config, step, check_existing=False,
         if run_start >= run_stop or run_stop > config['n_runs']:
             raise ValueError('run_stop is out of range: {!r}'.format(run_stop))
 
-    for i in range(run_start, run_stop):
-        config['run_number'] = i
-        config['run_folder'] = get_run_folder(i)
-        final_out = config['outfile_pattern'].format(**config)
-        final_out = final_out.replace(' ', '0')
-        config['final_out'] = final_out
-        if check_existing:
-            if os.path.isfile(config['final_out']):
-                continue
-        output_folder = os.path.dirname(final_out)
-        if not os.path.isdir(output_folder):
-            os.makedirs(output_folder)
-        config['output_folder'] = output_folder
-        file_config = string.Formatter().vformat(template, (), config)
-        script_name = string.Formatter().vformat(
-            config['script_name'], (), config)
+    # parse the templates once, only the run fields are filled per run
+    job_template = CompiledTemplate(template, config)
+    script_name_template = CompiledTemplate(config['script_name'], config)
+    outfile_template = CompiledTemplate(config['outfile_pattern'], config)
+
+    runs_per_job = config.get('runs_per_job', 1)
+    if runs_per_job > 1:
+        if array_job:
+            raise ValueError('runs_per_job > 1 can not be combined with '
+                             'array jobs')
+        in_process = get_in_process(config)
+        runs = (run_values['run_number'] for run_values in iter_pending_runs(
+            outfile_template, run_start, run_stop, check_existing))
+        return write_bundle_files(job_template, output_base,
+                                  outfile_template, script_name_template,
+                                  runs, runs_per_job, in_process=in_process)
+
+    # a single script for all runs, the run number is set at runtime
+    if array_job:
+        script_path = write_array_job_file(
+            job_template, output_base, outfile_template,
+            script_name_template)
+        run_numbers = [run_values['run_number'] for run_values in
+                       iter_pending_runs(outfile_template, run_start,
+                                         run_stop, check_existing)]
+        return [script_path] * len(run_numbers), run_numbers
+
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=n_threads)
+    for run_values in iter_pending_runs(outfile_template, run_start, run_stop,
+                                        check_existing):
+        script_name = script_name_template.render(**run_values)
         script_path = os.path.join(output_base, script_name)
-        with open(script_path, 'w') as f:
-            f.write(file_config)
-        st = os.stat(script_path)
-        os.chmod(script_path, st.st_mode | stat.S_IEXEC)
+        pending.append(executor.submit(
+            write_script, script_path, job_template.render(**run_values)))
+        # limit the number of rendered scripts waiting to be written
+        if len(pending) >= 4 * n_threads:
+            pending.popleft().result()
         scripts.append(script_path)
-        run_numbers.append(i)
+        run_numbers.append(run_values['run_number'])
+
+    # wait for the remaining writes, result() re-raises errors
+    while pending:
+        pending.popleft().result()
+    executor.shutdown()
     return scripts, run_numbers
 
 
@@ -159,6 +602,123 @@ def build_config(data_folder, custom_settings):
     return config
 
 
+def finalize_config(config, config_file, array_job):
+    config['processing_folder'] = PROCESSING_FOLDER.format(**config)
+    config['outfile_pattern'] = create_filename(config)
+    config['scratchfile_pattern'] = os.path.basename(config['outfile_pattern'])
+    config['script_name'] = '{step_name}{name_addition}_{run_number}.sh'
+    config['array_job'] = array_job
+    if not os.path.isdir(config['processing_folder']):
+        os.makedirs(config['processing_folder'])
+
+    outfile = os.path.basename(os.path.join(config_file))
+    filled_yaml = os.path.join(config['processing_folder'], outfile)
+    config['yaml_copy'] = filled_yaml
+
+
+def write_yaml_copy(config):
+    with open(config['yaml_copy'], 'w') as yaml_copy:
+        yaml.dump(dict(config), yaml_copy, default_flow_style=False)
+
+
+def get_processing_scratch(processing_scratch):
+    if processing_scratch is None:
+        default = '/scratch/{}/simulation_scripts'.format(
+            getpass.getuser())
+        processing_scratch = click.prompt(
+            'Please enter a processing scrath:',
+            default=default)
+    return os.path.abspath(processing_scratch)
+
+
+def write_chain(custom_settings,
+                config_file,
+                steps,
+                step_enum,
+                default_config,
+                job_template_enum,
+                data_folder=None,
+                processing_scratch=None,
+                resume=False,
+                array=False,
+                run_start=None,
+                run_stop=None,
+                slurm=False):
+    """Write the job files of several steps and a DAG connecting them.
+
+    The config of each step is built from scratch, like for a single step.
+    In the DAG each run of a step depends on the same run of its previous
+    step, if the previous step is part of the selected steps. With slurm
+    the steps are Slurm job arrays with the same dependencies instead.
+
+    Parameters
+    ----------
+    custom_settings : dict
+        The dataset config.
+    config_file : str
+        Path to the dataset config.
+    steps : list of int
+        The steps to process.
+    step_enum : dict
+        The steps of the processing chain.
+    default_config : str
+        Path to the default config of the processing chain.
+    job_template_enum : dict
+        The job templates of the steps.
+    data_folder : str, optional
+        Folder were all files should be placed.
+    processing_scratch : str, optional
+        Folder for the DAGMAN files.
+    resume : bool, optional
+        If True, runs with existing output are skipped.
+    array : bool, optional
+        If True, a single job script is written for all runs of a step.
+    run_start : int, optional
+        Only process runs starting with this number.
+    run_stop : int, optional
+        Only process runs up to this number.
+    slurm : bool, optional
+        If True, Slurm job arrays are written instead of a DAG.
+    """
+    processing_scratch = get_processing_scratch(processing_scratch)
+    step_jobs = []
+    for step in steps:
+        previous_step = get_previous_step(step, step_enum)
+        settings = SafeDict(copy.deepcopy(dict(custom_settings)))
+        settings.update({
+            'step': step,
+            'step_name': step_enum[step],
+            'job_template': job_template_enum[step],
+            'previous_step_name': step_enum.get(previous_step, None),
+            'previous_step': previous_step,
+            'default_config': default_config})
+        config = build_config(data_folder, settings)
+        # prompt for the data folder only once
+        data_folder = config['data_folder']
+        config['infile_pattern'] = create_filename(config, input=True)
+        finalize_config(config, config_file, array)
+        write_yaml_copy(config)
+        config['processing_scratch'] = processing_scratch
+        click.echo('Writing job files for step {} ({})'.format(
+            step, config['step_name']))
+        script_files, run_numbers = write_job_files(config, step,
+                                                    check_existing=resume,
+                                                    run_start=run_start,
+                                                    run_stop=run_stop,
+                                                    array_job=array)
+        step_jobs.append((config, script_files, run_numbers))
+
+    scratch_subfolder = '{}_steps_{}'.format(
+        step_jobs[0][0]['dataset_number'], '_'.join(str(s) for s in steps))
+    scratch_folder = os.path.join(processing_scratch, scratch_subfolder)
+    if not os.path.isdir(scratch_folder):
+        os.makedirs(scratch_folder)
+    if slurm:
+        create_chain_slurm_files(step_jobs, scratch_folder)
+    else:
+        create_chain_dagman_files(step_jobs, scratch_folder)
+
+
 @click.command()
 @click.argument('config_file', type=click.Path(exists=True))
 @click.option('--data_folder', '-d', default=None,
@@ -167,12 +727,23 @@ def build_config(data_folder, custom_settings):
               help='Folder for the DAGMAN Files')
 @click.option('--dagman/--no-dagman', default=False,
               help='Write/Not write files to start dagman process.')
+@click.option('--condor/--no-condor', default=False,
+              help='Write/Not write a HTCondor submit file queueing all '
+                   'jobs from a manifest.')
 @click.option('--pbs/--no-pbs', default=False,
               help='Write/Not write files to start processing on a pbs system')
+@click.option('--slurm/--no-slurm', default=False,
+              help='Write/Not write Slurm array jobs.')
 @click.option('--step', '-s', default=1,
               help='0=upto clsim\n1 = clsim\n2 =upto L2')
+@click.option('--steps', default=None,
+              help='Write one DAG for several steps, e.g. 0-5. Each run '
+                   'starts a step as soon as its previous step finished.')
 @click.option('--resume/--no-resume', default=False,
               help='Resume processing -> check for existing output')
+@click.option('--array/--no-array', default=False,
+              help='Write a single job script for all runs. The run number '
+                   'is passed as argument or taken from the batch system.')
 @click.option('--run_start', default=None, type=int,
               help='Only process runs starting with this number.')
 @click.option('--run_stop', default=None, type=int,
@@ -181,9 +752,13 @@ def main(data_folder,
          config_file,
          processing_scratch,
          step,
+         steps,
          pbs,
+         slurm,
          dagman,
+         condor,
          resume,
+         array,
          run_start,
          run_stop):
     config_file = click.format_filename(config_file)
@@ -193,20 +768,29 @@ def main(data_folder,
     click.echo('Initialized {} chain!'.format(chain_name))
     step_enum, default_config, job_template_enum = fetch_chain(chain_name)
 
-    # Processing chain can implement different branches. These branches
-    # can be defined by using step numbers greater than 9. If the previous
-    # step is defined in the processing chain, then the files will be used
-    # as input. If it does not exist, files form step % 10 -1 will be used,
-    # unless step % 10 is zero.
-    if step % 10 == 0:
-        # the branch does not have any previous input
-        previous_step = (step % 10) - 1
-
-    else:
-        # the branch can have previous input
-        previous_step = step - 1
-        if previous_step not in step_enum:
-            previous_step = (step % 10) - 1
+    if steps is not None:
+        if 'outfile_pattern' in custom_settings.keys():
+            raise click.UsageError(
+                '--steps needs a config which is not built for a step')
+        if pbs or condor:
+            raise click.UsageError(
+                '--steps can only be used with dagman or slurm')
+        write_chain(custom_settings,
+                    config_file,
+                    parse_steps(steps, step_enum),
+                    step_enum,
+                    default_config,
+                    job_template_enum,
+                    data_folder=data_folder,
+                    processing_scratch=processing_scratch,
+                    resume=resume,
+                    array=array,
+                    run_start=run_start,
+                    run_stop=run_stop,
+                    slurm=slurm)
+        return
+
+    previous_step = get_previous_step(step, step_enum)
     previous_step_name = step_enum.get(previous_step, None)
 
     custom_settings.update({
@@ -233,34 +817,23 @@ def main(data_folder,
         config = build_config(data_folder, custom_settings)
         config['infile_pattern'] = create_filename(config, input=True)
 
-    config['processing_folder'] = PROCESSING_FOLDER.format(**config)
-    config['outfile_pattern'] = create_filename(config)
-    config['scratchfile_pattern'] = os.path.basename(config['outfile_pattern'])
-    config['script_name'] = '{step_name}{name_addition}_{run_number}.sh'
-    if not os.path.isdir(config['processing_folder']):
-        os.makedirs(config['processing_folder'])
+    finalize_config(config, config_file, array)
+    write_yaml_copy(config)
 
-    outfile = os.path.basename(os.path.join(config_file))
-    filled_yaml = os.path.join(config['processing_folder'], outfile)
-    config['yaml_copy'] = filled_yaml
-    with open(config['yaml_copy'], 'w') as yaml_copy:
-        yaml.dump(dict(config), yaml_copy, default_flow_style=False)
-
-    if dagman or pbs:
-        if processing_scratch is None:
-            default = '/scratch/{}/simulation_scripts'.format(
-                getpass.getuser())
-            processing_scratch = click.prompt(
-                'Please enter a processing scrath:',
-                default=default)
-        config['processing_scratch'] = os.path.abspath(processing_scratch)
+    if dagman or pbs or condor or slurm:
+        config['processing_scratch'] = get_processing_scratch(
+            processing_scratch)
+    if pbs:
+        # fills the resource fields of the #PBS lines of the job templates
+        config = adjust_resources(config)
 
     script_files, run_numbers = write_job_files(config, step,
                                                 check_existing=resume,
                                                 run_start=run_start,
-                                                run_stop=run_stop)
+                                                run_stop=run_stop,
+                                                array_job=array)
 
-    if dagman or pbs:
+    if dagman or pbs or condor or slurm:
         scratch_subfolder = '{dataset_number}_{step_name}'.format(**config)
         scratch_folder = os.path.join(config['processing_scratch'],
                                       scratch_subfolder)
@@ -271,11 +844,21 @@ def main(data_folder,
                                 script_files,
                                 run_numbers,
                                 scratch_folder)
+        if condor:
+            create_condor_files(config,
+                                script_files,
+                                run_numbers,
+                                scratch_folder)
         if pbs:
             create_pbs_files(config,
                              script_files,
                              run_numbers,
                              scratch_folder)
+        if slurm:
+            create_slurm_files(config,
+                               script_files,
+                               run_numbers,
+                               scratch_folder)
 
 
 if __name__ == '__main__':
@@ -1,10 +1,14 @@
 from __future__ import division
+import time
+
 import numpy as np
 
 from I3Tray import I3Tray, I3Units
 from icecube import icetray, dataclasses
 
 from . import geometry
+from . import detector_hull
+from . import sampling_statistics
 
 
 class CascadeFactory(icetray.I3ConditionalModule):
@@ -51,6 +55,43 @@ class CascadeFactory(icetray.I3ConditionalModule):
                           'position will be accepted regardless of its '
                           'distance to the convex hull.',
                           None)
+        self.AddParameter('hull_distance_grid_resolution',
+                          'If provided, the signed distance to the convex '
+                          'hull is precomputed on a grid with this spacing '
+                          '(in meters) covering x_range, y_range and z_range.'
+                          ' The vertex distance check then interpolates on '
+                          'the grid and only computes the exact distance '
+                          'close to max_vertex_distance. Grids are cached on '
+                          'disk. If None, the exact distance is always used.',
+                          None)
+        self.AddParameter('hull_aware_proposal',
+                          'If True, vertices are proposed uniformly inside '
+                          'the convex hull expanded by max_vertex_distance '
+                          'and intersected with the x/y/z_range box instead '
+                          'of uniformly in the box. The vertex density is '
+                          'unchanged, but nearly no vertices are rejected. '
+                          'The estimated generation volume is added to the '
+                          'I3MCWeightDict as GenerationVolume.',
+                          False)
+        self.AddParameter('sampling_block_size',
+                          'If provided, vertices and kinematics are sampled '
+                          'with numpy in blocks of this size. Vertex '
+                          'candidates of a block are tested against the '
+                          'convex hull at once and accepted vertices are '
+                          'buffered for subsequent events. The numpy random '
+                          'state is seeded with a seed drawn once from the '
+                          'random_service, so that results are reproducible '
+                          'per run. If None, one value is drawn at a time '
+                          'from the random_service.',
+                          None)
+        self.AddParameter('record_sampling_info',
+                          'If True, the number of vertex draws and hull '
+                          'distance evaluations as well as the wall time '
+                          'spent sampling are added to the I3MCWeightDict '
+                          'of each event and the run totals are written to '
+                          'the CascadeFactorySamplingInfo S-frame after '
+                          'the last event.',
+                          False)
         self.AddParameter('flavors',
                           'List of neutrino flavors to simulate.',
                           ['NuE', 'NuMu', 'NuTau'])
@@ -84,6 +125,10 @@ class CascadeFactory(icetray.I3ConditionalModule):
         ValueError
             If interaction type or flavor is unkown.
         """
+        self.sampling_info = sampling_statistics.SamplingStatistics(
+            'CascadeFactorySamplingInfo')
+        configure_start_time = time.time()
+
         self.azimuth_range = self.GetParameter('azimuth_range')
         self.zenith_range = self.GetParameter('zenith_range')
         self.sample_in_cos = self.GetParameter('sample_uniformly_on_sphere')
@@ -100,6 +145,11 @@ class CascadeFactory(icetray.I3ConditionalModule):
         self.y_range = self.GetParameter('y_range')
         self.z_range = self.GetParameter('z_range')
         self.max_vertex_distance = self.GetParameter('max_vertex_distance')
+        self.hull_distance_grid_resolution = self.GetParameter(
+            'hull_distance_grid_resolution')
+        self.sampling_block_size = self.GetParameter('sampling_block_size')
+        self.hull_aware_proposal = self.GetParameter('hull_aware_proposal')
+        self.record_sampling_info = self.GetParameter('record_sampling_info')
         self.flavors = self.GetParameter('flavors')
         self.num_flavors = len(self.flavors)
         self.interaction_types = self.GetParameter('interaction_types')
@@ -119,6 +169,41 @@ class CascadeFactory(icetray.I3ConditionalModule):
             self.constant_vars = []
         self.events_done = 0
 
+        # signed-distance grid for the vertex distance check
+        self.vertex_distance_grid = None
+        if self.hull_distance_grid_resolution is not None and \
+                np.isfinite(self.max_vertex_distance):
+            self.vertex_distance_grid = detector_hull.get_hull_distance_grid(
+                geometry.get_icecube_prism(),
+                self.x_range, self.y_range, self.z_range,
+                resolution=self.hull_distance_grid_resolution)
+
+        # hull-aware proposal distribution of the vertices
+        self.vertex_sampler = None
+        self.generation_volume = None
+        if self.hull_aware_proposal and np.isfinite(self.max_vertex_distance):
+            hull = geometry.get_icecube_prism()
+            self.vertex_sampler = geometry.HullVolumeSampler(
+                hull, self.max_vertex_distance,
+                self.x_range, self.y_range, self.z_range)
+            volume_random_state = np.random.RandomState(
+                self.random_service.integer(2**31 - 1))
+            self.generation_volume, self.generation_volume_error = \
+                self.vertex_sampler.estimate_volume(
+                    hull.distance, self.max_vertex_distance,
+                    volume_random_state)
+
+        # block sampling: seed numpy from the (per run) random service
+        if self.sampling_block_size is not None:
+            self.sampling_seed = self.random_service.integer(2**31 - 1)
+            self.vertex_random_state = np.random.RandomState(
+                [self.sampling_seed, 0])
+            self.kinematics_random_state = np.random.RandomState(
+                [self.sampling_seed, 1])
+            self._vertex_buffer = np.empty((0, 3))
+            self._kinematics_buffer = {}
+            self._kinematics_index = self.sampling_block_size
+
         # make lowercase
         self.flavors = [f.lower() for f in self.flavors]
         self.constant_vars = [f.lower() for f in self.constant_vars]
@@ -146,6 +231,12 @@ class CascadeFactory(icetray.I3ConditionalModule):
             raise ValueError('Oversampling must be set to "None" or integer'
                              ' greater than 1. It is currently set to: '
                              '{!r}'.format(self.oversampling_factor))
+
+        if self.sampling_block_size is not None and \
+                self.sampling_block_size < 1:
+            raise ValueError('Sampling block size must be set to "None" or '
+                             'a positive integer. It is currently set to: '
+                             '{!r}'.format(self.sampling_block_size))
         # --------------------
         # sample constant vars
         # --------------------
@@ -186,6 +277,46 @@ class CascadeFactory(icetray.I3ConditionalModule):
                     self.random_service.integer(self.num_interaction_types)]
         # --------------------
 
+        self.sampling_info.configure_time = time.time() - configure_start_time
+
+    def _draw_vertex_position(self):
+        """Draw a vertex position from the proposal distribution.
+
+        Returns
+        -------
+        tuple of float
+            The x, y and z coordinate of the proposed vertex.
+        """
+        if self.vertex_sampler is not None:
+            u = [[self.random_service.uniform(0., 1.) for i in range(4)]]
+            return tuple(self.vertex_sampler.transform(u)[0])
+        return (self.random_service.uniform(*self.x_range),
+                self.random_service.uniform(*self.y_range),
+                self.random_service.uniform(*self.z_range))
+
+    def _draw_vertex_positions(self, random_state, size):
+        """Draw vertex positions from the proposal distribution.
+
+        Parameters
+        ----------
+        random_state : np.random.RandomState
+            The random state.
+        size : int
+            Number of positions.
+
+        Returns
+        -------
+        np.ndarray shape=(size, 3)
+            The proposed vertex positions.
+        """
+        if self.vertex_sampler is not None:
+            return self.vertex_sampler.sample(random_state, size)
+        return np.stack([
+            random_state.uniform(*self.x_range, size=size),
+            random_state.uniform(*self.y_range, size=size),
+            random_state.uniform(*self.z_range, size=size),
+        ], axis=1)
+
     def _sample_vertex(self):
         """Sample a vertex within allowd distance of IceCube Convex Hull.
 
@@ -194,20 +325,136 @@ class CascadeFactory(icetray.I3ConditionalModule):
         TYPE
             Description
         """
+        if self.sampling_block_size is not None:
+            while len(self._vertex_buffer) == 0:
+                self._fill_vertex_buffer()
+            x, y, z = self._vertex_buffer[0]
+            self._vertex_buffer = self._vertex_buffer[1:]
+            return dataclasses.I3Position(x * I3Units.m,
+                                          y * I3Units.m,
+                                          z * I3Units.m)
+
         # vertex
         point_is_inside = False
         while not point_is_inside:
-            vertex_x = self.random_service.uniform(*self.x_range) * I3Units.m
-            vertex_y = self.random_service.uniform(*self.y_range) * I3Units.m
-            vertex_z = self.random_service.uniform(*self.z_range) * I3Units.m
+            vertex_x, vertex_y, vertex_z = self._draw_vertex_position()
             vertex = dataclasses.I3Position(
                             vertex_x * I3Units.m,
                             vertex_y * I3Units.m,
                             vertex_z * I3Units.m)
-            dist = geometry.distance_to_icecube_hull(vertex)
+            if self.vertex_distance_grid is not None:
+                dist = self.vertex_distance_grid.distance(
+                    vertex, threshold=self.max_vertex_distance)
+            else:
+                dist = geometry.distance_to_icecube_hull(vertex)
             point_is_inside = dist < self.max_vertex_distance
+            self.sampling_info.add('n_vertex_proposed')
+            self.sampling_info.add('n_hull_distance_evaluations')
+        self.sampling_info.add('n_vertex_accepted')
         return vertex
 
+    def _get_vertex_distances(self, positions):
+        """Get the distances of the vertices to the IceCube convex hull.
+
+        Parameters
+        ----------
+        positions : np.ndarray shape=(N, 3)
+            The vertex positions.
+
+        Returns
+        -------
+        np.ndarray shape=(N,)
+            Signed distances to the convex hull.
+        """
+        self.sampling_info.add('n_hull_distance_evaluations', len(positions))
+        if self.vertex_distance_grid is not None:
+            return self.vertex_distance_grid.distance(
+                positions, threshold=self.max_vertex_distance)
+        return geometry.distance_to_icecube_hull(positions)
+
+    def _fill_vertex_buffer(self):
+        """Sample a block of vertex candidates and buffer accepted ones.
+        """
+        n = self.sampling_block_size
+        positions = self._draw_vertex_positions(self.vertex_random_state, n)
+        if self.max_vertex_distance is not None and \
+                np.isfinite(self.max_vertex_distance):
+            mask = self._get_vertex_distances(positions) < \
+                self.max_vertex_distance
+            positions = positions[mask]
+
+        self.sampling_info.add('n_vertex_proposed', n)
+        self.sampling_info.add('n_vertex_accepted', len(positions))
+        self._vertex_buffer = np.concatenate((self._vertex_buffer, positions))
+
+    def _fill_kinematics_buffer(self):
+        """Sample a block of event kinematics.
+
+        Values of all variables are drawn (including constant ones), so
+        that the random stream does not depend on `constant_vars`.
+        """
+        n = self.sampling_block_size
+        random_state = self.kinematics_random_state
+
+        vertex_time = random_state.uniform(*self.time_range, size=n)
+        azimuth = random_state.uniform(*self.azimuth_range, size=n)
+        if self.sample_in_cos:
+            zenith = np.rad2deg(np.arccos(
+                random_state.uniform(*self.cos_zenith_range, size=n)))
+        else:
+            zenith = random_state.uniform(*self.zenith_range, size=n)
+        log_primary_energy = random_state.uniform(
+            *self.log_primary_energy_range, size=n)
+        fraction = random_state.uniform(
+            *self.fractional_energy_in_hadrons_range, size=n)
+        flavor = random_state.randint(self.num_flavors, size=n)
+        interaction_type = random_state.randint(
+            self.num_interaction_types, size=n)
+
+        self._kinematics_buffer = {
+            'time': vertex_time * I3Units.ns,
+            'azimuth': azimuth * I3Units.deg,
+            'zenith': zenith * I3Units.deg,
+            'log_primary_energy': log_primary_energy * I3Units.GeV,
+            'fractional_energy_in_hadrons': fraction,
+            'flavor': flavor,
+            'interaction_type': interaction_type,
+        }
+        self._kinematics_index = 0
+
+    def _pop_kinematics(self):
+        """Get the kinematics of the next event from the block buffer.
+
+        Returns
+        -------
+        dict
+            The sampled values for the next event.
+        """
+        if self._kinematics_index >= self.sampling_block_size:
+            self._fill_kinematics_buffer()
+        index = self._kinematics_index
+        self._kinematics_index += 1
+
+        sample = {key: values[index] for key, values
+                  in self._kinematics_buffer.items()}
+        sample['flavor'] = self.flavors[sample['flavor']]
+        sample['interaction_type'] = \
+            self.interaction_types[sample['interaction_type']]
+        return sample
+
+    def _push_sampling_info(self):
+        """Push an S-frame with the vertex sampling statistics.
+        """
+        info = {}
+        if self.generation_volume is not None:
+            info['generation_volume'] = self.generation_volume
+            info['generation_volume_error'] = self.generation_volume_error
+        if self.sampling_block_size is not None:
+            info['sampling_block_size'] = self.sampling_block_size
+            info['sampling_seed'] = self.sampling_seed
+
+        self.PushFrame(self.sampling_info.get_s_frame(**info))
+
     def DAQ(self, frame):
         """Inject casacdes into I3MCtree.
 
@@ -224,14 +471,23 @@ class CascadeFactory(icetray.I3ConditionalModule):
         # --------------
         # sample cascade
         # --------------
+        self.sampling_info.start_event()
+
         # vertex
         if 'vertex' in self.constant_vars:
             vertex = self.vertex
         else:
             vertex = self._sample_vertex()
 
+        if self.sampling_block_size is not None:
+            sample = self._pop_kinematics()
+        else:
+            sample = None
+
         if 'time' in self.constant_vars:
             vertex_time = self.vertex_time
+        elif sample is not None:
+            vertex_time = sample['time']
         else:
             vertex_time = \
                 self.random_service.uniform(*self.time_range)*I3Units.ns
@@ -239,11 +495,15 @@ class CascadeFactory(icetray.I3ConditionalModule):
         # direction
         if 'azimuth' in self.constant_vars:
             azimuth = self.azimuth
+        elif sample is not None:
+            azimuth = sample['azimuth']
         else:
             azimuth = \
                 self.random_service.uniform(*self.azimuth_range)*I3Units.deg
         if 'zenith' in self.constant_vars:
             zenith = self.zenith
+        elif sample is not None:
+            zenith = sample['zenith']
         else:
             if self.sample_in_cos:
                 zenith = np.rad2deg(np.arccos(
@@ -255,12 +515,16 @@ class CascadeFactory(icetray.I3ConditionalModule):
         # energy
         if 'primary_energy' in self.constant_vars:
             log_primary_energy = self.log_primary_energy
+        elif sample is not None:
+            log_primary_energy = sample['log_primary_energy']
         else:
             log_primary_energy = self.random_service.uniform(
                                 *self.log_primary_energy_range) * I3Units.GeV
         primary_energy = 10**log_primary_energy
         if 'fractional_energy_in_hadrons' in self.constant_vars:
             fraction = self.fraction
+        elif sample is not None:
+            fraction = sample['fractional_energy_in_hadrons']
         else:
             fraction = self.random_service.uniform(
                                     *self.fractional_energy_in_hadrons_range)
@@ -270,15 +534,21 @@ class CascadeFactory(icetray.I3ConditionalModule):
         # flavor and interaction
         if 'flavor' in self.constant_vars:
             flavor = self.flavor
+        elif sample is not None:
+            flavor = sample['flavor']
         else:
             flavor = \
                 self.flavors[self.random_service.integer(self.num_flavors)]
         if 'interaction_type' in self.constant_vars:
             interaction_type = self.interaction_type
+        elif sample is not None:
+            interaction_type = sample['interaction_type']
         else:
             interaction_type = self.interaction_types[
                     self.random_service.integer(self.num_interaction_types)]
 
+        event_sampling_info = self.sampling_info.stop_event()
+
         # create pseduo I3MCWeightDict
         mc_dict = {}
         if interaction_type == 'cc':
@@ -287,6 +557,10 @@ class CascadeFactory(icetray.I3ConditionalModule):
         else:
             # Neutral Current Interaction: 2
             mc_dict['InteractionType'] = 2
+        if self.generation_volume is not None:
+            mc_dict['GenerationVolume'] = self.generation_volume
+        if self.record_sampling_info:
+            mc_dict.update(event_sampling_info)
         frame['I3MCWeightDict'] = dataclasses.I3MapStringDouble(mc_dict)
 
         # create particle
@@ -372,4 +646,6 @@ class CascadeFactory(icetray.I3ConditionalModule):
 
         self.events_done += 1
         if self.events_done >= self.num_events:
+            if self.record_sampling_info:
+                self._push_sampling_info()
             self.RequestSuspension()
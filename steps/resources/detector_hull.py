@@ -0,0 +1,502 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Detector hulls derived from the geometry in a GCD file.
+
+The hulls are computed once per GCD file and stored as a small .npz file
+keyed by the hash of the GCD file. Subsequent jobs on the same node load
+the cached hull instead of reading the GCD file again. Signed-distance
+grids of hulls are cached in the same way.
+'''
+import os
+import hashlib
+import tempfile
+
+import numpy as np
+from scipy.spatial import ConvexHull, HalfspaceIntersection
+
+from . import geometry
+
+
+# strings used to build the named hulls, None means all in-ice strings
+HULL_STRINGS = {
+    'IceCube': None,
+    'DeepCore': [26, 27, 35, 36, 37, 45, 46,
+                 79, 80, 81, 82, 83, 84, 85, 86],
+}
+
+# z-ranges of the named hulls, the DOMs of the strings are used if missing.
+# DeepCore only covers the deep part of its strings, the same z-range as
+# geometry.get_deepcore_prism is used.
+HULL_Z_RANGES = {
+    'DeepCore': [-502., 188.],
+}
+
+CACHE_DIR = os.environ.get(
+    'SIMULATION_SCRIPTS_CACHE',
+    os.path.join(tempfile.gettempdir(), 'simulation_scripts_cache'))
+
+_HULL_CACHE = {}
+_GRID_CACHE = {}
+_FILE_HASH_CACHE = {}
+
+
+class DetectorHull(object):
+    '''2D and 3D convex hull of (a subset of) the in-ice DOMs.
+
+    Parameters
+    ----------
+    points_2d : array-like shape=(?, 2)
+        Counterclockwise corner points of the hull in the x-y-plane.
+    z_min : float
+        Bottom of the hull.
+    z_max : float
+        Top of the hull.
+    points_3d : array-like shape=(?, 3)
+        Corner points of the 3D convex hull.
+    '''
+
+    def __init__(self, points_2d, z_min, z_max, points_3d):
+        self.points_2d = np.asarray(points_2d, dtype=float)
+        self.z_min = float(z_min)
+        self.z_max = float(z_max)
+        self.points_3d = np.asarray(points_3d, dtype=float)
+        self._prism = None
+        self._convex_hull_index = None
+
+    @property
+    def prism(self):
+        '''geometry.PolygonPrism defined by the 2D hull and z-range.
+        '''
+        if self._prism is None:
+            self._prism = geometry.PolygonPrism(
+                self.points_2d, self.z_min, self.z_max)
+        return self._prism
+
+    @property
+    def convex_hull_index(self):
+        '''geometry.ConvexHullIndex of the 3D hull.
+        '''
+        if self._convex_hull_index is None:
+            self._convex_hull_index = geometry.ConvexHullIndex(
+                ConvexHull(self.points_3d))
+        return self._convex_hull_index
+
+    def save(self, path):
+        '''Write the hull to an .npz file.
+
+        Parameters
+        ----------
+        path : str
+            Path to the .npz file.
+        '''
+        save_npz(path,
+                 points_2d=self.points_2d,
+                 z_range=np.array([self.z_min, self.z_max]),
+                 points_3d=self.points_3d)
+
+    @classmethod
+    def load(cls, path):
+        '''Load a hull from an .npz file written by DetectorHull.save.
+
+        Parameters
+        ----------
+        path : str
+            Path to the .npz file.
+
+        Returns
+        -------
+        DetectorHull
+            The loaded hull.
+        '''
+        with np.load(path) as data:
+            return cls(points_2d=data['points_2d'],
+                       z_min=data['z_range'][0],
+                       z_max=data['z_range'][1],
+                       points_3d=data['points_3d'])
+
+
+def save_npz(path, **arrays):
+    '''Atomically write arrays to an .npz file.
+
+    The file is written to a temporary file first and then moved, so
+    that concurrent jobs never read a partially written file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the .npz file.
+    **arrays
+        The arrays to save.
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # another job might have created it in the meantime
+            if not os.path.isdir(directory):
+                raise
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as open_file:
+        np.savez(open_file, **arrays)
+    os.rename(tmp_path, path)
+
+
+def get_file_hash(file_path, block_size=2**20):
+    '''Get the sha1 hash of a file.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file.
+    block_size : int, optional
+        Number of bytes read at once.
+
+    Returns
+    -------
+    str
+        Hex digest of the file content.
+    '''
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as open_file:
+        for block in iter(lambda: open_file.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def get_cached_file_hash(file_path, cache_dir):
+    '''Get the sha1 hash of a file, memoized by its path, size and mtime.
+
+    Hashing the file reads it completely. The hash is therefore stored in
+    `cache_dir`, so that subsequent jobs only need to stat the file.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file.
+    cache_dir : str
+        Directory of the cache.
+
+    Returns
+    -------
+    str
+        Hex digest of the file content.
+    '''
+    st = os.stat(file_path)
+    key = repr((os.path.abspath(file_path), st.st_size, st.st_mtime))
+    if key in _FILE_HASH_CACHE:
+        return _FILE_HASH_CACHE[key]
+
+    key_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    cache_file = os.path.join(cache_dir, 'file_hash_{}.txt'.format(key_hash))
+    file_hash = None
+    if os.path.isfile(cache_file):
+        with open(cache_file, 'r') as open_file:
+            file_hash = open_file.read().strip() or None
+    if file_hash is None:
+        file_hash = get_file_hash(file_path)
+        try:
+            if not os.path.isdir(cache_dir):
+                try:
+                    os.makedirs(cache_dir)
+                except OSError:
+                    # another job might have created it in the meantime
+                    if not os.path.isdir(cache_dir):
+                        raise
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as open_file:
+                open_file.write(file_hash)
+            os.rename(tmp_path, cache_file)
+        except (IOError, OSError) as e:
+            print('Could not write file hash cache {!r}: {}'.format(
+                cache_file, e))
+    _FILE_HASH_CACHE[key] = file_hash
+    return file_hash
+
+
+def read_dom_positions(gcd_file):
+    '''Read the positions of the in-ice DOMs from a GCD file.
+
+    Parameters
+    ----------
+    gcd_file : str
+        Path to the GCD file.
+
+    Returns
+    -------
+    strings : np.ndarray shape=(n_doms,)
+        String number of each DOM.
+    positions : np.ndarray shape=(n_doms, 3)
+        Positions of the DOMs.
+
+    Raises
+    ------
+    ValueError
+        If the GCD file does not contain an I3Geometry.
+    '''
+    from icecube import dataio, dataclasses
+
+    f = dataio.I3File(gcd_file)
+    try:
+        while f.more():
+            frame = f.pop_frame()
+            if 'I3Geometry' in frame:
+                omgeo = frame['I3Geometry'].omgeo
+                break
+        else:
+            raise ValueError('No I3Geometry found in {!r}'.format(gcd_file))
+    finally:
+        f.close()
+
+    strings = []
+    positions = []
+    for omkey, geo in omgeo.items():
+        if geo.omtype != dataclasses.I3OMGeo.OMType.IceCube:
+            continue
+        if omkey.om > 60:
+            # IceTop DOMs
+            continue
+        strings.append(omkey.string)
+        positions.append([geo.position.x, geo.position.y, geo.position.z])
+    return np.array(strings), np.array(positions)
+
+
+def pad_polygon(points, padding):
+    '''Move the edges of a counterclockwise convex polygon outwards.
+
+    Parameters
+    ----------
+    points : array-like shape=(?, 2)
+        Counterclockwise corner points of the polygon.
+    padding : float
+        Distance by which the edges are moved outwards.
+
+    Returns
+    -------
+    np.ndarray shape=(?, 2)
+        Corner points of the padded polygon.
+    '''
+    points = np.asarray(points, dtype=float)
+    edges = np.roll(points, -1, axis=0) - points
+    normals = np.stack((edges[:, 1], -edges[:, 0]), axis=1)
+    normals /= np.linalg.norm(normals, axis=1)[:, np.newaxis]
+
+    # corner i is shared by edge i - 1 and edge i
+    normals_prev = np.roll(normals, 1, axis=0)
+    miter = (normals_prev + normals) / (
+        1. + np.sum(normals_prev * normals, axis=1))[:, np.newaxis]
+    return points + padding * miter
+
+
+def build_detector_hull(gcd_file, strings=None, padding=0., z_range=None):
+    '''Build the detector hull from the geometry in a GCD file.
+
+    Parameters
+    ----------
+    gcd_file : str
+        Path to the GCD file.
+    strings : list of int, optional
+        Only use the DOMs on these strings. If None, all in-ice DOMs
+        are used.
+    padding : float, optional
+        Move the faces of the hulls outwards by this distance.
+    z_range : [float, float], optional
+        If provided, this z-range is used instead of the z-range of the
+        DOMs (before padding).
+
+    Returns
+    -------
+    DetectorHull
+        The detector hull.
+    '''
+    dom_strings, positions = read_dom_positions(gcd_file)
+    if strings is not None:
+        positions = positions[np.in1d(dom_strings, strings)]
+
+    if z_range is None:
+        z_min = np.min(positions[:, 2])
+        z_max = np.max(positions[:, 2])
+    else:
+        z_min, z_max = z_range
+
+    # scipy returns the 2D hull vertices in counterclockwise order
+    hull_2d = ConvexHull(positions[:, :2])
+    points_2d = pad_polygon(positions[hull_2d.vertices, :2], padding)
+
+    positions = positions[(positions[:, 2] >= z_min) &
+                          (positions[:, 2] <= z_max)]
+    hull_3d = ConvexHull(positions)
+    if padding != 0.:
+        halfspaces = np.array(hull_3d.equations)
+        halfspaces[:, 3] -= padding
+        interior_point = np.mean(positions[hull_3d.vertices], axis=0)
+        points_3d = HalfspaceIntersection(
+            halfspaces, interior_point).intersections
+    else:
+        points_3d = positions[hull_3d.vertices]
+
+    return DetectorHull(points_2d=points_2d,
+                        z_min=z_min - padding,
+                        z_max=z_max + padding,
+                        points_3d=points_3d)
+
+
+def get_detector_hull(gcd_file, strings=None, padding=0., z_range=None,
+                      cache_dir=None):
+    '''Get the detector hull for a GCD file from the cache or build it.
+
+    Parameters
+    ----------
+    gcd_file : str
+        Path to the GCD file.
+    strings : str or list of int, optional
+        Only use the DOMs on these strings. A key of HULL_STRINGS
+        (e.g. 'IceCube' or 'DeepCore') may be passed as well.
+        If None, all in-ice DOMs are used.
+    padding : float, optional
+        Move the faces of the hulls outwards by this distance.
+    z_range : [float, float], optional
+        If provided, this z-range is used instead of the z-range of the
+        DOMs (before padding). Defaults to the entry of HULL_Z_RANGES
+        for named hulls, i.e. -502 to 188 for 'DeepCore'.
+    cache_dir : str, optional
+        Directory of the .npz cache. Defaults to CACHE_DIR which can be
+        set via the environment variable SIMULATION_SCRIPTS_CACHE.
+
+    Returns
+    -------
+    DetectorHull
+        The detector hull.
+    '''
+    if isinstance(strings, str):
+        if z_range is None:
+            z_range = HULL_Z_RANGES.get(strings, None)
+        strings = HULL_STRINGS[strings]
+    if strings is not None:
+        strings = sorted(int(s) for s in strings)
+    if z_range is not None:
+        z_range = [float(z) for z in z_range]
+    if cache_dir is None:
+        cache_dir = CACHE_DIR
+
+    settings = repr((strings, float(padding), z_range))
+    memory_key = (os.path.abspath(gcd_file), settings)
+    if memory_key in _HULL_CACHE:
+        return _HULL_CACHE[memory_key]
+
+    settings_hash = hashlib.sha1(settings.encode('utf-8')).hexdigest()
+    cache_file = os.path.join(cache_dir, 'detector_hull_{}_{}.npz'.format(
+        get_cached_file_hash(gcd_file, cache_dir), settings_hash[:12]))
+    if os.path.isfile(cache_file):
+        hull = DetectorHull.load(cache_file)
+    else:
+        hull = build_detector_hull(gcd_file, strings=strings,
+                                   padding=padding, z_range=z_range)
+        try:
+            hull.save(cache_file)
+        except (IOError, OSError) as e:
+            print('Could not write detector hull cache {!r}: {}'.format(
+                cache_file, e))
+
+    _HULL_CACHE[memory_key] = hull
+    return hull
+
+
+def get_hull_hash(hull):
+    '''Get a hash identifying the shape of a hull.
+
+    Parameters
+    ----------
+    hull : geometry.PolygonPrism or geometry.ConvexHullIndex
+        The hull.
+
+    Returns
+    -------
+    str
+        Hex digest of the parameters defining the hull.
+
+    Raises
+    ------
+    TypeError
+        If the type of the hull is not supported.
+    '''
+    if isinstance(hull, geometry.PolygonPrism):
+        arrays = [hull.points, [hull.z_min, hull.z_max]]
+    elif isinstance(hull, geometry.ConvexHullIndex):
+        arrays = [hull.normals, hull.offsets]
+    else:
+        raise TypeError('Unsupported hull type: {!r}'.format(type(hull)))
+
+    sha1 = hashlib.sha1(type(hull).__name__.encode('utf-8'))
+    for array in arrays:
+        sha1.update(np.ascontiguousarray(array, dtype=float).tobytes())
+    return sha1.hexdigest()
+
+
+def get_hull_distance_grid(hull, x_range, y_range, z_range, resolution=5.,
+                           cache_dir=None):
+    '''Get a signed-distance grid of a hull from the cache or build it.
+
+    Parameters
+    ----------
+    hull : geometry.PolygonPrism, geometry.ConvexHullIndex or callable
+        The hull. Grids of a PolygonPrism or ConvexHullIndex are cached
+        on disk. A signed distance function f(positions) -> distances
+        accepting arrays of shape (N, 3) may be passed as well, in which
+        case the grid is only cached in memory.
+    x_range : [float, float]
+        [min, max] of the x-coordinate covered by the grid.
+    y_range : [float, float]
+        [min, max] of the y-coordinate covered by the grid.
+    z_range : [float, float]
+        [min, max] of the z-coordinate covered by the grid.
+    resolution : float, optional
+        Maximum spacing of the grid points.
+    cache_dir : str, optional
+        Directory of the .npz cache. Defaults to CACHE_DIR.
+
+    Returns
+    -------
+    geometry.HullDistanceGrid
+        The distance grid.
+    '''
+    if isinstance(hull, (geometry.PolygonPrism, geometry.ConvexHullIndex)):
+        hull_hash = get_hull_hash(hull)
+        distance_function = hull.distance
+    else:
+        hull_hash = None
+        distance_function = hull
+    if cache_dir is None:
+        cache_dir = CACHE_DIR
+
+    settings = repr((hull_hash if hull_hash is not None else id(hull),
+                     [float(x) for x in x_range],
+                     [float(y) for y in y_range],
+                     [float(z) for z in z_range],
+                     float(resolution)))
+    if settings in _GRID_CACHE:
+        return _GRID_CACHE[settings]
+
+    if hull_hash is None:
+        grid = geometry.HullDistanceGrid(
+            distance_function, x_range, y_range, z_range, resolution)
+    else:
+        settings_hash = hashlib.sha1(settings.encode('utf-8')).hexdigest()
+        cache_file = os.path.join(
+            cache_dir, 'hull_distance_grid_{}.npz'.format(settings_hash))
+        values = None
+        if os.path.isfile(cache_file):
+            with np.load(cache_file) as data:
+                values = data['values']
+        grid = geometry.HullDistanceGrid(
+            distance_function, x_range, y_range, z_range, resolution,
+            values=values)
+        if values is None:
+            try:
+                save_npz(cache_file, values=grid.values)
+            except (IOError, OSError) as e:
+                print('Could not write distance grid cache {!r}: {}'.format(
+                    cache_file, e))
+
+    _GRID_CACHE[settings] = grid
+    return grid
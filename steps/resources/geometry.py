@@ -56,6 +56,119 @@ def ray_triangle_intersection(ray_near, ray_dir, triangle):
     return t
 
 
+def ray_triangle_intersections(ray_near, ray_dir, triangles, eps=1e-6):
+    """Vectorized Möller–Trumbore intersection of many lines and triangles.
+
+    In contrast to ray_triangle_intersection, all triangles are tested at
+    once for a batch of N lines. The lines are treated as infinite, i.e.
+    negative t's (intersections 'behind' ray_near) are returned as well.
+
+    Parameters
+    ----------
+    ray_near : array-like shape=(N, 3)
+        Points on the lines.
+
+    ray_dir : array-like shape=(N, 3)
+        Directional vectors of the lines.
+
+    triangles : array-like shape=(M, 3, 3)
+        Triangles for which the interaction points should be found.
+
+    eps : float, optional
+        Lines with a determinant smaller than eps are treated as being
+        parallel to the triangle.
+
+    Returns
+    -------
+    t : np.ndarray shape=(N, M)
+        Intersection is ray_near + t * ray_dir or np.nan for no
+        intersection with the given triangle.
+    """
+    ray_near = np.asarray(ray_near, dtype=float)[:, np.newaxis, :]
+    ray_dir = np.asarray(ray_dir, dtype=float)[:, np.newaxis, :]
+    triangles = np.asarray(triangles, dtype=float)
+    v1 = triangles[np.newaxis, :, 0]
+    edge1 = triangles[np.newaxis, :, 1] - v1
+    edge2 = triangles[np.newaxis, :, 2] - v1
+
+    pvec = np.cross(ray_dir, edge2)
+    det = np.sum(edge1 * pvec, axis=-1)
+    is_parallel = np.abs(det) < eps
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv_det = 1. / np.where(is_parallel, 1., det)
+        tvec = ray_near - v1
+        u = np.sum(tvec * pvec, axis=-1) * inv_det
+        qvec = np.cross(tvec, edge1)
+        v = np.sum(ray_dir * qvec, axis=-1) * inv_det
+        t = np.sum(edge2 * qvec, axis=-1) * inv_det
+    mask = is_parallel | (u < 0.) | (u > 1.) | (v < 0.) | (u + v > 1.)
+    t[mask] = np.nan
+    return t
+
+
+def get_intersections_batch(convex_hull, v_pos, v_dir, eps=1e-4,
+                            chunk_size=4096):
+    '''Function to get the entry and exit points of many infinite lines
+    and the convex hull. All triangles of the hull are tested at once and
+    the lines are processed in chunks of chunk_size.
+
+    Parameters
+    ----------
+    convex_hull : scipy.spatial.ConvexHull
+        defining the desired convex volume
+
+    v_pos : array-like shape=(N, 3)
+        A point of each line.
+
+    v_dir : array-like shape=(N, 3)
+        Directional vector of each line.
+
+    eps : float, optional
+        Min distance between intersection points to be treated as
+        different points. If entry and exit point are closer than this,
+        only the entry point is returned.
+
+    chunk_size : int, optional
+        Number of lines that are processed at once. This limits the
+        memory usage to chunk_size x n_simplices intermediate values.
+
+    Returns
+    -------
+    t : np.ndarray shape=(N, 2)
+        Scaling factors for v_dir to get the entry [:, 0] and the exit
+        [:, 1] point. Missing intersections are padded with np.nan.
+        Actual intersection points are v_pos + t * v_dir.
+    '''
+    v_pos = np.atleast_2d(np.asarray(v_pos, dtype=float))
+    v_dir = np.atleast_2d(np.asarray(v_dir, dtype=float))
+    v_pos, v_dir = np.broadcast_arrays(v_pos, v_dir)
+    triangles = convex_hull.points[convex_hull.simplices]
+
+    t_s = np.full((len(v_pos), 2), np.nan)
+    for start in range(0, len(v_pos), chunk_size):
+        stop = start + chunk_size
+        t_all = ray_triangle_intersections(v_pos[start:stop],
+                                           v_dir[start:stop],
+                                           triangles)
+        has_intersection = np.isfinite(t_all).any(axis=1)
+        if not has_intersection.any():
+            continue
+        t_entry = np.full(len(t_all), np.nan)
+        t_exit = np.full(len(t_all), np.nan)
+        t_entry[has_intersection] = np.nanmin(t_all[has_intersection], axis=1)
+        t_exit[has_intersection] = np.nanmax(t_all[has_intersection], axis=1)
+        t_s[start:stop, 0] = t_entry
+        t_s[start:stop, 1] = t_exit
+
+    if eps is not None and eps >= 0.:
+        # Remove similar intersections, e.g. a line touching the hull
+        # at an edge or vertex
+        dir_norm = np.linalg.norm(v_dir, axis=1)
+        is_same = (t_s[:, 1] - t_s[:, 0]) * dir_norm < eps
+        t_s[is_same, 1] = np.nan
+    return t_s
+
+
 def get_intersections(convex_hull, v_pos, v_dir, eps=1e-4):
     '''Function to get the intersection points of an infinite line and the
     convex hull. The returned t's are the scaling factors for v_dir to
@@ -83,63 +196,318 @@ def get_intersections(convex_hull, v_pos, v_dir, eps=1e-4):
         Scaling factors for v_dir to get the intersection points.
         Actual intersection points are v_pos + t * v_dir.
     '''
-    if not isinstance(v_pos, np.ndarray):
-        v_pos = np.array(v_pos)
-    if not isinstance(v_dir, np.ndarray):
-        v_dir = np.array(v_dir)
-    t_s = [ray_triangle_intersection(v_pos,
-                                     v_dir,
-                                     convex_hull.points[simp])
-           for simp in convex_hull.simplices]
-    t_s = np.array(t_s)
-    t_s = t_s[np.isfinite(t_s)]
-    if len(t_s) != 2:   # A line should have at max 2 intersection points
-                        # with a convex hull
-        t_s_back = [ray_triangle_intersection(v_pos,
-                                              -v_dir,
-                                              convex_hull.points[simp])
-                    for simp in convex_hull.simplices]
-        t_s_back = np.array(t_s_back)
-        t_s_back = t_s_back[np.isfinite(t_s_back)]
-        t_s = np.hstack((t_s, t_s_back * (-1.)))
-    if isinstance(eps, float):  # Remove similar intersections
-        if eps >= 0.:
-            t_selected = []
-            intersections = []
-            for t_i in t_s:
-                intersection_i = v_pos + t_i * v_dir
-                distances = [np.linalg.norm(intersection_i - intersection_j)
-                             for intersection_j in intersections]
-                if not (np.array(distances) < eps).any():
-                    t_selected.append(t_i)
-                    intersections.append(intersection_i)
-            t_s = np.array(t_selected)
-    return t_s
+    if isinstance(eps, float) and eps >= 0.:
+        t_s = get_intersections_batch(convex_hull, v_pos, v_dir, eps=eps)[0]
+    else:
+        # keep all intersections, including duplicates at shared edges
+        t_s = ray_triangle_intersections(
+            np.atleast_2d(v_pos), np.atleast_2d(v_dir),
+            convex_hull.points[convex_hull.simplices])[0]
+    return t_s[np.isfinite(t_s)]
+
+
+class ConvexHullIndex(object):
+    '''Half-space representation of a convex hull.
+
+    The outward face normals and offsets of the hull are cached once, so
+    that inside tests, distances to the face planes and line clipping
+    are computed for many points/tracks at once in O(n_faces).
+    A point x is inside the hull if normals.dot(x) + offsets <= 0 holds
+    for all faces.
+
+    Parameters
+    ----------
+    convex_hull : scipy.spatial.ConvexHull
+        defining the desired convex volume
+    '''
+
+    def __init__(self, convex_hull):
+        self.convex_hull = convex_hull
+
+        # coplanar simplices of a facet share the same plane equation
+        equations = np.unique(np.round(convex_hull.equations, 10), axis=0)
+        self.normals = np.ascontiguousarray(equations[:, :3])
+        self.offsets = np.ascontiguousarray(equations[:, 3])
+
+        # triangles and (unique) edges for distances of outside points
+        self.triangles = convex_hull.points[convex_hull.simplices]
+        self.triangle_normals = convex_hull.equations[:, :3]
+        self.triangle_edges = np.roll(self.triangles, -1, axis=1) \
+            - self.triangles
+        edges = np.concatenate([convex_hull.simplices[:, [0, 1]],
+                                convex_hull.simplices[:, [1, 2]],
+                                convex_hull.simplices[:, [2, 0]]])
+        edges = np.unique(np.sort(edges, axis=1), axis=0)
+        self.edge_starts = convex_hull.points[edges[:, 0]]
+        self.edge_vectors = convex_hull.points[edges[:, 1]] \
+            - self.edge_starts
+        self.edge_norms2 = np.sum(self.edge_vectors**2, axis=1)
+
+    @classmethod
+    def from_points(cls, points):
+        '''Build the index from the corner points of the hull.
+
+        Parameters
+        ----------
+        points : array-like shape=(?, 3)
+            Points of which the convex hull is computed.
+
+        Returns
+        -------
+        ConvexHullIndex
+            The half-space representation of the convex hull.
+        '''
+        from scipy.spatial import ConvexHull
+        return cls(ConvexHull(points))
+
+    def plane_distances(self, points):
+        '''Signed distances of the points to all face planes.
+
+        Parameters
+        ----------
+        points : array-like shape=(N, 3)
+            Positions.
+
+        Returns
+        -------
+        distances : np.ndarray shape=(N, n_faces)
+            Positive if the point is in front of (outside) the face plane.
+        '''
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        return points.dot(self.normals.T) + self.offsets
+
+    def signed_plane_distance(self, points):
+        '''Signed distance to the hull based on the face planes.
+
+        For points inside the hull this is the exact (negative) distance
+        to the hull surface. For points outside it is the distance to the
+        furthest face plane, which is a lower bound of the true distance.
+
+        Parameters
+        ----------
+        points : array-like shape=(N, 3)
+            Positions.
+
+        Returns
+        -------
+        distance : np.ndarray shape=(N,)
+            negativ if point is inside,
+            positiv if point is outside
+        '''
+        return np.max(self.plane_distances(points), axis=1)
+
+    def contains(self, points, eps=0.):
+        '''Check whether the points are inside the hull.
+
+        Parameters
+        ----------
+        points : array-like shape=(N, 3)
+            Positions.
+
+        eps : float, optional
+            Tolerance. Points up to a distance of eps outside of the
+            hull surface are treated as being inside the hull.
+
+        Returns
+        -------
+        is_inside : np.ndarray of bool shape=(N,)
+            True if the point is inside the hull.
+        '''
+        return self.signed_plane_distance(points) <= eps
+
+    def _outside_distance(self, points):
+        '''Exact distance of points outside of the hull to its surface.
+
+        The closest point is either the projection onto a face (if the
+        projection lies within the face triangle) or lies on one of the
+        hull edges, which also covers the vertex regions.
+
+        Parameters
+        ----------
+        points : np.ndarray shape=(N, 3)
+            Positions outside of the hull.
+
+        Returns
+        -------
+        distance : np.ndarray shape=(N,)
+            Closest distance to the hull surface.
+        '''
+        points = points[:, np.newaxis, :]
+
+        # face regions
+        vec_point = points[:, :, np.newaxis, :] - self.triangles
+        face_distance = np.sum(vec_point[:, :, 0] * self.triangle_normals,
+                               axis=-1)
+        projected = vec_point - face_distance[..., np.newaxis, np.newaxis] \
+            * self.triangle_normals[:, np.newaxis, :]
+        orientation = np.sum(
+            np.cross(self.triangle_edges, projected)
+            * self.triangle_normals[:, np.newaxis, :], axis=-1)
+        # simplex vertices are not consistently ordered w.r.t. the normal
+        is_in_face = np.all(orientation >= 0., axis=-1) | \
+            np.all(orientation <= 0., axis=-1)
+        face_distance = np.where(is_in_face, np.abs(face_distance), np.inf)
+
+        # edge and vertex regions
+        vec_point = points - self.edge_starts
+        t_projection = np.clip(
+            np.sum(vec_point * self.edge_vectors, axis=-1)
+            / self.edge_norms2, 0., 1.)
+        vec_closest = vec_point - t_projection[..., np.newaxis] \
+            * self.edge_vectors
+        edge_distance = np.sqrt(np.sum(vec_closest**2, axis=-1))
+
+        return np.minimum(np.min(face_distance, axis=1),
+                          np.min(edge_distance, axis=1))
+
+    def distance(self, pos, chunk_size=4096):
+        '''Exact signed distance to the hull surface.
+
+        Parameters
+        ----------
+        pos : I3Position, list of I3Position or array-like shape=(N, 3)
+            Position(s).
+
+        chunk_size : int, optional
+            Number of outside points that are processed at once.
+
+        Returns
+        -------
+        distance : float or np.ndarray shape=(N,)
+            closest distance from the point
+            to the hull surface
+            negativ if point is inside,
+            positiv if point is outside.
+            A float is returned if a single position is passed.
+        '''
+        positions, is_single = get_positions_array(pos)
+
+        # inside the hull the closest face plane is the closest face
+        distance = self.signed_plane_distance(positions)
+        outside = np.flatnonzero(distance > 0.)
+        for start in range(0, len(outside), chunk_size):
+            indices = outside[start:start + chunk_size]
+            distance[indices] = self._outside_distance(positions[indices])
+
+        if is_single:
+            return float(distance[0])
+        return distance
+
+    def clip(self, v_pos, v_dir):
+        '''Cyrus–Beck clipping of infinite lines against the hull.
+
+        Parameters
+        ----------
+        v_pos : array-like shape=(N, 3)
+            A point of each line.
+
+        v_dir : array-like shape=(N, 3)
+            Directional vector of each line.
+
+        Returns
+        -------
+        t : np.ndarray shape=(N, 2)
+            Scaling factors for v_dir to get the entry [:, 0] and the exit
+            [:, 1] point. Lines that miss the hull are set to np.nan.
+            Actual intersection points are v_pos + t * v_dir.
+        '''
+        v_pos = np.atleast_2d(np.asarray(v_pos, dtype=float))
+        v_dir = np.atleast_2d(np.asarray(v_dir, dtype=float))
+        v_pos, v_dir = np.broadcast_arrays(v_pos, v_dir)
+
+        numerator = -self.plane_distances(v_pos)
+        denominator = v_dir.dot(self.normals.T)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = numerator / denominator
+
+        # line enters through faces facing it and exits through the others
+        t_entry = np.max(np.where(denominator < 0, t, -np.inf), axis=1)
+        t_exit = np.min(np.where(denominator > 0, t, np.inf), axis=1)
+
+        # lines parallel to a face plane and outside of it miss the hull
+        is_parallel_outside = np.any(
+            (denominator == 0) & (numerator < 0), axis=1)
+        misses = is_parallel_outside | (t_entry > t_exit)
+        t_s = np.stack((t_entry, t_exit), axis=1)
+        t_s[misses] = np.nan
+        return t_s
+
+    def track_length_inside(self, v_pos, v_dir, t_min=0., t_max=np.inf):
+        '''Length of the tracks inside of the hull.
+
+        Parameters
+        ----------
+        v_pos : I3Position or array-like shape=(N, 3)
+            A point of each track.
+        v_dir : I3Direction or array-like shape=(N, 3)
+            Directional vector of each track.
+        t_min : float or array-like shape=(N,), optional
+            The tracks start at v_pos + t_min * v_dir.
+        t_max : float or array-like shape=(N,), optional
+            The tracks end at v_pos + t_max * v_dir.
+
+        Returns
+        -------
+        length : float or np.ndarray shape=(N,)
+            Length of the tracks inside of the hull in units of v_dir.
+        '''
+        v_pos, is_single = get_positions_array(v_pos)
+        v_dir, _ = get_positions_array(v_dir)
+        t_s = self.clip(v_pos, v_dir)
+        t_entry = np.maximum(t_s[:, 0], t_min)
+        t_exit = np.minimum(t_s[:, 1], t_max)
+        dir_norm = np.linalg.norm(np.broadcast_to(v_dir, t_s.shape[:1] + (3,)),
+                                  axis=1)
+        with np.errstate(invalid='ignore'):
+            length = np.where(t_exit > t_entry, t_exit - t_entry, 0.) \
+                * dir_norm
+        if is_single:
+            return float(length[0])
+        return length
+
+
+def get_convex_hull_index(convex_hull):
+    '''Get the half-space representation of a convex hull.
+
+    Parameters
+    ----------
+    convex_hull : scipy.spatial.ConvexHull or ConvexHullIndex
+        defining the desired convex volume
+
+    Returns
+    -------
+    ConvexHullIndex
+        The passed index or a newly created one.
+    '''
+    if isinstance(convex_hull, ConvexHullIndex):
+        return convex_hull
+    return ConvexHullIndex(convex_hull)
 
 
 def point_is_inside(convex_hull,
                     v_pos,
-                    default_v_dir=np.array([0., 0., 1.]),
+                    default_v_dir=None,
                     eps=1e-4):
     '''Function to determine if a point is inside the convex hull.
-    A default directional vector is asumend. If this track has an intersection
-    in front and behind v_pos, then must v_pos be inside the hull.
+    The point is inside if it is behind all face planes of the hull.
     The rare case of a point inside the hull surface is treated as
     being inside the hull.
 
     Parameters
     ----------
-    convex_hull : scipy.spatial.ConvexHull
-        defining the desired convex volume
+    convex_hull : scipy.spatial.ConvexHull or ConvexHullIndex
+        defining the desired convex volume. Pass a ConvexHullIndex
+        to avoid recomputing the face planes for every call.
 
     v_pos : array-like shape=(3,)
         Position.
 
-    default_v_dir : array-like shape=(3,), optional (default=[0, 0, 1])
-        See get_intersections()
+    default_v_dir : None
+        Not used anymore. Only kept for backwards compatibility.
 
     eps : float or None
-        See get_intersections()
+        Points up to a distance of eps outside of the hull surface are
+        treated as being inside.
 
     Returns
     -------
@@ -147,8 +515,10 @@ def point_is_inside(convex_hull,
         True if the point is inside the detector.
         False if the point is outside the detector
     '''
-    t_s = get_intersections(convex_hull, v_pos, default_v_dir, eps)
-    return len(t_s) == 2 and (t_s >= 0).any() and (t_s <= 0).any()
+    if eps is None:
+        eps = 0.
+    hull_index = get_convex_hull_index(convex_hull)
+    return bool(hull_index.contains(v_pos, eps=eps)[0])
 
 
 def distance_to_convex_hull(convex_hull, v_pos):
@@ -157,22 +527,22 @@ def distance_to_convex_hull(convex_hull, v_pos):
 
     Parameters
     ----------
-    convex_hull : scipy.spatial.ConvexHull
-        defining the desired convex volume
+    convex_hull : scipy.spatial.ConvexHull or ConvexHullIndex
+        defining the desired convex volume. Pass a ConvexHullIndex
+        to avoid recomputing the faces and edges for every call.
 
-    v_pos : array-like shape=(3,)
-        Position.
+    v_pos : I3Position or array-like shape=(3,) or shape=(N, 3)
+        Position(s).
 
     Returns
     -------
-    distance: float
-        absolute value of closest distance from the point
+    distance: float or np.ndarray shape=(N,)
+        closest distance from the point
         to the convex hull
-        (maybe easier/better to have distance poositive
-         or negativ depending on wheter the point is inside
-         or outside. Alernatively check with point_is_inside)
+        negativ if point is inside,
+        positiv if point is outside
     '''
-    raise NotImplementedError
+    return get_convex_hull_index(convex_hull).distance(v_pos)
 
 
 def get_closest_point_on_edge(edge_point1, edge_point2, point):
@@ -286,6 +656,908 @@ def get_edge_intersection(edge_point1, edge_point2, point):
     return float('nan')
 
 
+def get_positions_array(pos):
+    '''Convert positions to a numpy array.
+
+    Parameters
+    ----------
+    pos : I3Position, list of I3Position or array-like shape=(N, 3)
+        Position(s).
+
+    Returns
+    -------
+    positions : np.ndarray shape=(N, 3)
+        The positions as numpy array.
+    is_single : bool
+        True if only a single position was passed.
+    '''
+    if hasattr(pos, 'x') and hasattr(pos, 'y') and hasattr(pos, 'z'):
+        return np.array([[pos.x, pos.y, pos.z]]), True
+    if isinstance(pos, (list, tuple)) and len(pos) > 0 and \
+            hasattr(pos[0], 'x'):
+        return np.array([[p.x, p.y, p.z] for p in pos], dtype=float), False
+    positions = np.asarray(pos, dtype=float)
+    if positions.ndim == 1:
+        return positions[np.newaxis], True
+    return positions, False
+
+
+def solve_quadratic(c2, c1, c0, eps=1e-12):
+    '''Vectorized real roots of c2 * t**2 + c1 * t + c0 = 0.
+
+    Parameters
+    ----------
+    c2, c1, c0 : array-like
+        Coefficients of the quadratic equations. Equations with
+        abs(c2) < eps are solved as linear equations.
+
+    Returns
+    -------
+    t1, t2 : np.ndarray
+        The two roots or np.nan where there is no (second) real root.
+    '''
+    c2, c1, c0 = np.broadcast_arrays(np.asarray(c2, dtype=float),
+                                     np.asarray(c1, dtype=float),
+                                     np.asarray(c0, dtype=float))
+    is_linear = np.abs(c2) < eps
+    discriminant = c1**2 - 4 * c2 * c0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sqrt_discriminant = np.sqrt(discriminant)
+        t1 = np.where(is_linear, -c0 / c1,
+                      (-c1 - sqrt_discriminant) / (2 * c2))
+        t2 = np.where(is_linear, np.nan,
+                      (-c1 + sqrt_discriminant) / (2 * c2))
+    t1[~np.isfinite(t1)] = np.nan
+    t2[~np.isfinite(t2)] = np.nan
+    return t1, t2
+
+
+class PolygonPrism(object):
+    '''Volume defined by z_min, z_max and a 2D-Polygon in the x-y-plane.
+
+    The edge vectors of the polygon and their squared norms are computed
+    once, so that signed distances of many positions can be calculated
+    in one vectorized pass.
+
+    Parameters
+    ----------
+    points : array-like shape=(?, 2) or (?, 3)
+        List of counterclockwise points
+        describing the polygon of the volume
+        in the x-y-plane. A z-coordinate is ignored.
+    z_min : float
+        Bottom layer of the volume
+    z_max : float
+        Top layer of the volume
+    '''
+
+    def __init__(self, points, z_min, z_max):
+        self.points = np.asarray(points, dtype=float)[:, :2]
+        self.z_min = z_min
+        self.z_max = z_max
+        self.edge_starts = self.points
+        self.edge_ends = np.roll(self.points, -1, axis=0)
+        self.edge_vectors = self.edge_ends - self.edge_starts
+        self.edge_norms2 = np.sum(self.edge_vectors**2, axis=1)
+
+        # outward normals of the counterclockwise polygon
+        self.edge_normals = np.stack((self.edge_vectors[:, 1],
+                                      -self.edge_vectors[:, 0]), axis=1)
+        self.edge_normals /= np.sqrt(self.edge_norms2)[:, np.newaxis]
+
+    def xy_distance(self, positions):
+        '''Distance to the polygon in the x-y-plane.
+
+        Parameters
+        ----------
+        positions : array-like shape=(N, 2) or (N, 3)
+            Positions. A z-coordinate is ignored.
+
+        Returns
+        -------
+        distance : np.ndarray shape=(N,)
+            Closest distance to the polygon edges.
+        is_inside : np.ndarray of bool shape=(N,)
+            True if the position is inside the polygon.
+        '''
+        xy = np.asarray(positions, dtype=float)[:, np.newaxis, :2]
+
+        # closest point on each edge
+        vec_point = xy - self.edge_starts
+        t_projection = np.sum(vec_point * self.edge_vectors, axis=-1) \
+            / self.edge_norms2
+        t_clipped = np.clip(t_projection, 0., 1.)
+        vec_closest = vec_point - t_clipped[..., np.newaxis] \
+            * self.edge_vectors
+        distance = np.sqrt(np.min(np.sum(vec_closest**2, axis=-1), axis=1))
+
+        # even-odd rule: count edges crossed by a ray in +y direction
+        x = xy[..., 0]
+        y = xy[..., 1]
+        x1 = self.edge_starts[:, 0]
+        x2 = self.edge_ends[:, 0]
+        spans_x = (x1 <= x) != (x2 <= x)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y_edge = self.edge_starts[:, 1] + (x - x1) / (x2 - x1) \
+                * self.edge_vectors[:, 1]
+        n_crossings = np.sum(spans_x & (y_edge >= y), axis=1)
+        is_inside = (n_crossings % 2 == 1) | (distance == 0.)
+        return distance, is_inside
+
+    def distance(self, pos):
+        '''Signed distance to the surface of the volume.
+
+        Parameters
+        ----------
+        pos : I3Position, list of I3Position or array-like shape=(N, 3)
+            Position(s).
+
+        Returns
+        -------
+        distance : float or np.ndarray shape=(N,)
+            closest distance from the point
+            to the edge of the volume
+            negativ if point is inside,
+            positiv if point is outside.
+            A float is returned if a single position is passed.
+        '''
+        positions, is_single = get_positions_array(pos)
+        xy_distance, is_inside_xy = self.xy_distance(positions)
+
+        z = positions[:, 2]
+        is_inside_z = (z >= self.z_min) & (z < self.z_max)
+        z_distance = np.where(
+            is_inside_z,
+            np.minimum(z - self.z_min, self.z_max - z),
+            np.maximum(self.z_min - z, z - self.z_max))
+
+        distance = np.where(
+            is_inside_z,
+            np.where(is_inside_xy,
+                     -np.minimum(xy_distance, z_distance),
+                     xy_distance),
+            np.where(is_inside_xy,
+                     z_distance,
+                     np.sqrt(z_distance**2 + xy_distance**2)))
+        if is_single:
+            return float(distance[0])
+        return distance
+
+    def _get_track_forms(self, v_pos, v_dir):
+        '''Linear and quadratic forms of the distance components along
+        the lines v_pos + t * v_dir.
+
+        The signed distance along a line is built piecewise out of the
+        distances to the edge lines of the polygon (linear in t), to the
+        polygon corners (square root of a quadratic in t) and to the top
+        and bottom layer (linear in t), combined in quadrature outside of
+        the volume.
+
+        Returns
+        -------
+        linear : tuple of np.ndarray shape=(N, n_linear)
+            (a, b) with the forms a + b * t.
+        quadratic : tuple of np.ndarray shape=(N, n_quadratic)
+            (c0, c1, c2) with the forms c0 + c1 * t + c2 * t**2 of the
+            squared distances.
+        corners : tuple of np.ndarray shape=(N, n_points)
+            (c0, c1, c2) of the squared xy-distances to the corners.
+        '''
+        xy = v_pos[:, np.newaxis, :2]
+        dir_xy = v_dir[:, np.newaxis, :2]
+
+        # signed distances to edge lines and top/bottom layer
+        a_edge = np.sum((xy - self.edge_starts) * self.edge_normals, axis=-1)
+        b_edge = np.sum(dir_xy * self.edge_normals, axis=-1)
+        a_z = np.stack((self.z_min - v_pos[:, 2], v_pos[:, 2] - self.z_max),
+                       axis=1)
+        b_z = np.stack((-v_dir[:, 2], v_dir[:, 2]), axis=1)
+        a_lin = np.concatenate((a_edge, a_z), axis=1)
+        b_lin = np.concatenate((b_edge, b_z), axis=1)
+
+        # squared distances to polygon corners
+        vec_corner = xy - self.points
+        c0_corner = np.sum(vec_corner**2, axis=-1)
+        c1_corner = 2 * np.sum(vec_corner * dir_xy, axis=-1)
+        c2_corner = np.broadcast_to(np.sum(dir_xy**2, axis=-1),
+                                    c0_corner.shape)
+
+        # combinations with the z-distance outside of the volume
+        c0_list = [c0_corner]
+        c1_list = [c1_corner]
+        c2_list = [c2_corner]
+        for k in range(2):
+            a_k = a_z[:, k:k + 1]
+            b_k = b_z[:, k:k + 1]
+            c0_list.extend([c0_corner + a_k**2, a_edge**2 + a_k**2])
+            c1_list.extend([c1_corner + 2 * a_k * b_k,
+                            2 * (a_edge * b_edge + a_k * b_k)])
+            c2_list.extend([c2_corner + b_k**2, b_edge**2 + b_k**2])
+        quadratic = (np.concatenate(c0_list, axis=1),
+                     np.concatenate(c1_list, axis=1),
+                     np.concatenate(c2_list, axis=1))
+        return (a_lin, b_lin), quadratic, (c0_corner, c1_corner, c2_corner)
+
+    def _get_track_candidates(self, v_pos, v_dir, desired_distance=None):
+        '''Candidate t's along the lines at which the signed distance
+        has a kink, a stationary point or equals the desired distance.
+
+        Parameters
+        ----------
+        v_pos : np.ndarray shape=(N, 3)
+            A point of each line.
+        v_dir : np.ndarray shape=(N, 3)
+            Directional vector of each line.
+        desired_distance : float or array-like shape=(N,), optional
+            If provided, the roots of all distance forms for this
+            distance are included.
+
+        Returns
+        -------
+        t : np.ndarray shape=(N, n_candidates)
+            Candidate t's, np.nan for candidates that do not exist.
+        '''
+        (a_lin, b_lin), (c0, c1, c2), (r0, r1, r2) = \
+            self._get_track_forms(v_pos, v_dir)
+        n_lin = a_lin.shape[1]
+        candidates = []
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # plane crossings
+            candidates.append(-a_lin / b_lin)
+
+            # stationary points of the squared distances
+            candidates.append(-c1 / (2 * c2))
+
+            # equal linear forms (kinks inside of the volume)
+            i, j = np.triu_indices(n_lin, k=1)
+            candidates.append((a_lin[:, j] - a_lin[:, i])
+                              / (b_lin[:, i] - b_lin[:, j]))
+
+            # equal corner distances
+            i, j = np.triu_indices(r0.shape[1], k=1)
+            candidates.append((r0[:, j] - r0[:, i]) / (r1[:, i] - r1[:, j]))
+
+            # boundaries of the edge regions
+            xy = v_pos[:, np.newaxis, :2]
+            dir_xy = v_dir[:, np.newaxis, :2]
+            u_0 = np.sum((xy - self.edge_starts) * self.edge_vectors,
+                         axis=-1)
+            u_1 = np.sum(dir_xy * self.edge_vectors, axis=-1)
+            candidates.append(-u_0 / u_1)
+            candidates.append((self.edge_norms2 - u_0) / u_1)
+
+        # corner distance equal to a linear form
+        a_rep = np.repeat(a_lin, r0.shape[1], axis=1)
+        b_rep = np.repeat(b_lin, r0.shape[1], axis=1)
+        candidates.extend(solve_quadratic(
+            np.tile(r2, n_lin) - b_rep**2,
+            np.tile(r1, n_lin) - 2 * a_rep * b_rep,
+            np.tile(r0, n_lin) - a_rep**2))
+
+        # level set of the desired distance
+        if desired_distance is not None:
+            desired_distance = np.reshape(desired_distance, (-1, 1))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                candidates.append((desired_distance - a_lin) / b_lin)
+            candidates.extend(solve_quadratic(c2, c1,
+                                              c0 - desired_distance**2))
+
+        t = np.concatenate(candidates, axis=1)
+        t[~np.isfinite(t)] = np.nan
+        return t
+
+    def _evaluate_track(self, v_pos, v_dir, t, t_min, t_max):
+        '''Evaluate the signed distance at the candidate t's that are
+        within [t_min, t_max]. The range boundaries are added as candidates
+        if they are finite.
+
+        Returns
+        -------
+        t : np.ndarray shape=(N, n_candidates)
+            Candidate t's, np.nan if outside of the allowed range.
+        distance : np.ndarray shape=(N, n_candidates)
+            Signed distance at the candidates, np.nan for invalid ones.
+        '''
+        t_min = np.broadcast_to(np.asarray(t_min, dtype=float),
+                                (len(v_pos),))[:, np.newaxis]
+        t_max = np.broadcast_to(np.asarray(t_max, dtype=float),
+                                (len(v_pos),))[:, np.newaxis]
+        t = np.concatenate((t, np.where(np.isfinite(t_min), t_min, np.nan),
+                            np.where(np.isfinite(t_max), t_max, np.nan)),
+                           axis=1)
+        with np.errstate(invalid='ignore'):
+            t[(t < t_min) | (t > t_max)] = np.nan
+
+        # only evaluate the valid candidates
+        rows, columns = np.nonzero(np.isfinite(t))
+        positions = v_pos[rows] + \
+            t[rows, columns][:, np.newaxis] * v_dir[rows]
+        distance = np.full(t.shape, np.nan)
+        distance[rows, columns] = self.distance(positions)
+        return t, distance
+
+    def find_distance_on_track(self, v_pos, v_dir, desired_distance,
+                               t_min=-np.inf, t_max=np.inf, atol=1e-6):
+        '''Find the point on the tracks with the desired signed distance.
+
+        The solution is found analytically: the signed distance along a
+        line is piecewise composed of linear and square-rooted quadratic
+        functions of t, so all points at which it equals the desired
+        distance and all of its extrema are roots of linear or quadratic
+        equations.
+
+        Parameters
+        ----------
+        v_pos : I3Position or array-like shape=(N, 3)
+            A point of each track.
+        v_dir : I3Direction or array-like shape=(N, 3)
+            Directional vector of each track.
+        desired_distance : float or array-like shape=(N,)
+            Desired signed distance to the volume.
+        t_min : float or array-like shape=(N,), optional
+            Only search for points with t >= t_min.
+        t_max : float or array-like shape=(N,), optional
+            Only search for points with t <= t_max.
+        atol : float, optional
+            Absolute tolerance of the distance at found points.
+
+        Returns
+        -------
+        t : float or np.ndarray shape=(N,)
+            The t of the point closest to t=0 that has the desired distance.
+            If no such point exists, the point with the distance closest
+            to the desired distance is returned.
+            Actual points are v_pos + t * v_dir.
+        loss : float or np.ndarray shape=(N,)
+            Squared difference of the distance at the point and the
+            desired distance.
+        '''
+        v_pos, is_single = get_positions_array(v_pos)
+        v_dir, _ = get_positions_array(v_dir)
+        v_pos, v_dir = np.broadcast_arrays(v_pos, v_dir)
+        desired_distance = np.broadcast_to(
+            np.asarray(desired_distance, dtype=float), (len(v_pos),))
+
+        t = self._get_track_candidates(v_pos, v_dir, desired_distance)
+        t, distance = self._evaluate_track(v_pos, v_dir, t, t_min, t_max)
+        loss = (distance - desired_distance[:, np.newaxis])**2
+        loss[np.isnan(loss)] = np.inf
+
+        # prefer the exact solution closest to t=0
+        is_solution = loss < atol**2
+        abs_t = np.where(is_solution, np.abs(t), np.inf)
+        index = np.where(is_solution.any(axis=1),
+                         np.argmin(abs_t, axis=1),
+                         np.argmin(loss, axis=1))
+        rows = np.arange(len(t))
+        t_best = t[rows, index]
+        loss_best = loss[rows, index]
+        if is_single:
+            return float(t_best[0]), float(loss_best[0])
+        return t_best, loss_best
+
+    def closest_approach(self, v_pos, v_dir, t_min=-np.inf, t_max=np.inf):
+        '''Find the point of the tracks with the smallest signed distance.
+
+        Parameters
+        ----------
+        v_pos : I3Position or array-like shape=(N, 3)
+            A point of each track.
+        v_dir : I3Direction or array-like shape=(N, 3)
+            Directional vector of each track.
+        t_min : float or array-like shape=(N,), optional
+            Only search for points with t >= t_min.
+        t_max : float or array-like shape=(N,), optional
+            Only search for points with t <= t_max.
+
+        Returns
+        -------
+        t : float or np.ndarray shape=(N,)
+            The t of the closest approach.
+            Actual points are v_pos + t * v_dir.
+        distance : float or np.ndarray shape=(N,)
+            Signed distance at the closest approach.
+        '''
+        v_pos, is_single = get_positions_array(v_pos)
+        v_dir, _ = get_positions_array(v_dir)
+        v_pos, v_dir = np.broadcast_arrays(v_pos, v_dir)
+
+        t = self._get_track_candidates(v_pos, v_dir)
+        t, distance = self._evaluate_track(v_pos, v_dir, t, t_min, t_max)
+        distance_ = np.where(np.isnan(distance), np.inf, distance)
+        index = np.argmin(distance_, axis=1)
+        rows = np.arange(len(t))
+        t_best = t[rows, index]
+        distance_best = distance[rows, index]
+        if is_single:
+            return float(t_best[0]), float(distance_best[0])
+        return t_best, distance_best
+
+    def get_intersections(self, v_pos, v_dir, decimals=6):
+        '''Get the points at which the tracks cross the volume surface.
+
+        As the polygon does not need to be convex, a track may enter
+        and exit the volume more than once.
+
+        Parameters
+        ----------
+        v_pos : I3Position or array-like shape=(N, 3)
+            A point of each track.
+        v_dir : I3Direction or array-like shape=(N, 3)
+            Directional vector of each track.
+        decimals : int, optional
+            Intersections that agree up to this number of decimals are
+            treated as being the same point.
+
+        Returns
+        -------
+        t : np.ndarray shape=(N, n_max)
+            Sorted t's of the surface crossings, padded with np.nan.
+            Actual intersection points are v_pos + t * v_dir.
+        '''
+        v_pos, _ = get_positions_array(v_pos)
+        v_dir, _ = get_positions_array(v_dir)
+        v_pos, v_dir = np.broadcast_arrays(v_pos, v_dir)
+
+        t = self._get_track_candidates(v_pos, v_dir, desired_distance=0.)
+        t, distance = self._evaluate_track(v_pos, v_dir, t, -np.inf, np.inf)
+        with np.errstate(invalid='ignore'):
+            t[~(np.abs(distance) < 10.**-decimals)] = np.nan
+        t = np.sort(np.round(t, decimals), axis=1)
+
+        # remove duplicates
+        is_duplicate = np.zeros_like(t, dtype=bool)
+        is_duplicate[:, 1:] = t[:, 1:] == t[:, :-1]
+        t[is_duplicate] = np.nan
+        t = np.sort(t, axis=1)
+        n_max = max(np.max(np.sum(np.isfinite(t), axis=1)), 1)
+        return t[:, :n_max]
+
+    def track_length_inside(self, v_pos, v_dir, t_min=0., t_max=np.inf):
+        '''Length of the tracks inside of the volume.
+
+        Parameters
+        ----------
+        v_pos : I3Position or array-like shape=(N, 3)
+            A point of each track.
+        v_dir : I3Direction or array-like shape=(N, 3)
+            Directional vector of each track.
+        t_min : float or array-like shape=(N,), optional
+            The tracks start at v_pos + t_min * v_dir.
+        t_max : float or array-like shape=(N,), optional
+            The tracks end at v_pos + t_max * v_dir.
+
+        Returns
+        -------
+        length : float or np.ndarray shape=(N,)
+            Length of the tracks inside of the volume in units of v_dir.
+        '''
+        v_pos, is_single = get_positions_array(v_pos)
+        v_dir, _ = get_positions_array(v_dir)
+        v_pos, v_dir = np.broadcast_arrays(v_pos, v_dir)
+        t_min = np.broadcast_to(np.asarray(t_min, dtype=float),
+                                (len(v_pos),))[:, np.newaxis]
+        t_max = np.broadcast_to(np.asarray(t_max, dtype=float),
+                                (len(v_pos),))[:, np.newaxis]
+
+        # split tracks at the surface crossings
+        t = self.get_intersections(v_pos, v_dir)
+        t = np.where(np.isfinite(t), np.clip(t, t_min, t_max), t_max)
+        t = np.sort(np.concatenate((t_min, t, t_max), axis=1), axis=1)
+
+        # the volume is bounded, so infinite pieces are outside
+        t_start = t[:, :-1]
+        t_stop = t[:, 1:]
+        is_finite = np.isfinite(t_start) & np.isfinite(t_stop)
+        t_center = np.zeros_like(t_start)
+        t_center[is_finite] = (t_start[is_finite] + t_stop[is_finite]) / 2.
+        positions = v_pos[:, np.newaxis, :] + t_center[..., np.newaxis] \
+            * v_dir[:, np.newaxis, :]
+        is_inside = self.distance(positions.reshape(-1, 3)).reshape(
+            t_center.shape) < 0
+        is_inside &= is_finite
+
+        dir_norm = np.linalg.norm(v_dir, axis=1)
+        pieces = np.zeros_like(t_start)
+        pieces[is_inside] = t_stop[is_inside] - t_start[is_inside]
+        length = np.sum(pieces, axis=1) * dir_norm
+        if is_single:
+            return float(length[0])
+        return length
+
+
+ICECUBE_POINTS = [
+       [-570.90002441, -125.13999939, 0],  # string 31
+       [-256.14001465, -521.08001709, 0],  # string 1
+       [ 361.        , -422.82998657, 0],  # string 6
+       [ 576.36999512,  170.91999817, 0],  # string 50
+       [ 338.44000244,  463.72000122, 0],  # string 74
+       [ 101.04000092,  412.79000854, 0],  # string 72
+       [  22.11000061,  509.5       , 0],  # string 78
+       [-347.88000488,  451.51998901, 0],  # string 75
+        ]
+
+DEEPCORE_POINTS = [
+       [-77.80000305175781, -54.33000183105469, 0],  # string 35
+       [1.7100000381469727, -150.6300048828125, 0],  # string 26
+       [124.97000122070312, -131.25, 0],  # string 27
+       [194.33999633789062, -30.920000076293945, 0],  # string 37
+       [90.48999786376953, 82.3499984741211, 0],  # string 46
+       [-32.959999084472656, 62.439998626708984, 0],  # string 45
+        ]
+
+_PRISM_CACHE = {}
+
+
+def get_polygon_prism(points, z_min, z_max):
+    '''Get a (cached) PolygonPrism.
+
+    Parameters
+    ----------
+    points : array-like shape=(?, 3)
+        List of counterclockwise points
+        describing the polygon of the volume
+        in the x-y-plane
+    z_min : float
+        Bottom layer of the volume
+    z_max : float
+        Top layer of the volume
+
+    Returns
+    -------
+    PolygonPrism
+        The prism. Prisms are only built once for the same arguments.
+    '''
+    key = (tuple(tuple(p) for p in points), z_min, z_max)
+    if key not in _PRISM_CACHE:
+        _PRISM_CACHE[key] = PolygonPrism(points, z_min, z_max)
+    return _PRISM_CACHE[key]
+
+
+def get_icecube_prism(z_min=-502, z_max=501):
+    '''Get the (cached) PolygonPrism around IceCube.
+
+    Parameters
+    ----------
+    z_max : float
+        Top layer of IceCube-Doms
+    z_min : float
+        Bottom layer of IceCube-Doms
+
+    Returns
+    -------
+    PolygonPrism
+        The prism defined by the outer IceCube strings.
+    '''
+    return get_polygon_prism(ICECUBE_POINTS, z_min, z_max)
+
+
+def get_deepcore_prism(z_min=-502, z_max=188):
+    '''Get the (cached) PolygonPrism around DeepCore.
+
+    Parameters
+    ----------
+    z_max : float
+        Top layer of IceCube-Doms
+    z_min : float
+        Bottom layer of IceCube-Doms
+
+    Returns
+    -------
+    PolygonPrism
+        The prism defined by the outer DeepCore strings.
+    '''
+    return get_polygon_prism(DEEPCORE_POINTS, z_min, z_max)
+
+
+class HullDistanceGrid(object):
+    '''Signed distance to a hull precomputed on a regular 3D grid.
+
+    Distances are interpolated trilinearly between the grid points.
+    Since the signed distance is 1-Lipschitz, the interpolation error is
+    bounded by half of the cell diagonal (`tolerance`). Queries with a
+    threshold are therefore exact: only points for which the interpolated
+    distance lies within `tolerance` of the threshold, and points outside
+    of the grid, are passed on to the exact distance function.
+
+    Parameters
+    ----------
+    distance_function : callable
+        Exact signed distance function f(positions) -> distances which
+        accepts an array of shape (N, 3).
+    x_range : [float, float]
+        [min, max] of the x-coordinate covered by the grid.
+    y_range : [float, float]
+        [min, max] of the y-coordinate covered by the grid.
+    z_range : [float, float]
+        [min, max] of the z-coordinate covered by the grid.
+    resolution : float, optional
+        Maximum spacing of the grid points.
+    values : array-like shape=(nx, ny, nz), optional
+        Precomputed distances at the grid points, e.g. loaded from a
+        cache. If None, they are computed with `distance_function`.
+    chunk_size : int, optional
+        Number of grid points passed to `distance_function` at once. This
+        limits the memory needed to compute fine grids.
+    '''
+
+    def __init__(self, distance_function, x_range, y_range, z_range,
+                 resolution=5., values=None, chunk_size=10000):
+        self.distance_function = distance_function
+        self.lower = np.array([x_range[0], y_range[0], z_range[0]],
+                              dtype=float)
+        self.upper = np.array([x_range[1], y_range[1], z_range[1]],
+                              dtype=float)
+        self.shape = np.maximum(np.ceil(
+            (self.upper - self.lower) / resolution).astype(int) + 1, 2)
+        self.spacing = (self.upper - self.lower) / (self.shape - 1)
+        self.tolerance = 0.5 * np.linalg.norm(self.spacing)
+
+        if values is None:
+            axes = [np.linspace(low, up, n) for low, up, n in
+                    zip(self.lower, self.upper, self.shape)]
+            values = np.empty(self.shape, dtype=float)
+            flat_values = values.reshape(-1)
+            for start in range(0, flat_values.size, chunk_size):
+                stop = min(start + chunk_size, flat_values.size)
+                indices = np.unravel_index(np.arange(start, stop),
+                                           self.shape)
+                positions = np.stack([axis[index] for axis, index in
+                                      zip(axes, indices)], axis=-1)
+                flat_values[start:stop] = distance_function(positions)
+        self.values = np.asarray(values, dtype=float).reshape(self.shape)
+
+    def interpolate(self, pos):
+        '''Trilinear interpolation of the signed distance.
+
+        Parameters
+        ----------
+        pos : I3Position, list of I3Position or array-like shape=(N, 3)
+            Position(s).
+
+        Returns
+        -------
+        distance : np.ndarray shape=(N,)
+            Interpolated signed distance. NaN for points outside of the
+            grid.
+        '''
+        positions, _ = get_positions_array(pos)
+        rel = (positions - self.lower) / self.spacing
+        in_grid = np.all((rel >= 0.) & (rel <= self.shape - 1), axis=1)
+        index = np.clip(np.floor(rel).astype(int), 0, self.shape - 2)
+        fx, fy, fz = (rel - index).T
+        i, j, k = index.T
+
+        v = self.values
+        c00 = v[i, j, k] * (1 - fx) + v[i + 1, j, k] * fx
+        c10 = v[i, j + 1, k] * (1 - fx) + v[i + 1, j + 1, k] * fx
+        c01 = v[i, j, k + 1] * (1 - fx) + v[i + 1, j, k + 1] * fx
+        c11 = v[i, j + 1, k + 1] * (1 - fx) + v[i + 1, j + 1, k + 1] * fx
+        c0 = c00 * (1 - fy) + c10 * fy
+        c1 = c01 * (1 - fy) + c11 * fy
+        return np.where(in_grid, c0 * (1 - fz) + c1 * fz, np.nan)
+
+    def distance(self, pos, threshold=None):
+        '''Signed distance to the hull surface.
+
+        Parameters
+        ----------
+        pos : I3Position, list of I3Position or array-like shape=(N, 3)
+            Position(s).
+        threshold : float, optional
+            If provided, the exact distance is computed for all points
+            whose distance might be on the other side of the threshold,
+            so that comparisons with the threshold are exact. If None,
+            the interpolated distance (within `tolerance` of the exact
+            distance) is returned for points inside of the grid.
+
+        Returns
+        -------
+        distance : float or np.ndarray shape=(N,)
+            closest distance from the point
+            to the hull surface
+            negativ if point is inside,
+            positiv if point is outside.
+            A float is returned if a single position is passed.
+        '''
+        positions, is_single = get_positions_array(pos)
+        distance = self.interpolate(positions)
+
+        exact = ~np.isfinite(distance)
+        if threshold is not None:
+            exact |= np.abs(distance - threshold) <= self.tolerance
+        if np.any(exact):
+            distance[exact] = self.distance_function(positions[exact])
+
+        if is_single:
+            return float(distance[0])
+        return distance
+
+
+def get_hull_halfspaces(hull):
+    '''Get a convex half-space representation enclosing a hull.
+
+    Parameters
+    ----------
+    hull : PolygonPrism or ConvexHullIndex
+        The hull. The polygon of a PolygonPrism is replaced by its
+        convex hull.
+
+    Returns
+    -------
+    np.ndarray shape=(n_faces, 4)
+        Half-spaces [normal, offset] with unit normals. Points x with
+        normal.dot(x) + offset <= 0 for all faces are inside.
+
+    Raises
+    ------
+    TypeError
+        If the type of the hull is not supported.
+    '''
+    if isinstance(hull, ConvexHullIndex):
+        return np.concatenate(
+            (hull.normals, hull.offsets[:, np.newaxis]), axis=1)
+
+    if isinstance(hull, PolygonPrism):
+        from scipy.spatial import ConvexHull
+        equations = ConvexHull(hull.points).equations
+        return np.concatenate((
+            np.stack((equations[:, 0], equations[:, 1],
+                      np.zeros(len(equations)), equations[:, 2]), axis=1),
+            [[0., 0., 1., -hull.z_max],
+             [0., 0., -1., hull.z_min]]))
+
+    raise TypeError('Unsupported hull type: {!r}'.format(type(hull)))
+
+
+class HullVolumeSampler(object):
+    '''Uniform proposal distribution inside a hull expanded by a distance
+    and intersected with an axis-aligned box.
+
+    The proposal region is the convex polytope obtained by moving all
+    faces of the (convex) hull outwards by `max_distance` and clipping it
+    with the box. It contains all points of the box within `max_distance`
+    of the hull, so that rejecting proposed points with a distance larger
+    than `max_distance` results in exactly the same uniform distribution
+    as rejection sampling in the whole box. The polytope is split into
+    tetrahedra, of which one is picked with a probability proportional
+    to its volume.
+
+    Parameters
+    ----------
+    hull : PolygonPrism or ConvexHullIndex
+        The hull.
+    max_distance : float
+        Maximum signed distance to the hull.
+    x_range : [float, float]
+        [min, max] of the x-coordinate of the box.
+    y_range : [float, float]
+        [min, max] of the y-coordinate of the box.
+    z_range : [float, float]
+        [min, max] of the z-coordinate of the box.
+
+    Raises
+    ------
+    ValueError
+        If the proposal region is empty.
+    '''
+
+    def __init__(self, hull, max_distance, x_range, y_range, z_range):
+        from scipy.optimize import linprog
+        from scipy.spatial import ConvexHull, Delaunay, HalfspaceIntersection
+
+        halfspaces = np.array(get_hull_halfspaces(hull), dtype=float)
+        # shrinking the hull is not exact for all shapes, the exact
+        # distance check of the proposed points takes care of it instead
+        halfspaces[:, 3] -= max(max_distance, 0.)
+        box = np.array([
+            [-1., 0., 0., x_range[0]], [1., 0., 0., -x_range[1]],
+            [0., -1., 0., y_range[0]], [0., 1., 0., -y_range[1]],
+            [0., 0., -1., z_range[0]], [0., 0., 1., -z_range[1]],
+        ])
+        halfspaces = np.concatenate((halfspaces, box))
+
+        # Chebyshev center as interior point
+        norms = np.linalg.norm(halfspaces[:, :3], axis=1)
+        result = linprog(c=[0., 0., 0., -1.],
+                         A_ub=np.concatenate(
+                            (halfspaces[:, :3], norms[:, np.newaxis]), axis=1),
+                         b_ub=-halfspaces[:, 3],
+                         bounds=[(None, None)] * 3 + [(0., None)])
+        if not result.success or result.x[3] <= 0.:
+            raise ValueError('The proposal region is empty.')
+
+        corners = HalfspaceIntersection(
+            halfspaces, result.x[:3]).intersections
+        self.corners = corners[ConvexHull(corners).vertices]
+        self.simplices = self.corners[Delaunay(self.corners).simplices]
+
+        edges = self.simplices[:, 1:] - self.simplices[:, :1]
+        volumes = np.abs(np.linalg.det(edges)) / 6.
+        self.cumulative_volume = np.cumsum(volumes)
+        self.volume = self.cumulative_volume[-1]
+
+    def transform(self, u):
+        '''Transform uniform random numbers to points in the region.
+
+        Parameters
+        ----------
+        u : array-like shape=(N, 4)
+            Random numbers uniformly distributed in [0, 1).
+
+        Returns
+        -------
+        np.ndarray shape=(N, 3)
+            Points uniformly distributed in the proposal region.
+        '''
+        u = np.atleast_2d(np.asarray(u, dtype=float))
+
+        # pick tetrahedra according to their volume
+        index = np.searchsorted(self.cumulative_volume,
+                                u[:, 0] * self.volume, side='right')
+        simplices = self.simplices[np.minimum(index,
+                                              len(self.simplices) - 1)]
+
+        # fold the unit cube into the unit simplex
+        s, t, v = u[:, 1], u[:, 2], u[:, 3]
+        fold = s + t > 1
+        s, t = np.where(fold, 1 - s, s), np.where(fold, 1 - t, t)
+        fold_tv = t + v > 1
+        fold_stv = ~fold_tv & (s + t + v > 1)
+        s, t, v = (np.where(fold_stv, 1 - t - v, s),
+                   np.where(fold_tv, 1 - v, t),
+                   np.where(fold_tv, 1 - s - t,
+                            np.where(fold_stv, s + t + v - 1, v)))
+        weights = np.stack((1 - s - t - v, s, t, v), axis=1)
+        return np.sum(weights[:, :, np.newaxis] * simplices, axis=1)
+
+    def sample(self, random_state, size):
+        '''Draw points uniformly in the proposal region.
+
+        Parameters
+        ----------
+        random_state : np.random.RandomState
+            The random state.
+        size : int
+            Number of points.
+
+        Returns
+        -------
+        np.ndarray shape=(size, 3)
+            The drawn points.
+        '''
+        return self.transform(random_state.uniform(size=(size, 4)))
+
+    def estimate_volume(self, distance_function, max_distance, random_state,
+                        n_samples=100000):
+        '''Estimate the volume of the box within max_distance of the hull.
+
+        Parameters
+        ----------
+        distance_function : callable
+            Exact signed distance function f(positions) -> distances which
+            accepts an array of shape (N, 3).
+        max_distance : float
+            Maximum signed distance to the hull.
+        random_state : np.random.RandomState
+            The random state.
+        n_samples : int, optional
+            Number of points used for the estimate.
+
+        Returns
+        -------
+        volume : float
+            Estimated volume.
+        uncertainty : float
+            Binomial uncertainty of the estimated volume.
+        '''
+        points = self.sample(random_state, n_samples)
+        fraction = np.mean(distance_function(points) <= max_distance)
+        uncertainty = np.sqrt(fraction * (1 - fraction) / n_samples)
+        return self.volume * fraction, self.volume * uncertainty
+
+
 def distance_to_axis_aligned_Volume(pos, points, z_min, z_max):
     '''Function to determine the closest distance of a point
        to the edge of a Volume defined by z_zmin,z_max and a
@@ -295,8 +1567,8 @@ def distance_to_axis_aligned_Volume(pos, points, z_min, z_max):
     Parameters
     ----------
 
-    pos :I3Position
-        Position.
+    pos : I3Position or array-like shape=(N, 3)
+        Position(s).
     points : array-like shape=(?,3)
         List of counterclockwise points
         describing the polygon of the volume
@@ -308,65 +1580,13 @@ def distance_to_axis_aligned_Volume(pos, points, z_min, z_max):
 
     Returns
     -------
-    distance: float
+    distance: float or np.ndarray shape=(N,)
         closest distance from the point
         to the edge of the volume
         negativ if point is inside,
         positiv if point is outside
     '''
-    no_of_points = len(points)
-    edges = [(points[i], points[(i + 1) % (no_of_points)])
-             for i in range(no_of_points)]
-    xy_distance = float('inf')
-    list_of_ts = []
-
-    for edge in edges:
-        x = (edge[0][0], edge[1][0])
-        y = (edge[0][1], edge[1][1])
-        distance = get_distance_to_edge(edge[0], edge[1],
-                                        [pos[0], pos[1], 0])
-        t = get_edge_intersection(edge[0], edge[1],
-                                  [pos[0], pos[1], 0])
-        if not np.isnan(t):
-            list_of_ts.append(t)
-        if distance < xy_distance:
-            xy_distance = distance
-    is_inside_xy = False
-    if len(list_of_ts) == 2:
-        # u's are pos and negativ
-        if list_of_ts[0]*list_of_ts[1] < 0:
-            is_inside_xy = True
-        # point is exactly on border
-        elif len([t for t in list_of_ts if t == 0]) == 1:
-            is_inside_xy = True
-
-    # ---- Calculate z_distance
-    is_inside_z = False
-    if pos[2] < z_min:
-        # underneath detector
-        z_distance = z_min - pos[2]
-    elif pos[2] < z_max:
-        # same height
-        is_inside_z = True
-        z_distance = min(pos[2] - z_min, z_max - pos[2])
-    else:
-        # above detector
-        z_distance = pos[2] - z_max
-
-    # ---- Combine distances
-    if is_inside_z:
-        if is_inside_xy:
-            # inside detector
-            distance = - min(xy_distance, z_distance)
-        else:
-            distance = xy_distance
-    else:
-        if is_inside_xy:
-            distance = z_distance
-        else:
-            distance = np.sqrt(z_distance**2 + xy_distance**2)
-
-    return distance
+    return get_polygon_prism(points, z_min, z_max).distance(pos)
 
 
 def distance_to_icecube_hull(pos, z_min=-502, z_max=501):
@@ -377,8 +1597,8 @@ def distance_to_icecube_hull(pos, z_min=-502, z_max=501):
     Parameters
     ----------
 
-    pos :I3Position
-        Position.
+    pos : I3Position or array-like shape=(N, 3)
+        Position(s).
     z_max : float
         Top layer of IceCube-Doms
     z_min : float
@@ -386,23 +1606,13 @@ def distance_to_icecube_hull(pos, z_min=-502, z_max=501):
 
     Returns
     -------
-    distance: float
+    distance: float or np.ndarray shape=(N,)
         closest distance from the point
         to the icecube hull
         negativ if point is inside,
         positiv if point is outside
     '''
-    points = [
-           [-570.90002441, -125.13999939, 0],  # string 31
-           [-256.14001465, -521.08001709, 0],  # string 1
-           [ 361.        , -422.82998657, 0],  # string 6
-           [ 576.36999512,  170.91999817, 0],  # string 50
-           [ 338.44000244,  463.72000122, 0],  # string 74
-           [ 101.04000092,  412.79000854, 0],  # string 72
-           [  22.11000061,  509.5       , 0],  # string 78
-           [-347.88000488,  451.51998901, 0],  # string 75
-            ]
-    return distance_to_axis_aligned_Volume(pos, points, z_min, z_max)
+    return get_icecube_prism(z_min, z_max).distance(pos)
 
 
 def distance_to_deepcore_hull(pos, z_min=-502, z_max=188):
@@ -413,8 +1623,8 @@ def distance_to_deepcore_hull(pos, z_min=-502, z_max=188):
     Parameters
     ----------
 
-    pos :I3Position
-        Position.
+    pos : I3Position or array-like shape=(N, 3)
+        Position(s).
     z_max : float
         Top layer of IceCube-Doms
     z_min : float
@@ -422,21 +1632,13 @@ def distance_to_deepcore_hull(pos, z_min=-502, z_max=188):
 
     Returns
     -------
-    distance: float
+    distance: float or np.ndarray shape=(N,)
         closest distance from the point
         to the icecube hull
         negativ if point is inside,
         positiv if point is outside
     '''
-    points = [
-           [-77.80000305175781, -54.33000183105469, 0],  # string 35
-           [1.7100000381469727, -150.6300048828125, 0],  # string 26
-           [124.97000122070312, -131.25, 0],  # string 27
-           [194.33999633789062, -30.920000076293945, 0],  # string 37
-           [90.48999786376953, 82.3499984741211, 0],  # string 46
-           [-32.959999084472656, 62.439998626708984, 0],  # string 45
-            ]
-    return distance_to_axis_aligned_Volume(pos, points, z_min, z_max)
+    return get_deepcore_prism(z_min, z_max).distance(pos)
 
 
 def is_in_detector_bounds(pos, extend_boundary=60):
@@ -445,15 +1647,15 @@ def is_in_detector_bounds(pos, extend_boundary=60):
 
     Parameters
     ----------
-    pos : I3Position
-        Position to be checked.
+    pos : I3Position or array-like shape=(N, 3)
+        Position(s) to be checked.
 
     extend_boundary : float
         Extend boundary of detector by extend_boundary
 
     Returns
     -------
-    is_inside : bool
+    is_inside : bool or np.ndarray of bool shape=(N,)
         True if within detector bounds + extend_boundary
     '''
     distance = distance_to_icecube_hull(pos)
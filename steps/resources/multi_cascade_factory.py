@@ -1,4 +1,6 @@
 from __future__ import division
+import time
+
 import numpy as np
 from scipy.optimize import minimize
 
@@ -6,6 +8,8 @@ from I3Tray import I3Tray, I3Units
 from icecube import icetray, dataclasses
 
 from . import geometry
+from . import detector_hull
+from . import sampling_statistics
 
 
 class MultiCascadeFactory(icetray.I3ConditionalModule):
@@ -110,8 +114,49 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
             'Options are: "IceCube" or "DeepCore". In '
             'addition, a function f(pos) -> distance may be '
             'passed. The distance is positive if the point is '
-            'outside of the convex hull and negative if inside',
+            'outside of the convex hull and negative if inside. '
+            'A scipy.spatial.ConvexHull or geometry.ConvexHullIndex '
+            'may be passed to use the exact distance to an arbitrary '
+            'convex hull. A geometry.PolygonPrism, e.g. the prism of a '
+            'detector_hull.DetectorHull, may be passed as well.',
             'IceCube')
+        self.AddParameter(
+            'hull_distance_grid_resolution',
+            'If provided, the signed distance to the convex '
+            'hull is precomputed on a grid with this spacing '
+            '(in meters) covering x_range, y_range and z_range. '
+            'The vertex distance check then interpolates on '
+            'the grid and only computes the exact distance '
+            'close to max_vertex_distance. Grids are cached on '
+            'disk. If None, the exact distance is always used.',
+            None)
+        self.AddParameter(
+            'hull_aware_proposal',
+            'If True, vertices are proposed uniformly inside '
+            'the convex hull expanded by max_vertex_distance '
+            'and intersected with the x/y/z_range box instead '
+            'of uniformly in the box. The vertex density is '
+            'unchanged, but nearly no vertices are rejected. '
+            'The estimated generation volume is added to the '
+            'I3MCWeightDict as GenerationVolume.',
+            False)
+        self.AddParameter(
+            'record_sampling_info',
+            'If True, the number of vertex draws, minimizer '
+            'calls, analytic track solver calls and hull '
+            'distance evaluations as well as the wall time '
+            'spent sampling are added to the I3MCWeightDict '
+            'of each event and the run totals are written to '
+            'the MultiCascadeFactorySamplingInfo S-frame after '
+            'the last event.',
+            False)
+        self.AddParameter(
+            'analytic_track_solver',
+            'If True and the convex hull distance function is '
+            '"IceCube" or "DeepCore", points on the track with '
+            'a given distance to the convex hull are computed '
+            'analytically instead of via a scipy minimization.',
+            True)
         self.AddParameter(
             'cascade_distribution_mode',
             'Defines how cascades will be distributed along the '
@@ -161,6 +206,10 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
         ValueError
             If interaction type or flavor is unkown.
         """
+        self.sampling_info = sampling_statistics.SamplingStatistics(
+            'MultiCascadeFactorySamplingInfo')
+        configure_start_time = time.time()
+
         self.azimuth_range = self.GetParameter('azimuth_range')
         self.zenith_range = self.GetParameter('zenith_range')
         self.sample_in_cos = self.GetParameter('sample_uniformly_on_sphere')
@@ -182,6 +231,12 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
         self.shift_vertex_distance = self.GetParameter('shift_vertex_distance')
         self.convex_hull_distance_function = \
             self.GetParameter('convex_hull_distance_function')
+        self.analytic_track_solver = \
+            self.GetParameter('analytic_track_solver')
+        self.hull_distance_grid_resolution = \
+            self.GetParameter('hull_distance_grid_resolution')
+        self.hull_aware_proposal = self.GetParameter('hull_aware_proposal')
+        self.record_sampling_info = self.GetParameter('record_sampling_info')
         self.flavors = self.GetParameter('flavors')
         self.num_flavors = len(self.flavors)
         self.interaction_types = self.GetParameter('interaction_types')
@@ -202,19 +257,80 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
         self.cascade_distance_range = self.GetParameter(
           'cascade_distance_range')
 
+        self.hull_prism = None
+        self.hull_volume = None
+        hull = self.convex_hull_distance_function
         if isinstance(self.convex_hull_distance_function, str):
             if self.convex_hull_distance_function == 'IceCube':
+                self.hull_prism = geometry.get_icecube_prism()
+                self.hull_volume = self.hull_prism
                 self.convex_hull_distance_function = \
                     geometry.distance_to_icecube_hull
             elif self.convex_hull_distance_function == 'DeepCore':
+                self.hull_prism = geometry.get_deepcore_prism()
+                self.hull_volume = self.hull_prism
                 self.convex_hull_distance_function = \
                     geometry.distance_to_deepcore_hull
             else:
                 raise ValueError('Unknown option: {}'.format(
                     self.convex_hull_distance_function))
+        elif isinstance(self.convex_hull_distance_function,
+                        geometry.PolygonPrism):
+            # e.g. detector hull derived from a GCD file
+            self.hull_prism = self.convex_hull_distance_function
+            self.hull_volume = self.hull_prism
+            self.convex_hull_distance_function = \
+                self.hull_prism.distance
+        elif isinstance(self.convex_hull_distance_function,
+                        geometry.ConvexHullIndex) or \
+                hasattr(self.convex_hull_distance_function, 'equations'):
+            # arbitrary scipy.spatial.ConvexHull
+            hull_index = geometry.get_convex_hull_index(
+                self.convex_hull_distance_function)
+            self.hull_volume = hull_index
+            self.convex_hull_distance_function = hull_index.distance
         elif not callable(self.convex_hull_distance_function):
             raise ValueError(
                 'Provided convex hull distance function is not a callable')
+        if self.hull_volume is not None:
+            hull = self.hull_volume
+        if not self.analytic_track_solver:
+            self.hull_prism = None
+            self.hull_volume = None
+
+        # count the evaluations of the hull distance function
+        self.convex_hull_distance_function = \
+            self.sampling_info.count_calls(self.convex_hull_distance_function)
+
+        # signed-distance grid for the vertex distance check
+        self.vertex_distance_grid = None
+        if self.hull_distance_grid_resolution is not None and \
+                self.max_vertex_distance is not None:
+            self.vertex_distance_grid = detector_hull.get_hull_distance_grid(
+                hull, self.x_range, self.y_range, self.z_range,
+                resolution=self.hull_distance_grid_resolution)
+
+        # hull-aware proposal distribution of the vertices
+        self.vertex_sampler = None
+        self.generation_volume = None
+        if self.hull_aware_proposal and \
+                self.max_vertex_distance is not None:
+            if self.shift_vertex_distance is not None:
+                raise ValueError('The hull-aware proposal can not be used '
+                                 'in combination with shift_vertex_distance')
+            if not isinstance(hull, (geometry.PolygonPrism,
+                                     geometry.ConvexHullIndex)):
+                raise ValueError('The hull-aware proposal requires a '
+                                 'PolygonPrism or ConvexHullIndex hull')
+            self.vertex_sampler = geometry.HullVolumeSampler(
+                hull, self.max_vertex_distance,
+                self.x_range, self.y_range, self.z_range)
+            volume_random_state = np.random.RandomState(
+                self.random_service.integer(2**31 - 1))
+            self.generation_volume, self.generation_volume_error = \
+                self.vertex_sampler.estimate_volume(
+                    hull.distance, self.max_vertex_distance,
+                    volume_random_state)
 
         # make lowercase
         self.flavors = [f.lower() for f in self.flavors]
@@ -284,6 +400,8 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
                     self.random_service.integer(self.num_interaction_types)]
         # --------------------
 
+        self.sampling_info.configure_time = time.time() - configure_start_time
+
     def _find_point_on_track(self, vertex, zenith, azimuth, desired_distance,
                              forwards=True, x0=0.,
                              minimization_method='Nelder-Mead'):
@@ -300,7 +418,9 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
             Azimuth angle of track in radians.
         desired_distance : float
             Desired distance to convex hull. The minimizer will try to find
-            the point on the track that is closest to this.
+            the point on the track that is closest to this. If the convex
+            hull is a PolygonPrism, the point is computed analytically and
+            the point closest to the vertex is chosen.
         forwards : bool, optional
             Search forward in time starting at the vertex if True.
             If False, search backward in time, e.g. before the vertex.
@@ -320,6 +440,16 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
         """
         direction = dataclasses.I3Direction(zenith, azimuth)
 
+        if self.hull_prism is not None:
+            if forwards:
+                t_min, t_max = 0., float('inf')
+            else:
+                t_min, t_max = -float('inf'), 0.
+            t, loss = self.hull_prism.find_distance_on_track(
+                vertex, direction, desired_distance, t_min=t_min, t_max=t_max)
+            self.sampling_info.add('n_track_solver_calls')
+            return vertex + t * direction, loss
+
         def distance_loss(t):
             """Distance of point on track at time t to convex hull"""
 
@@ -339,9 +469,138 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
             pass
 
         result = minimize(distance_loss, x0=x0, method=minimization_method)
+        self.sampling_info.add('n_minimizer_calls')
         result_pos = vertex + result.x[0] * direction
         return result_pos, result.fun
 
+    def _find_track_length(self, vertex, zenith, azimuth):
+        """Find track length inside the convex hull via minimization.
+
+        This is only used if the convex hull does not provide an exact
+        track length computation, e.g. for an arbitrary distance function.
+
+        Parameters
+        ----------
+        vertex : I3Position
+            Vertex of the track.
+        zenith : float
+            Zenith angle of track in radians.
+        azimuth : float
+            Azimuth angle of track in radians.
+
+        Returns
+        -------
+        float or None
+            The track length inside the convex hull after the vertex.
+            None if the minimization did not converge to the exit point.
+        """
+        # get a point inside the convex hull in forward direction
+        # starting from the (shifted) vertex.
+        # (We're choosing 10000m here as some random number negative
+        #  number that will indicate a point inside the convex hull.)
+        dist = self.convex_hull_distance_function(vertex)
+        if dist < 0:
+            # the vertex is already inside the hull, so use that
+            pos_entry = vertex
+            dist_entry = 0
+        else:
+            # vertex is outside, let's see if we find a point inside
+            # if we go further forward
+            pos_entry, dist_entry = self._find_point_on_track(
+                vertex, zenith, azimuth,
+                desired_distance=-1,
+                forwards=True)
+
+        if dist_entry > 0.9:
+            # could not find a point in forward direction that is
+            # at least 1m inside the volume.
+            # We'll set the track length to 0
+            length = 0
+        else:
+            # we found a position in forward direction that is
+            # 1m inside the convex hull
+
+            # find the closes approach point
+            # We do this so that we don't get stuck in a local minimum
+            # when searching for the exit point in the next step
+            # (Note: we use random large negative value of -100000. A
+            #  better option would be to pass in convex hull function
+            #  to class that can compute all intersections with hull.
+            #  However, this requires restructuring of module, which
+            #  is avoided at this point and with this less efficient
+            #  work-around)
+            pos_closest, dist_closest = self._find_point_on_track(
+                pos_entry, zenith, azimuth,
+                desired_distance=-100000,
+                forwards=True)
+
+            # We'll get the second point now (exit in forward )
+            pos_exit, dist_exit = self._find_point_on_track(
+                pos_closest, zenith, azimuth,
+                desired_distance=-1,
+                forwards=True,
+                x0=np.linspace(0, 2000, 200),
+            )
+            # We should always find an exit point if going forward
+            # from a point within the convex hull
+            if dist_exit > 1:
+                print(
+                    'Found potential minimization issue - exit point '
+                    'is not at convex hull boundary. Will re-sample '
+                    'event.'
+                )
+                print('dist_exit:', dist_exit)
+                print('vertex:', vertex)
+                print('pos_entry:', pos_entry)
+                print('pos_closest:', pos_closest)
+                print('pos_exit:', pos_exit)
+                return None
+
+            # compute length
+            length = (pos_exit - pos_entry).magnitude + 2
+
+        return length
+
+    def _get_vertex_distance(self, vertex):
+        """Get the distance of the vertex to the convex hull.
+
+        The distance is interpolated on the distance grid if configured.
+        Comparisons with `max_vertex_distance` remain exact.
+
+        Parameters
+        ----------
+        vertex : I3Position
+            The vertex.
+
+        Returns
+        -------
+        float
+            Signed distance of the vertex to the convex hull.
+        """
+        if self.vertex_distance_grid is not None:
+            self.sampling_info.add(
+                'n_hull_distance_evaluations',
+                sampling_statistics.get_num_positions(vertex))
+            return self.vertex_distance_grid.distance(
+                vertex, threshold=self.max_vertex_distance)
+        return self.convex_hull_distance_function(vertex)
+
+    def _draw_vertex_position(self):
+        """Draw a vertex position from the proposal distribution.
+
+        Returns
+        -------
+        tuple of float
+            The x, y and z coordinate of the proposed vertex.
+        """
+        self.sampling_info.add('n_vertex_proposed')
+        if self.vertex_sampler is not None:
+            u = [[self.random_service.uniform(0., 1.) for i in range(4)]]
+            return tuple(self.vertex_sampler.transform(u)[0])
+        return (self.random_service.uniform(*self.x_range),
+                self.random_service.uniform(*self.y_range),
+                self.random_service.uniform(*self.z_range))
+
     def _sample_vertex(self, zenith, azimuth):
         """Sample a vertex
 
@@ -364,9 +623,7 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
         while not point_is_ok:
 
             # draw a vertex within specified range
-            vertex_x = self.random_service.uniform(*self.x_range) * I3Units.m
-            vertex_y = self.random_service.uniform(*self.y_range) * I3Units.m
-            vertex_z = self.random_service.uniform(*self.z_range) * I3Units.m
+            vertex_x, vertex_y, vertex_z = self._draw_vertex_position()
             vertex = dataclasses.I3Position(
                             vertex_x * I3Units.m,
                             vertex_y * I3Units.m,
@@ -374,7 +631,7 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
 
             # check vertex distance to convex hull
             if self.max_vertex_distance is not None:
-                dist = self.convex_hull_distance_function(vertex)
+                dist = self._get_vertex_distance(vertex)
                 if dist > self.max_vertex_distance:
                     continue
 
@@ -403,77 +660,22 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
             # check track length in convex hull
             if self.min_track_length is not None:
 
-                # get a point inside the convex hull in forward direction
-                # starting from the (shifted) vertex.
-                # (We're choosing 10000m here as some random number negative
-                #  number that will indicate a point inside the convex hull.)
-                dist = self.convex_hull_distance_function(vertex)
-                if dist < 0:
-                    # the vertex is already inside the hull, so use that
-                    pos_entry = vertex
-                    dist_entry = 0
-                else:
-                    # vertex is outside, let's see if we find a point inside
-                    # if we go further forward
-                    pos_entry, dist_entry = self._find_point_on_track(
-                        vertex, zenith, azimuth,
-                        desired_distance=-1,
-                        forwards=True)
-
-                if dist_entry > 0.9:
-                    # could not find a point in forward direction that is
-                    # at least 1m inside the volume.
-                    # We'll set the track length to 0
-                    length = 0
+                if self.hull_volume is not None:
+                    length = self.hull_volume.track_length_inside(
+                        vertex, dataclasses.I3Direction(zenith, azimuth))
+                    self.sampling_info.add('n_track_solver_calls')
                 else:
-                    # we found a position in forward direction that is
-                    # 1m inside the convex hull
-
-                    # find the closes approach point
-                    # We do this so that we don't get stuck in a local minimum
-                    # when searching for the exit point in the next step
-                    # (Note: we use random large negative value of -100000. A
-                    #  better option would be to pass in convex hull function
-                    #  to class that can compute all intersections with hull.
-                    #  However, this requires restructuring of module, which
-                    #  is avoided at this point and with this less efficient
-                    #  work-around)
-                    pos_closest, dist_closest = self._find_point_on_track(
-                        pos_entry, zenith, azimuth,
-                        desired_distance=-100000,
-                        forwards=True)
-
-                    # We'll get the second point now (exit in forward )
-                    pos_exit, dist_exit = self._find_point_on_track(
-                        pos_closest, zenith, azimuth,
-                        desired_distance=-1,
-                        forwards=True,
-                        x0=np.linspace(0, 2000, 200),
-                    )
-                    # We should always find an exit point if going forward
-                    # from a point within the convex hull
-                    if dist_exit > 1:
-                        print(
-                            'Found potential minimization issue - exit point '
-                            'is not at convex hull boundary. Will re-sample '
-                            'event.'
-                        )
-                        print('dist_exit:', dist_exit)
-                        print('vertex:', vertex)
-                        print('pos_entry:', pos_entry)
-                        print('pos_closest:', pos_closest)
-                        print('pos_exit:', pos_exit)
+                    length = self._find_track_length(vertex, zenith, azimuth)
+                    if length is None:
                         continue
 
-                    # compute length
-                    length = (pos_exit - pos_entry).magnitude + 2
-
                 if length < self.min_track_length:
                     continue
 
             # everything is good
             point_is_ok = True
 
+        self.sampling_info.add('n_vertex_accepted')
         return vertex
 
     def _get_direction(self):
@@ -671,6 +873,15 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
 
         return vertices, times
 
+    def _push_sampling_info(self):
+        """Push an S-frame with the vertex sampling statistics.
+        """
+        info = {}
+        if self.generation_volume is not None:
+            info['generation_volume'] = self.generation_volume
+            info['generation_volume_error'] = self.generation_volume_error
+        self.PushFrame(self.sampling_info.get_s_frame(**info))
+
     def DAQ(self, frame):
         """Inject casacdes into I3MCtree.
 
@@ -687,6 +898,7 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
         # --------------
         # sample cascade
         # --------------
+        self.sampling_info.start_event()
 
         # direction
         zenith, azimuth = self._get_direction()
@@ -700,6 +912,8 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
         # flavor and interaction
         flavor, interaction_type = self._get_flavor_and_int_type()
 
+        event_sampling_info = self.sampling_info.stop_event()
+
         # create pseduo I3MCWeightDict
         mc_dict = {}
         if interaction_type == 'cc':
@@ -708,6 +922,10 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
         else:
             # Neutral Current Interaction: 2
             mc_dict['InteractionType'] = 2
+        if self.generation_volume is not None:
+            mc_dict['GenerationVolume'] = self.generation_volume
+        if self.record_sampling_info:
+            mc_dict.update(event_sampling_info)
         frame['I3MCWeightDict'] = dataclasses.I3MapStringDouble(mc_dict)
 
         # create primary cascade interaction
@@ -794,4 +1012,6 @@ class MultiCascadeFactory(icetray.I3ConditionalModule):
 
         self.events_done += 1
         if self.events_done >= self.num_events:
+            if self.record_sampling_info:
+                self._push_sampling_info()
             self.RequestSuspension()
@@ -1,4 +1,7 @@
 from __future__ import division
+import os
+import time
+
 import numpy as np
 from scipy.optimize import minimize
 
@@ -6,6 +9,45 @@ from I3Tray import I3Tray, I3Units
 from icecube import icetray, dataclasses
 
 from . import geometry
+from . import detector_hull
+from . import sampling_statistics
+
+
+# columns of the pre-generated kinematics table
+KINEMATICS_DTYPE = [
+    ('azimuth', 'f8'),
+    ('zenith', 'f8'),
+    ('x', 'f8'),
+    ('y', 'f8'),
+    ('z', 'f8'),
+    ('time', 'f8'),
+    ('log_primary_energy', 'f8'),
+    ('fractional_energy_in_hadrons', 'f8'),
+    ('flavor', 'i4'),
+    ('interaction_type', 'i4'),
+]
+
+
+def vectorize_distance_function(distance_function):
+    """Evaluate a distance function of single positions row by row.
+
+    Parameters
+    ----------
+    distance_function : callable
+        Distance function f(pos) -> distance of a single I3Position.
+
+    Returns
+    -------
+    callable
+        The distance function, additionally accepting arrays of shape
+        (N, 3).
+    """
+    def vectorized_distance_function(pos):
+        if isinstance(pos, np.ndarray) and pos.ndim == 2:
+            return np.array([distance_function(dataclasses.I3Position(*p))
+                             for p in pos])
+        return distance_function(pos)
+    return vectorized_distance_function
 
 
 class NeutrinoFactory(icetray.I3ConditionalModule):
@@ -79,14 +121,64 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
                           'Options are: "IceCube" or "DeepCore". In '
                           'addition, a function f(pos) -> distance may be '
                           'passed. The distance is positive if the point is '
-                          'outside of the convex hull and negative if inside',
+                          'outside of the convex hull and negative if inside.'
+                          ' A scipy.spatial.ConvexHull or '
+                          'geometry.ConvexHullIndex may be passed to use the '
+                          'exact distance to an arbitrary convex hull. A '
+                          'geometry.PolygonPrism, e.g. the prism of a '
+                          'detector_hull.DetectorHull, may be passed as well.',
                           'IceCube')
+        self.AddParameter('analytic_track_solver',
+                          'If True and the convex hull distance function is '
+                          '"IceCube" or "DeepCore", points on the track with '
+                          'a given distance to the convex hull are computed '
+                          'analytically instead of via a scipy minimization.',
+                          True)
+        self.AddParameter('hull_distance_grid_resolution',
+                          'If provided, the signed distance to the convex '
+                          'hull is precomputed on a grid with this spacing '
+                          '(in meters) covering x_range, y_range and z_range.'
+                          ' The vertex distance check then interpolates on '
+                          'the grid and only computes the exact distance '
+                          'close to max_vertex_distance. Grids are cached on '
+                          'disk. If None, the exact distance is always used.',
+                          None)
+        self.AddParameter('hull_aware_proposal',
+                          'If True, vertices are proposed uniformly inside '
+                          'the convex hull expanded by max_vertex_distance '
+                          'and intersected with the x/y/z_range box instead '
+                          'of uniformly in the box. The vertex density is '
+                          'unchanged, but nearly no vertices are rejected. '
+                          'The estimated generation volume is added to the '
+                          'I3MCWeightDict as GenerationVolume.',
+                          False)
         self.AddParameter('flavors',
                           'List of neutrino flavors to simulate.',
                           ['NuE', 'NuMu', 'NuTau'])
         self.AddParameter('interaction_types',
                           'List of interaction types to simulate: CC or NC',
                           ['CC', 'NC'])
+        self.AddParameter('pregenerate_kinematics',
+                          'If True, the kinematics of all events of the run '
+                          'are drawn at once with numpy when the module is '
+                          'configured. Vertices are accepted in vectorized '
+                          'passes. The numpy random state is seeded with a '
+                          'seed drawn from the random_service.',
+                          False)
+        self.AddParameter('kinematics_file',
+                          'If provided and pregenerate_kinematics is True, '
+                          'the pre-generated kinematics table is written to '
+                          'this .npz file.',
+                          None)
+        self.AddParameter('record_sampling_info',
+                          'If True, the number of vertex draws, minimizer '
+                          'calls, analytic track solver calls and hull '
+                          'distance evaluations as well as the wall time '
+                          'spent sampling are added to the I3MCWeightDict '
+                          'of each event and the run totals are written to '
+                          'the NeutrinoFactorySamplingInfo S-frame after '
+                          'the last event.',
+                          False)
         self.AddParameter('random_service', '', None)
         self.AddParameter('num_events', '', 1)
         self.AddParameter('oversampling_factor',
@@ -113,6 +205,10 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
         ValueError
             If interaction type or flavor is unkown.
         """
+        self.sampling_info = sampling_statistics.SamplingStatistics(
+            'NeutrinoFactorySamplingInfo')
+        configure_start_time = time.time()
+
         self.azimuth_range = self.GetParameter('azimuth_range')
         self.zenith_range = self.GetParameter('zenith_range')
         self.sample_in_cos = self.GetParameter('sample_uniformly_on_sphere')
@@ -133,11 +229,20 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
         self.shift_vertex_distance = self.GetParameter('shift_vertex_distance')
         self.convex_hull_distance_function = \
             self.GetParameter('convex_hull_distance_function')
+        self.analytic_track_solver = \
+            self.GetParameter('analytic_track_solver')
+        self.hull_distance_grid_resolution = \
+            self.GetParameter('hull_distance_grid_resolution')
+        self.hull_aware_proposal = self.GetParameter('hull_aware_proposal')
         self.flavors = self.GetParameter('flavors')
         self.num_flavors = len(self.flavors)
         self.interaction_types = self.GetParameter('interaction_types')
         self.num_interaction_types = len(self.interaction_types)
         self.random_service = self.GetParameter('random_service')
+        self.pregenerate_kinematics = \
+            self.GetParameter('pregenerate_kinematics')
+        self.kinematics_file = self.GetParameter('kinematics_file')
+        self.record_sampling_info = self.GetParameter('record_sampling_info')
         self.num_events = self.GetParameter('num_events')
         self.oversampling_factor = self.GetParameter('oversampling_factor')
         if self.oversampling_factor is None:
@@ -147,19 +252,82 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
             self.constant_vars = []
         self.events_done = 0
 
+        self.hull_prism = None
+        hull = self.convex_hull_distance_function
         if isinstance(self.convex_hull_distance_function, str):
             if self.convex_hull_distance_function == 'IceCube':
+                self.hull_prism = geometry.get_icecube_prism()
+                hull = self.hull_prism
                 self.convex_hull_distance_function = \
                     geometry.distance_to_icecube_hull
             elif self.convex_hull_distance_function == 'DeepCore':
+                self.hull_prism = geometry.get_deepcore_prism()
+                hull = self.hull_prism
                 self.convex_hull_distance_function = \
                     geometry.distance_to_deepcore_hull
             else:
                 raise ValueError('Unknown option: {}'.format(
                     self.convex_hull_distance_function))
+        elif isinstance(self.convex_hull_distance_function,
+                        geometry.PolygonPrism):
+            # e.g. detector hull derived from a GCD file
+            self.hull_prism = self.convex_hull_distance_function
+            hull = self.hull_prism
+            self.convex_hull_distance_function = \
+                self.hull_prism.distance
+        elif isinstance(self.convex_hull_distance_function,
+                        geometry.ConvexHullIndex) or \
+                hasattr(self.convex_hull_distance_function, 'equations'):
+            # arbitrary scipy.spatial.ConvexHull
+            hull_index = geometry.get_convex_hull_index(
+                self.convex_hull_distance_function)
+            hull = hull_index
+            self.convex_hull_distance_function = hull_index.distance
         elif not callable(self.convex_hull_distance_function):
             raise ValueError(
                 'Provided convex hull distance function is not a callable')
+        else:
+            # only the built-in distance functions accept arrays of
+            # positions, as used by pregenerate_kinematics and the grid
+            self.convex_hull_distance_function = vectorize_distance_function(
+                self.convex_hull_distance_function)
+            hull = self.convex_hull_distance_function
+        if not self.analytic_track_solver:
+            self.hull_prism = None
+
+        # count the evaluations of the hull distance function
+        self.convex_hull_distance_function = \
+            self.sampling_info.count_calls(self.convex_hull_distance_function)
+
+        # signed-distance grid for the vertex distance check
+        self.vertex_distance_grid = None
+        if self.hull_distance_grid_resolution is not None and \
+                self.max_vertex_distance is not None:
+            self.vertex_distance_grid = detector_hull.get_hull_distance_grid(
+                hull, self.x_range, self.y_range, self.z_range,
+                resolution=self.hull_distance_grid_resolution)
+
+        # hull-aware proposal distribution of the vertices
+        self.vertex_sampler = None
+        self.generation_volume = None
+        if self.hull_aware_proposal and \
+                self.max_vertex_distance is not None:
+            if self.shift_vertex_distance is not None:
+                raise ValueError('The hull-aware proposal can not be used '
+                                 'in combination with shift_vertex_distance')
+            if not isinstance(hull, (geometry.PolygonPrism,
+                                     geometry.ConvexHullIndex)):
+                raise ValueError('The hull-aware proposal requires a '
+                                 'PolygonPrism or ConvexHullIndex hull')
+            self.vertex_sampler = geometry.HullVolumeSampler(
+                hull, self.max_vertex_distance,
+                self.x_range, self.y_range, self.z_range)
+            volume_random_state = np.random.RandomState(
+                self.random_service.integer(2**31 - 1))
+            self.generation_volume, self.generation_volume_error = \
+                self.vertex_sampler.estimate_volume(
+                    hull.distance, self.max_vertex_distance,
+                    volume_random_state)
 
         # make lowercase
         self.flavors = [f.lower() for f in self.flavors]
@@ -229,6 +397,15 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
                     self.random_service.integer(self.num_interaction_types)]
         # --------------------
 
+        # pre-generate the kinematics of the whole run
+        self.kinematics = None
+        if self.pregenerate_kinematics:
+            self.kinematics = self._pregenerate_kinematics()
+            if self.kinematics_file is not None:
+                self._write_kinematics_file(self.kinematics_file)
+
+        self.sampling_info.configure_time = time.time() - configure_start_time
+
     def _find_point_on_track(self, vertex, zenith, azimuth, desired_distance,
                              forwards=True):
         """Find point on track whose distance to the convex hull is closest
@@ -244,7 +421,9 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
             Azimuth angle of track in radians.
         desired_distance : float
             Desired distance to convex hull. The minimizer will try to find
-            the point on the track that is closest to this.
+            the point on the track that is closest to this. If the convex
+            hull is a PolygonPrism, the point is computed analytically and
+            the point closest to the vertex is chosen.
         forwards : bool, optional
             Search forward in time starting at the vertex if True.
             If False, search backward in time, e.g. before the vertex.
@@ -258,6 +437,16 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
         """
         direction = dataclasses.I3Direction(zenith, azimuth)
 
+        if self.hull_prism is not None:
+            if forwards:
+                t_min, t_max = 0., float('inf')
+            else:
+                t_min, t_max = -float('inf'), 0.
+            t, loss = self.hull_prism.find_distance_on_track(
+                vertex, direction, desired_distance, t_min=t_min, t_max=t_max)
+            self.sampling_info.add('n_track_solver_calls')
+            return vertex + t * direction, loss
+
         def get_signed_t(t):
             if forwards:
                 t = np.abs(t)
@@ -273,9 +462,74 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
             return (distance_to_hull - desired_distance)**2
 
         result = minimize(distance_loss, x0=0., method='Nelder-Mead')
+        self.sampling_info.add('n_minimizer_calls')
         result_pos = vertex + get_signed_t(result.x[0]) * direction
         return result_pos, result.fun
 
+    def _get_vertex_distance(self, vertex):
+        """Get the distance of the vertex to the convex hull.
+
+        The distance is interpolated on the distance grid if configured.
+        Comparisons with `max_vertex_distance` remain exact.
+
+        Parameters
+        ----------
+        vertex : I3Position
+            The vertex.
+
+        Returns
+        -------
+        float
+            Signed distance of the vertex to the convex hull.
+        """
+        if self.vertex_distance_grid is not None:
+            self.sampling_info.add(
+                'n_hull_distance_evaluations',
+                sampling_statistics.get_num_positions(vertex))
+            return self.vertex_distance_grid.distance(
+                vertex, threshold=self.max_vertex_distance)
+        return self.convex_hull_distance_function(vertex)
+
+    def _draw_vertex_position(self):
+        """Draw a vertex position from the proposal distribution.
+
+        Returns
+        -------
+        tuple of float
+            The x, y and z coordinate of the proposed vertex.
+        """
+        self.sampling_info.add('n_vertex_proposed')
+        if self.vertex_sampler is not None:
+            u = [[self.random_service.uniform(0., 1.) for i in range(4)]]
+            return tuple(self.vertex_sampler.transform(u)[0])
+        return (self.random_service.uniform(*self.x_range),
+                self.random_service.uniform(*self.y_range),
+                self.random_service.uniform(*self.z_range))
+
+    def _draw_vertex_positions(self, random_state, size):
+        """Draw vertex positions from the proposal distribution.
+
+        Parameters
+        ----------
+        random_state : np.random.RandomState
+            The random state.
+        size : int
+            Number of positions.
+
+        Returns
+        -------
+        np.ndarray shape=(size, 3)
+            The proposed vertex positions.
+        """
+        self.sampling_info.add('n_vertex_proposed', size)
+        if self.vertex_sampler is not None:
+            return self.vertex_sampler.sample(random_state, size)
+        return np.stack([
+            random_state.uniform(*self.x_range, size=size),
+            random_state.uniform(*self.y_range, size=size),
+            random_state.uniform(*self.z_range, size=size),
+        ], axis=1)
+
     def _sample_vertex(self, zenith, azimuth):
         """Sample a vertex
 
@@ -298,9 +552,7 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
         while not point_is_ok:
 
             # draw a vertex within specified range
-            vertex_x = self.random_service.uniform(*self.x_range) * I3Units.m
-            vertex_y = self.random_service.uniform(*self.y_range) * I3Units.m
-            vertex_z = self.random_service.uniform(*self.z_range) * I3Units.m
+            vertex_x, vertex_y, vertex_z = self._draw_vertex_position()
             vertex = dataclasses.I3Position(
                             vertex_x * I3Units.m,
                             vertex_y * I3Units.m,
@@ -317,7 +569,7 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
 
             # check vertex distance to convex hull
             if self.max_vertex_distance is not None:
-                dist = self.convex_hull_distance_function(vertex)
+                dist = self._get_vertex_distance(vertex)
                 if dist > self.max_vertex_distance:
                     continue
 
@@ -336,25 +588,206 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
             # everything is good
             point_is_ok = True
 
+        self.sampling_info.add('n_vertex_accepted')
         return vertex
 
-    def DAQ(self, frame):
-        """Inject casacdes into I3MCtree.
+    def _check_vertices(self, positions, zenith, azimuth):
+        """Apply the vertex cuts of `_sample_vertex` to many vertices.
 
         Parameters
         ----------
-        frame : icetray.I3Frame.DAQ
-            An I3 q-frame.
+        positions : np.ndarray shape=(N, 3)
+            The drawn vertex positions.
+        zenith : np.ndarray shape=(N,)
+            Zenith angles of the tracks in radians.
+        azimuth : np.ndarray shape=(N,)
+            Azimuth angles of the tracks in radians.
 
-        Raises
-        ------
-        ValueError
-            If interaction type is unknown.
+        Returns
+        -------
+        np.ndarray shape=(N, 3)
+            The (shifted) vertex positions.
+        np.ndarray shape=(N,)
+            True for the vertices that pass all cuts.
         """
-        # --------------
-        # sample cascade
-        # --------------
+        directions = np.stack([-np.sin(zenith) * np.cos(azimuth),
+                               -np.sin(zenith) * np.sin(azimuth),
+                               -np.cos(zenith)], axis=1)
+        positions = np.array(positions, dtype=float)
+        is_ok = np.ones(len(positions), dtype=bool)
+
+        # shift vertex to specified distance, abort if not possible
+        if self.shift_vertex_distance is not None:
+            if self.hull_prism is not None:
+                t, loss = self.hull_prism.find_distance_on_track(
+                    positions, directions, self.shift_vertex_distance,
+                    t_min=-np.inf, t_max=0.)
+                self.sampling_info.add('n_track_solver_calls', len(positions))
+                positions += t[:, np.newaxis] * directions
+                is_ok &= loss <= 1
+            else:
+                for i in range(len(positions)):
+                    vertex, dist_loss = self._find_point_on_track(
+                        dataclasses.I3Position(*positions[i]),
+                        zenith[i], azimuth[i],
+                        desired_distance=self.shift_vertex_distance,
+                        forwards=False)
+                    positions[i] = [vertex.x, vertex.y, vertex.z]
+                    is_ok[i] = dist_loss <= 1
+
+        # check vertex distance to convex hull
+        if self.max_vertex_distance is not None:
+            dist = self._get_vertex_distance(positions)
+            is_ok &= dist <= self.max_vertex_distance
+
+        # check track distance to convex hull
+        if self.max_track_distance is not None:
+            if self.hull_prism is not None:
+                _, dist = self.hull_prism.closest_approach(
+                    positions, directions, t_min=0.)
+                self.sampling_info.add('n_track_solver_calls', len(positions))
+                is_ok &= dist <= self.max_track_distance
+            else:
+                for i in np.flatnonzero(is_ok):
+                    pos, dist_loss = self._find_point_on_track(
+                        dataclasses.I3Position(*positions[i]),
+                        zenith[i], azimuth[i],
+                        desired_distance=self.max_track_distance - 1000,
+                        forwards=True)
+                    dist = self.convex_hull_distance_function(pos)
+                    is_ok[i] = dist <= self.max_track_distance
+
+        return positions, is_ok
+
+    def _sample_vertices(self, zenith, azimuth, random_state):
+        """Sample vertices for many events at once.
+
+        Candidates are drawn for all events without an accepted vertex
+        and tested in one vectorized pass until all events are accepted.
+
+        Parameters
+        ----------
+        zenith : np.ndarray shape=(N,)
+            Zenith angles of the tracks in radians.
+        azimuth : np.ndarray shape=(N,)
+            Azimuth angles of the tracks in radians.
+        random_state : np.random.RandomState
+            The random state used to draw the candidates.
+
+        Returns
+        -------
+        np.ndarray shape=(N, 3)
+            The accepted vertex positions.
+        """
+        vertices = np.empty((len(zenith), 3))
+        pending = np.arange(len(zenith))
+        while len(pending) > 0:
+            n = len(pending)
+            positions = self._draw_vertex_positions(random_state, n)
+            positions, is_ok = self._check_vertices(
+                positions, zenith[pending], azimuth[pending])
+            vertices[pending[is_ok]] = positions[is_ok]
+            self.sampling_info.add('n_vertex_accepted', np.sum(is_ok))
+            pending = pending[~is_ok]
+        return vertices
+
+    def _pregenerate_kinematics(self):
+        """Draw the kinematics of all events of the run.
+
+        All columns are drawn regardless of `constant_vars` and are
+        overwritten with the constant values afterwards, so that the
+        random stream does not depend on `constant_vars`.
+
+        Returns
+        -------
+        np.ndarray
+            Structured array of length `num_events` with KINEMATICS_DTYPE.
+            Angles are in radians, time in ns and the energy in log10(GeV).
+            Flavor and interaction type are indices into `flavors` and
+            `interaction_types`.
+        """
+        n = self.num_events
+        self.kinematics_seed = self.random_service.integer(2**31 - 1)
+        random_state = np.random.RandomState(self.kinematics_seed)
+        table = np.zeros(n, dtype=KINEMATICS_DTYPE)
 
+        # direction
+        table['azimuth'] = random_state.uniform(
+            *self.azimuth_range, size=n) * I3Units.deg
+        if self.sample_in_cos:
+            zenith = np.rad2deg(np.arccos(
+                random_state.uniform(*self.cos_zenith_range, size=n)))
+        else:
+            zenith = random_state.uniform(*self.zenith_range, size=n)
+        table['zenith'] = zenith * I3Units.deg
+
+        # time, energy, flavor and interaction
+        table['time'] = random_state.uniform(
+            *self.time_range, size=n) * I3Units.ns
+        table['log_primary_energy'] = random_state.uniform(
+            *self.log_primary_energy_range, size=n) * I3Units.GeV
+        table['fractional_energy_in_hadrons'] = random_state.uniform(
+            *self.fractional_energy_in_hadrons_range, size=n)
+        table['flavor'] = random_state.randint(self.num_flavors, size=n)
+        table['interaction_type'] = random_state.randint(
+            self.num_interaction_types, size=n)
+
+        # constant variables
+        if 'azimuth' in self.constant_vars:
+            table['azimuth'] = self.azimuth
+        if 'zenith' in self.constant_vars:
+            table['zenith'] = self.zenith
+        if 'time' in self.constant_vars:
+            table['time'] = self.vertex_time
+        if 'primary_energy' in self.constant_vars:
+            table['log_primary_energy'] = self.log_primary_energy
+        if 'fractional_energy_in_hadrons' in self.constant_vars:
+            table['fractional_energy_in_hadrons'] = self.fraction
+        if 'flavor' in self.constant_vars:
+            table['flavor'] = self.flavors.index(self.flavor)
+        if 'interaction_type' in self.constant_vars:
+            table['interaction_type'] = \
+                self.interaction_types.index(self.interaction_type)
+
+        # vertex (depends on the direction)
+        if 'vertex' in self.constant_vars:
+            vertices = [[self.vertex.x, self.vertex.y, self.vertex.z]]
+        else:
+            vertices = self._sample_vertices(
+                table['zenith'], table['azimuth'], random_state)
+        vertices = np.broadcast_to(vertices, (n, 3))
+        table['x'] = vertices[:, 0]
+        table['y'] = vertices[:, 1]
+        table['z'] = vertices[:, 2]
+        return table
+
+    def _write_kinematics_file(self, file_path):
+        """Write the pre-generated kinematics table to an .npz file.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to the .npz file.
+        """
+        directory = os.path.dirname(os.path.abspath(file_path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(file_path, 'wb') as open_file:
+            np.savez(open_file,
+                     kinematics=self.kinematics,
+                     flavors=np.array(self.flavors),
+                     interaction_types=np.array(self.interaction_types),
+                     seed=self.kinematics_seed)
+
+    def _sample_kinematics(self):
+        """Sample the kinematics of one event with the random_service.
+
+        Returns
+        -------
+        dict
+            The sampled values with the columns of KINEMATICS_DTYPE as keys.
+            The vertex is returned as I3Position under the key 'vertex'.
+        """
         # direction
         if 'azimuth' in self.constant_vars:
             azimuth = self.azimuth
@@ -389,14 +822,11 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
         else:
             log_primary_energy = self.random_service.uniform(
                                 *self.log_primary_energy_range) * I3Units.GeV
-        primary_energy = 10**log_primary_energy
         if 'fractional_energy_in_hadrons' in self.constant_vars:
             fraction = self.fraction
         else:
             fraction = self.random_service.uniform(
                                     *self.fractional_energy_in_hadrons_range)
-        hadron_energy = primary_energy * fraction
-        daughter_energy = primary_energy - hadron_energy
 
         # flavor and interaction
         if 'flavor' in self.constant_vars:
@@ -410,6 +840,90 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
             interaction_type = self.interaction_types[
                     self.random_service.integer(self.num_interaction_types)]
 
+        return {
+            'azimuth': azimuth,
+            'zenith': zenith,
+            'vertex': vertex,
+            'time': vertex_time,
+            'log_primary_energy': log_primary_energy,
+            'fractional_energy_in_hadrons': fraction,
+            'flavor': flavor,
+            'interaction_type': interaction_type,
+        }
+
+    def _get_pregenerated_kinematics(self, index):
+        """Get the kinematics of an event from the pre-generated table.
+
+        Parameters
+        ----------
+        index : int
+            The event number in the run.
+
+        Returns
+        -------
+        dict
+            The values of the event in the format of `_sample_kinematics`.
+        """
+        row = self.kinematics[index]
+        return {
+            'azimuth': float(row['azimuth']),
+            'zenith': float(row['zenith']),
+            'vertex': dataclasses.I3Position(
+                float(row['x']), float(row['y']), float(row['z'])),
+            'time': float(row['time']),
+            'log_primary_energy': float(row['log_primary_energy']),
+            'fractional_energy_in_hadrons': float(
+                row['fractional_energy_in_hadrons']),
+            'flavor': self.flavors[row['flavor']],
+            'interaction_type': self.interaction_types[
+                row['interaction_type']],
+        }
+
+    def _push_sampling_info(self):
+        """Push an S-frame with the vertex sampling statistics.
+        """
+        info = {}
+        if self.generation_volume is not None:
+            info['generation_volume'] = self.generation_volume
+            info['generation_volume_error'] = self.generation_volume_error
+        if self.kinematics is not None:
+            info['kinematics_seed'] = self.kinematics_seed
+        self.PushFrame(self.sampling_info.get_s_frame(**info))
+
+    def DAQ(self, frame):
+        """Inject casacdes into I3MCtree.
+
+        Parameters
+        ----------
+        frame : icetray.I3Frame.DAQ
+            An I3 q-frame.
+
+        Raises
+        ------
+        ValueError
+            If interaction type is unknown.
+        """
+        # --------------
+        # sample cascade
+        # --------------
+        self.sampling_info.start_event()
+        if self.kinematics is not None:
+            sample = self._get_pregenerated_kinematics(self.events_done)
+        else:
+            sample = self._sample_kinematics()
+        event_sampling_info = self.sampling_info.stop_event()
+        azimuth = sample['azimuth']
+        zenith = sample['zenith']
+        vertex = sample['vertex']
+        vertex_time = sample['time']
+        log_primary_energy = sample['log_primary_energy']
+        primary_energy = 10**log_primary_energy
+        fraction = sample['fractional_energy_in_hadrons']
+        hadron_energy = primary_energy * fraction
+        daughter_energy = primary_energy - hadron_energy
+        flavor = sample['flavor']
+        interaction_type = sample['interaction_type']
+
         # create pseduo I3MCWeightDict
         mc_dict = {}
         if interaction_type == 'cc':
@@ -418,6 +932,10 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
         else:
             # Neutral Current Interaction: 2
             mc_dict['InteractionType'] = 2
+        if self.generation_volume is not None:
+            mc_dict['GenerationVolume'] = self.generation_volume
+        if self.record_sampling_info:
+            mc_dict.update(event_sampling_info)
         frame['I3MCWeightDict'] = dataclasses.I3MapStringDouble(mc_dict)
 
         # create particle
@@ -503,4 +1021,6 @@ class NeutrinoFactory(icetray.I3ConditionalModule):
 
         self.events_done += 1
         if self.events_done >= self.num_events:
+            if self.record_sampling_info:
+                self._push_sampling_info()
             self.RequestSuspension()
@@ -21,6 +21,12 @@ class DAQFrameMultiplier(icetray.I3ConditionalModule):
         self.AddParameter('mctree_keys',
                           'The I3MCTree keys to multiply.',
                           ['I3MCTree_preMuonProp', 'I3MCTree'])
+        self.AddParameter('defer_oversampling',
+                          'If True, each event is only pushed once. The '
+                          'number of replicas is written to the '
+                          '"oversampling" descriptor and the replicas are '
+                          'created later on by the OversamplingExpander.',
+                          False)
 
     def Configure(self):
         """Configures DAQFrameMultiplier.
@@ -32,6 +38,7 @@ class DAQFrameMultiplier(icetray.I3ConditionalModule):
         """
         self.mctree_keys = self.GetParameter('mctree_keys')
         self.oversampling_factor = self.GetParameter('oversampling_factor')
+        self.defer_oversampling = self.GetParameter('defer_oversampling')
         if self.oversampling_factor is None:
             self.oversampling_factor = 1
         self.events_done = 0
@@ -52,6 +59,16 @@ class DAQFrameMultiplier(icetray.I3ConditionalModule):
 
         """
 
+        if self.defer_oversampling:
+            if self.oversampling_factor > 1:
+                frame['oversampling'] = dataclasses.I3MapStringInt({
+                    'event_num_in_run': self.events_done,
+                    'oversampling_factor': self.oversampling_factor,
+                })
+            self.PushFrame(frame)
+            self.events_done += 1
+            return
+
         trees = [frame[t] for t in self.mctree_keys]
 
         # oversampling
@@ -73,3 +90,69 @@ class DAQFrameMultiplier(icetray.I3ConditionalModule):
             self.PushFrame(frame)
 
         self.events_done += 1
+
+
+class OversamplingExpander(icetray.I3ConditionalModule):
+    def __init__(self, context):
+        """Class to create the replicas of deferred oversampled events.
+
+        Events written with a deferred oversampling descriptor, i.e. an
+        "oversampling" map with the keys 'event_num_in_run' and
+        'oversampling_factor', are expanded into 'oversampling_factor'
+        replicas. The replicas are identical to the ones created by the
+        DAQFrameMultiplier in non-deferred mode. All other frames are
+        passed through unchanged.
+
+        Parameters
+        ----------
+        context : TYPE
+            Description
+        """
+        icetray.I3ConditionalModule.__init__(self, context)
+        self.AddOutBox('OutBox')
+        self.AddParameter('mctree_keys',
+                          'The I3MCTree keys to multiply. Keys that do not '
+                          'exist in the frame are skipped.',
+                          ['I3MCTree_preMuonProp', 'I3MCTree'])
+
+    def Configure(self):
+        """Configures OversamplingExpander.
+        """
+        self.mctree_keys = self.GetParameter('mctree_keys')
+
+    def DAQ(self, frame):
+        """Expand the deferred oversampling descriptor.
+
+        Parameters
+        ----------
+        frame : icetray.I3Frame.DAQ
+            An I3 q-frame.
+
+        """
+        if 'oversampling' not in frame or \
+                'oversampling_factor' not in frame['oversampling']:
+            self.PushFrame(frame)
+            return
+
+        descriptor = frame['oversampling']
+        event_num_in_run = descriptor['event_num_in_run']
+        oversampling_factor = descriptor['oversampling_factor']
+
+        keys = [k for k in self.mctree_keys if k in frame]
+        trees = [frame[k] for k in keys]
+
+        for i in range(oversampling_factor):
+            if i > 0:
+                # create a new frame
+                frame = icetray.I3Frame(frame)
+
+                for key, tree in zip(keys, trees):
+                    del frame[key]
+                    frame[key] = dataclasses.I3MCTree(tree)
+
+            del frame['oversampling']
+            frame['oversampling'] = dataclasses.I3MapStringInt({
+                                    'event_num_in_run': event_num_in_run,
+                                    'oversampling_num': i,
+                                })
+            self.PushFrame(frame)
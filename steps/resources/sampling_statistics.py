@@ -0,0 +1,162 @@
+"""Book-keeping of the sampling and rejection effort of the factories.
+"""
+from __future__ import division
+import time
+
+import numpy as np
+
+from icecube import icetray, dataclasses
+
+
+# per-event counters and the corresponding I3MCWeightDict keys
+EVENT_COUNTERS = [
+    ('n_vertex_proposed', 'NumVertexDraws'),
+    ('n_minimizer_calls', 'NumMinimizerCalls'),
+    ('n_track_solver_calls', 'NumTrackSolverCalls'),
+    ('n_hull_distance_evaluations', 'NumHullDistanceEvaluations'),
+]
+
+
+def get_num_positions(pos):
+    """Get the number of positions passed to a distance function.
+
+    Parameters
+    ----------
+    pos : I3Position, list of I3Position or array-like shape=(N, 3)
+        Position(s).
+
+    Returns
+    -------
+    int
+        The number of positions.
+    """
+    if hasattr(pos, 'x'):
+        return 1
+    if np.ndim(pos) == 1:
+        return 1
+    return len(pos)
+
+
+class SamplingStatistics(object):
+    """Counters and timers of the sampling of a factory module.
+
+    The counters are accumulated for the whole run. Between `start_event`
+    and `stop_event` they are additionally accumulated for the current
+    event. Work done outside of an event, e.g. while configuring the
+    module, is only added to the run totals.
+
+    Parameters
+    ----------
+    name : str
+        The frame key of the run summary, e.g. 'CascadeFactorySamplingInfo'.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.totals = {key: 0 for key, _ in EVENT_COUNTERS}
+        self.totals['n_vertex_accepted'] = 0
+        self.n_events = 0
+        self.sampling_time = 0.
+        self.max_sampling_time = 0.
+        self.configure_time = 0.
+        self.event = None
+        self._start_time = None
+
+    def add(self, key, n=1):
+        """Increase a counter.
+
+        Parameters
+        ----------
+        key : str
+            Name of the counter.
+        n : int, optional
+            The increment.
+        """
+        self.totals[key] += n
+        if self.event is not None and key in self.event:
+            self.event[key] += n
+
+    def count_calls(self, distance_function):
+        """Wrap a hull distance function to count its evaluations.
+
+        Parameters
+        ----------
+        distance_function : callable
+            The distance function.
+
+        Returns
+        -------
+        callable
+            The wrapped distance function.
+        """
+        def counted_distance_function(pos, *args, **kwargs):
+            self.add('n_hull_distance_evaluations', get_num_positions(pos))
+            return distance_function(pos, *args, **kwargs)
+        return counted_distance_function
+
+    def start_event(self):
+        """Reset the per-event counters and start the event timer.
+        """
+        self.event = {key: 0 for key, _ in EVENT_COUNTERS}
+        self._start_time = time.time()
+
+    def stop_event(self):
+        """Stop the event timer.
+
+        Returns
+        -------
+        dict
+            The per-event counters and the sampling time in seconds, with
+            the I3MCWeightDict keys of EVENT_COUNTERS and 'SamplingTime'.
+        """
+        sampling_time = time.time() - self._start_time
+        self.n_events += 1
+        self.sampling_time += sampling_time
+        self.max_sampling_time = max(self.max_sampling_time, sampling_time)
+
+        event_info = {weight_key: self.event[key]
+                      for key, weight_key in EVENT_COUNTERS}
+        event_info['SamplingTime'] = sampling_time
+        self.event = None
+        return event_info
+
+    def get_summary(self):
+        """Get the aggregated statistics of the run.
+
+        Returns
+        -------
+        dict
+            The run totals, the acceptance rate of the vertex proposals and
+            the total, mean and maximum sampling time per event in seconds.
+        """
+        info = dict(self.totals)
+        info['n_events'] = self.n_events
+        info['sampling_time'] = self.sampling_time
+        info['max_sampling_time'] = self.max_sampling_time
+        info['configure_time'] = self.configure_time
+        if self.n_events > 0:
+            info['mean_sampling_time'] = self.sampling_time / self.n_events
+        if info['n_vertex_proposed'] > 0:
+            info['vertex_acceptance_rate'] = \
+                info['n_vertex_accepted'] / info['n_vertex_proposed']
+        return info
+
+    def get_s_frame(self, **additional_info):
+        """Create an S-frame with the run summary.
+
+        Parameters
+        ----------
+        **additional_info
+            Further values to add to the summary.
+
+        Returns
+        -------
+        I3Frame
+            The S-frame containing the summary as I3MapStringDouble.
+        """
+        info = self.get_summary()
+        info.update(additional_info)
+
+        s_frame = icetray.I3Frame(icetray.I3Frame.Stream('S'))
+        s_frame[self.name] = dataclasses.I3MapStringDouble(
+            {key: float(value) for key, value in info.items()})
+        return s_frame
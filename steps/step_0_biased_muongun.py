@@ -96,8 +96,11 @@ def main(cfg, run_number, scratch):
 
     if 'oversampling_factor' not in cfg:
         cfg['oversampling_factor'] = None
-    if 'oversample_after_proposal' in cfg and \
-            cfg['oversample_after_proposal']:
+    # deferred oversampling: replicas are created in the photon propagation
+    # step and therefore always share the propagated I3MCTree
+    defer_oversampling = cfg.get('defer_oversampling', False)
+    if defer_oversampling or ('oversample_after_proposal' in cfg and
+                              cfg['oversample_after_proposal']):
         oversampling_factor_injection = None
         oversampling_factor_photon = cfg['oversampling_factor']
     else:
@@ -156,7 +159,8 @@ def main(cfg, run_number, scratch):
 
     tray.AddModule(DAQFrameMultiplier, 'PostDAQFrameMultiplier',
                    oversampling_factor=oversampling_factor_photon,
-                   mctree_keys=['I3MCTree'])
+                   mctree_keys=['I3MCTree'],
+                   defer_oversampling=defer_oversampling)
 
     # --------------------------------------
     # Distance Splits
@@ -86,12 +86,23 @@ def main(cfg, run_number, scratch):
 
     if 'max_vertex_distance' not in cfg:
         cfg['max_vertex_distance'] = None
+    if 'hull_distance_grid_resolution' not in cfg:
+        cfg['hull_distance_grid_resolution'] = None
+    if 'sampling_block_size' not in cfg:
+        cfg['sampling_block_size'] = None
+    if 'hull_aware_proposal' not in cfg:
+        cfg['hull_aware_proposal'] = False
+    if 'record_sampling_info' not in cfg:
+        cfg['record_sampling_info'] = False
     if 'constant_vars' not in cfg:
         cfg['constant_vars'] = None
     if 'sample_uniformly_on_sphere' not in cfg:
         cfg['sample_uniformly_on_sphere'] = False
-    if 'oversample_after_proposal' in cfg and \
-            cfg['oversample_after_proposal']:
+    # deferred oversampling: replicas are created in the photon propagation
+    # step and therefore always share the propagated I3MCTree
+    defer_oversampling = cfg.get('defer_oversampling', False)
+    if defer_oversampling or ('oversample_after_proposal' in cfg and
+                              cfg['oversample_after_proposal']):
         oversampling_factor_injection = None
         oversampling_factor_photon = cfg['oversampling_factor']
     else:
@@ -112,6 +123,11 @@ def main(cfg, run_number, scratch):
                    y_range=cfg['y_range'],
                    z_range=cfg['z_range'],
                    max_vertex_distance=cfg['max_vertex_distance'],
+                   hull_distance_grid_resolution=cfg[
+                                        'hull_distance_grid_resolution'],
+                   sampling_block_size=cfg['sampling_block_size'],
+                   hull_aware_proposal=cfg['hull_aware_proposal'],
+                   record_sampling_info=cfg['record_sampling_info'],
                    flavors=cfg['flavors'],
                    interaction_types=cfg['interaction_types'],
                    num_events=cfg['n_events_per_run'],
@@ -136,7 +152,8 @@ def main(cfg, run_number, scratch):
         tray.AddModule(DummyMCTreeRenaming, 'DummyMCTreeRenaming')
 
     tray.AddModule(DAQFrameMultiplier, 'DAQFrameMultiplier',
-                   oversampling_factor=oversampling_factor_photon)
+                   oversampling_factor=oversampling_factor_photon,
+                   defer_oversampling=defer_oversampling)
 
     # --------------------------------------
     # Distance Splits
@@ -12,6 +12,7 @@ from icecube import icetray, dataclasses
 
 from utils import create_random_services, get_run_folder
 from resources import geometry
+from resources import detector_hull
 from resources.multi_cascade_factory import MultiCascadeFactory
 from resources.oversampling import DAQFrameMultiplier
 
@@ -93,13 +94,25 @@ def main(cfg, run_number, scratch):
                    # Prefix=gcdfile,
                    Stream=icetray.I3Frame.DAQ)
 
-    if 'oversample_after_proposal' in cfg and \
-            cfg['oversample_after_proposal']:
+    # deferred oversampling: replicas are created in the photon propagation
+    # step and therefore always share the propagated I3MCTree
+    defer_oversampling = cfg.get('defer_oversampling', False)
+    if defer_oversampling or ('oversample_after_proposal' in cfg and
+                              cfg['oversample_after_proposal']):
         oversampling_factor_injection = None
         oversampling_factor_photon = cfg['oversampling_factor']
     else:
         oversampling_factor_injection = cfg['oversampling_factor']
         oversampling_factor_photon = None
+
+    # build convex hull from the detector geometry in the GCD file
+    convex_hull_distance_function = cfg['convex_hull_distance_function']
+    if cfg.get('convex_hull_from_gcd', False):
+        convex_hull_distance_function = detector_hull.get_detector_hull(
+            cfg['gcd'],
+            strings=convex_hull_distance_function,
+            padding=cfg.get('convex_hull_padding', 0.)).prism
+
     tray.AddModule(
         MultiCascadeFactory, 'make_cascades',
         n_cascades=cfg['n_cascades'],
@@ -120,8 +133,11 @@ def main(cfg, run_number, scratch):
         max_vertex_distance=cfg['max_vertex_distance'],
         max_track_distance=cfg['max_track_distance'],
         min_track_length=cfg['min_track_length'],
-        convex_hull_distance_function=cfg[
-            'convex_hull_distance_function'],
+        convex_hull_distance_function=convex_hull_distance_function,
+        hull_distance_grid_resolution=cfg.get(
+            'hull_distance_grid_resolution', None),
+        hull_aware_proposal=cfg.get('hull_aware_proposal', False),
+        record_sampling_info=cfg.get('record_sampling_info', False),
         flavors=cfg['flavors'],
         interaction_types=cfg['interaction_types'],
         num_events=cfg['n_events_per_run'],
@@ -145,7 +161,8 @@ def main(cfg, run_number, scratch):
         tray.AddModule(DummyMCTreeRenaming, 'DummyMCTreeRenaming')
 
     tray.AddModule(DAQFrameMultiplier, 'DAQFrameMultiplier',
-                   oversampling_factor=oversampling_factor_photon)
+                   oversampling_factor=oversampling_factor_photon,
+                   defer_oversampling=defer_oversampling)
 
     # --------------------------------------
     # Distance Splits
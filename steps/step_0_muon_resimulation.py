@@ -14,7 +14,8 @@ from I3Tray import I3Tray, I3Units
 from icecube import icetray, dataclasses
 
 from utils import create_random_services, get_run_folder
-from resources.geometry import get_intersections
+from resources.geometry import ConvexHullIndex
+from resources import detector_hull
 
 
 def create_muon(azimuth_range=[0, 360],
@@ -71,7 +72,7 @@ def create_muon(azimuth_range=[0, 360],
                 anchor point, e.g. how far away
                 to set the vertex of the point
 
-    convex_hull : scipy.spatial.ConvexHull
+    convex_hull : ConvexHullIndex
                  defining the desired convex volume
 
     extend_past_hull: float
@@ -114,20 +115,14 @@ def create_muon(azimuth_range=[0, 360],
     # calculate vertex
     # ------
     if convex_hull is not None:
-        t_s = get_intersections(convex_hull,
-                                v_pos=(anchor_x,
-                                       anchor_y,
-                                       anchor_z),
-                                v_dir=(muon.dir.x,
-                                       muon.dir.y,
-                                       muon.dir.z),
-                                eps=1e-4)
-
-        length_to_go_back = - t_s[t_s <= 0.0]
-        assert len(length_to_go_back) == 1, \
+        t_entry, t_exit = convex_hull.clip(
+            v_pos=(anchor_x, anchor_y, anchor_z),
+            v_dir=(muon.dir.x, muon.dir.y, muon.dir.z))[0]
+
+        assert t_entry <= 0. and t_exit >= 0., \
             'Is anchor point within convex_hull?'
 
-        length_to_go_back = length_to_go_back[0]
+        length_to_go_back = -t_entry
 
         # extend past convex hull
         length_to_go_back += extend_past_hull
@@ -204,10 +199,15 @@ def main(cfg, run_number, scratch):
         n_services=2)
 
     # create convex hull
-    if 'use_convex_hull' in cfg and cfg['use_convex_hull']:
+    if 'use_convex_hull' in cfg and cfg['use_convex_hull'] and \
+            cfg.get('convex_hull_from_gcd', False):
+        convex_hull = detector_hull.get_detector_hull(
+            cfg['gcd'],
+            padding=cfg.get('convex_hull_padding', 0.)).convex_hull_index
+
+    elif 'use_convex_hull' in cfg and cfg['use_convex_hull']:
 
         # hardcode icecube corner points
-        # ToDo: read from geometry file
         points = [
            [-570.90002441, -125.13999939, 501],  # string 31
            [-256.14001465, -521.08001709, 501],  # string 1
@@ -227,7 +227,7 @@ def main(cfg, run_number, scratch):
            [  22.11000061,  509.5       , -502],  # string 78
            [-347.88000488,  451.51998901, -502],  # string 75
             ]
-        convex_hull = ConvexHull(points)
+        convex_hull = ConvexHullIndex(ConvexHull(points))
     else:
         convex_hull = None
 
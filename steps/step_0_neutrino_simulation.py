@@ -12,6 +12,7 @@ from icecube import icetray, dataclasses
 
 from utils import create_random_services, get_run_folder
 from resources import geometry
+from resources import detector_hull
 from resources.neutrino_factory import NeutrinoFactory
 from resources.oversampling import DAQFrameMultiplier
 
@@ -89,13 +90,38 @@ def main(cfg, run_number, scratch):
 
     if 'sample_uniformly_on_sphere' not in cfg:
         cfg['sample_uniformly_on_sphere'] = False
-    if 'oversample_after_proposal' in cfg and \
-            cfg['oversample_after_proposal']:
+    # deferred oversampling: replicas are created in the photon propagation
+    # step and therefore always share the propagated I3MCTree
+    defer_oversampling = cfg.get('defer_oversampling', False)
+    if defer_oversampling or ('oversample_after_proposal' in cfg and
+                              cfg['oversample_after_proposal']):
         oversampling_factor_injection = None
         oversampling_factor_photon = cfg['oversampling_factor']
     else:
         oversampling_factor_injection = cfg['oversampling_factor']
         oversampling_factor_photon = None
+
+    # sidecar file with the pre-generated kinematics next to the final
+    # output file (scratch files are only copied if they are i3 files)
+    if cfg.get('pregenerate_kinematics', False):
+        kinematics_file = cfg['outfile_pattern'].format(**cfg)
+        kinematics_file = kinematics_file.replace(' ', '0')
+        for ext in ['.bz2', '.gz', '.zst', '.i3']:
+            if kinematics_file.endswith(ext):
+                kinematics_file = kinematics_file[:-len(ext)]
+        kinematics_file += '_kinematics.npz'
+        click.echo('Kinematics file: {}'.format(kinematics_file))
+    else:
+        kinematics_file = None
+
+    # build convex hull from the detector geometry in the GCD file
+    convex_hull_distance_function = cfg['convex_hull_distance_function']
+    if cfg.get('convex_hull_from_gcd', False):
+        convex_hull_distance_function = detector_hull.get_detector_hull(
+            cfg['gcd'],
+            strings=convex_hull_distance_function,
+            padding=cfg.get('convex_hull_padding', 0.)).prism
+
     tray.AddModule(
         NeutrinoFactory, 'make_neutrinos',
         azimuth_range=cfg['azimuth_range'],
@@ -112,14 +138,19 @@ def main(cfg, run_number, scratch):
         shift_vertex_distance=cfg['shift_vertex_distance'],
         max_vertex_distance=cfg['max_vertex_distance'],
         max_track_distance=cfg['max_track_distance'],
-        convex_hull_distance_function=cfg[
-            'convex_hull_distance_function'],
+        convex_hull_distance_function=convex_hull_distance_function,
+        hull_distance_grid_resolution=cfg.get(
+            'hull_distance_grid_resolution', None),
+        hull_aware_proposal=cfg.get('hull_aware_proposal', False),
+        record_sampling_info=cfg.get('record_sampling_info', False),
         flavors=cfg['flavors'],
         interaction_types=cfg['interaction_types'],
         num_events=cfg['n_events_per_run'],
         oversampling_factor=oversampling_factor_injection,
         random_service=random_services[0],
         constant_vars=cfg['constant_vars'],
+        pregenerate_kinematics=cfg.get('pregenerate_kinematics', False),
+        kinematics_file=kinematics_file,
         )
 
     # propagate muons if config exists in config
@@ -137,7 +168,8 @@ def main(cfg, run_number, scratch):
         tray.AddModule(DummyMCTreeRenaming, 'DummyMCTreeRenaming')
 
     tray.AddModule(DAQFrameMultiplier, 'DAQFrameMultiplier',
-                   oversampling_factor=oversampling_factor_photon)
+                   oversampling_factor=oversampling_factor_photon,
+                   defer_oversampling=defer_oversampling)
 
     # --------------------------------------
     # Distance Splits
@@ -17,6 +17,7 @@ from I3Tray import I3Tray
 from icecube import icetray, dataclasses, dataio, phys_services
 from utils import create_random_services, get_run_folder
 from dom_distance_cut import generate_stream_object
+from resources.oversampling import OversamplingExpander
 
 
 MAX_PARALLEL_EVENTS = 50
@@ -53,6 +54,9 @@ def process_single_stream(cfg, infile, outfile):
     tray.context['I3RandomService'] = random_service
     tray.Add('I3Reader', FilenameList=[cfg['gcd'], infile])
 
+    # create replicas of events written with deferred oversampling
+    tray.Add(OversamplingExpander)
+
     if hybrid_mode:
         cascade_tables = segments.LoadCascadeTables(IceModel=cfg['icemodel'],
                                                     TablePath=SPLINE_TABLES)
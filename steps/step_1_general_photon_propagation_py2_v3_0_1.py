@@ -1,5 +1,7 @@
 #!/bin/sh /cvmfs/icecube.opensciencegrid.org/py2-v3.0.1/icetray-start
 #METAPROJECT simulation/V06-01-02
+# process_single_stream of the general step, including the
+# OversamplingExpander for defer_oversampling, is reused as is
 from step_1_general_photon_propagation import *
 
 if __name__ == '__main__':
@@ -9,6 +9,7 @@ from I3Tray import I3Tray
 from icecube import icetray
 
 from utils import create_random_services, get_run_folder
+from resources.oversampling import OversamplingExpander
 
 
 @click.command()
@@ -84,6 +85,9 @@ def main(cfg, run_number, scratch):
     tray.AddModule('I3Reader', 'i3 reader',
                    FilenameList=[cfg['gcd_pass2'], infile])
 
+    # create replicas of events written with deferred oversampling
+    tray.AddModule(OversamplingExpander, 'OversamplingExpander')
+
     # run PPC
     tray.context["I3RandomService"] = random_service
     tray.AddModule("i3ppc", 'ppc', **ppc_arguments)
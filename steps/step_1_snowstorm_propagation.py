@@ -49,6 +49,7 @@ from icecube.snowstorm import all_parametrizations
 
 from utils import create_random_services, get_run_folder
 from resources import snowstorm_perturbers
+from resources.oversampling import OversamplingExpander
 
 
 # ----------------
@@ -424,6 +425,11 @@ def run_snowstorm_propagation(cfg, infile, outfile):
         # Add Bumper to stop the tray after NumEventsPerModel Q-frames
         tray.Add(Bumper, NumFrames=cfg['NumEventsPerModel'])
 
+        # create replicas of events written with deferred oversampling.
+        # This is done after the Bumper so that all replicas of an event
+        # are simulated with the same ice model.
+        tray.Add(OversamplingExpander)
+
         # initialize CLSim server and setup the propagators
         server_location = tempfile.mkstemp(prefix='clsim-server-')[1]
         address = 'ipc://'+server_location
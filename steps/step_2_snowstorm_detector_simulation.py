@@ -10,7 +10,7 @@ import yaml
 from icecube.simprod import segments
 from I3Tray import I3Tray
 from icecube import icetray, dataclasses, dataio, phys_services
-from utils import create_random_services, get_run_folder
+from utils import create_random_services, get_run_folder, run_bundle
 
 # Load libraries
 from icecube import clsim
@@ -156,4 +156,4 @@ def main(cfg, run_number, scratch):
 
 
 if __name__ == '__main__':
-    main()
+    run_bundle(main)
@@ -15,7 +15,7 @@ from icecube.STTools.seededRT.configuration_services import \
     I3DOMLinkSeededRTConfigurationService
 from icecube import filter_tools
 
-from utils import get_run_folder
+from utils import get_run_folder, run_bundle
 from step_3_pass2_get_pulses import MergeOversampledEvents
 
 
@@ -202,4 +202,4 @@ def main(cfg, run_number, scratch, do_merging_if_necessary):
 
 
 if __name__ == '__main__':
-    main()
+    run_bundle(main)
@@ -18,7 +18,7 @@ from icecube.icetray import I3PacketModule, I3Units
 from icecube.filterscripts.offlineL2.level2_all_filters import OfflineFilter
 from icecube.filterscripts.offlineL2 import SpecialWriter
 
-from utils import get_run_folder
+from utils import get_run_folder, run_bundle
 
 
 PHOTONICS_DIR = '/cvmfs/icecube.opensciencegrid.org/data/photon-tables'
@@ -83,4 +83,4 @@ def main(cfg, run_number, scratch):
 
 
 if __name__ == '__main__':
-    main()
+    run_bundle(main)
@@ -1,8 +1,16 @@
-import numpy as np
+import os
+import sys
+import glob
+import shutil
+import traceback
 import importlib
 
+import numpy as np
+import yaml
+
 MAX_DATASET_NUMBER = 100000
 MAX_RUN_NUMBER = 100000
+RUNS_PER_FOLDER = 1000
 
 
 def create_random_services_settings(
@@ -71,13 +79,97 @@ def create_random_services(dataset_number, run_number, seed, n_services=1,
     return random_services, int_run_number
 
 
-def get_run_folder(run_number, runs_per_folder=1000):
+def get_run_folder(run_number, runs_per_folder=RUNS_PER_FOLDER):
     fill = int(np.log10(MAX_RUN_NUMBER) + 0.5)
     start = (run_number // runs_per_folder) * runs_per_folder
     stop = start + runs_per_folder - 1
     return '{}-{}'.format(str(start).zfill(fill), str(stop).zfill(fill))
 
 
+def call_main(main, args):
+    """Call a click command and get its exit code.
+
+    Parameters
+    ----------
+    main : click.Command
+        The command.
+    args : list of str
+        The command line arguments.
+
+    Returns
+    -------
+    int
+        The exit code, 1 if an exception was raised.
+    """
+    try:
+        main.main(args=args, standalone_mode=False)
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def run_bundle(main):
+    """Process the runs of a job bundle in this process.
+
+    Steps, whose main can be called repeatedly, call run_bundle(main)
+    instead of main(). Job scripts of bundled runs with
+    runs_per_job_in_process set the environment variable BUNDLE_RUNS to
+    the runs which are processed before the run given on the command
+    line. Their output is copied or removed like the job templates do for
+    a single run and their exit codes are appended to the file
+    BUNDLE_EXIT_CODES.
+
+    Parameters
+    ----------
+    main : click.Command
+        The main function of the step with the arguments cfg and
+        run_number and the option --scratch/--no-scratch.
+    """
+    runs = os.environ.get('BUNDLE_RUNS', '').split()
+    if runs:
+        cfg_file = sys.argv[1]
+        args = sys.argv[3:]
+        scratch = '--no-scratch' not in args
+        with open(cfg_file, 'r') as stream:
+            if int(yaml.__version__[0]) < 5:
+                # backwards compatibility for yaml versions before version 5
+                cfg = yaml.load(stream)
+            else:
+                cfg = yaml.full_load(stream)
+        keep_crashed_files = cfg['keep_crashed_files']
+
+        for run in runs:
+            run_number = int(run)
+            final_out = cfg['outfile_pattern'].format(
+                run_number=run_number, run_folder=get_run_folder(run_number))
+            final_out = final_out.replace(' ', '0')
+            exit_code = call_main(main, [cfg_file, run] + args)
+            print('IceTray finished run {} with Exit Code: {}'.format(
+                run, exit_code))
+            if scratch:
+                if exit_code == 0 or keep_crashed_files:
+                    output_folder = os.path.dirname(final_out)
+                    for file_name in glob.glob('*.i3.bz2'):
+                        shutil.copy(file_name, output_folder)
+                for file_name in glob.glob('*.i3.bz2'):
+                    os.remove(file_name)
+            elif exit_code != 0 and not keep_crashed_files:
+                print('Deleting partially processed file! ' + final_out)
+                if os.path.isfile(final_out):
+                    os.remove(final_out)
+            if 'BUNDLE_EXIT_CODES' in os.environ:
+                with open(os.environ['BUNDLE_EXIT_CODES'], 'a') as f:
+                    f.write('{} {}\n'.format(run, exit_code))
+    main()
+
+
 def load_class(full_class_string):
     """
     dynamically load a class from a string
@@ -0,0 +1,293 @@
+import os
+import bz2
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+import yaml
+
+from steps.utils import get_run_folder
+
+try:
+    from icecube import dataio, icetray
+except ImportError:
+    # without icetray only the bz2 streams are checked
+    dataio = None
+
+CACHE_FILE = 'verify_cache.json'
+CHUNK_SIZE = 1024 * 1024
+
+
+def check_bz2(path):
+    """Decompress a bz2 file to its end.
+
+    Files with several concatenated bz2 streams are supported.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+
+    Returns
+    -------
+    str or None
+        The error, None if the file is intact.
+    """
+    decompressor = bz2.BZ2Decompressor()
+    in_stream = False
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(CHUNK_SIZE)
+            if not data:
+                break
+            while data:
+                try:
+                    decompressor.decompress(data)
+                except (IOError, OSError, EOFError, ValueError) as e:
+                    return 'bz2 error: {}'.format(e)
+                in_stream = not decompressor.eof
+                if decompressor.eof:
+                    # a new stream may follow the end of the current one
+                    data = decompressor.unused_data
+                    decompressor = bz2.BZ2Decompressor()
+                else:
+                    data = b''
+    if in_stream:
+        return 'bz2 error: truncated stream'
+    return None
+
+
+def count_events(path):
+    """Read an I3 file to its end and count the DAQ frames.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+
+    Returns
+    -------
+    int or None
+        The number of DAQ frames, None if icetray is not available.
+    str or None
+        The error, None if the file could be read.
+    """
+    if dataio is None:
+        return None, None
+    n_events = 0
+    try:
+        i3_file = dataio.I3File(path)
+        while i3_file.more():
+            frame = i3_file.pop_frame()
+            if frame.Stop == icetray.I3Frame.DAQ:
+                n_events += 1
+        i3_file.close()
+    except Exception as e:
+        return None, 'i3 error: {}'.format(e)
+    return n_events, None
+
+
+def verify_file(path):
+    """Check the integrity of an output file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+
+    Returns
+    -------
+    dict
+        The 'error' (None if the file is intact) and the number of
+        events ('n_events', None if not counted).
+    """
+    error = None
+    n_events = None
+    try:
+        if os.path.getsize(path) == 0:
+            return {'error': 'empty file', 'n_events': n_events}
+        if path.endswith('.bz2'):
+            error = check_bz2(path)
+        if error is None:
+            n_events, error = count_events(path)
+    except (IOError, OSError) as e:
+        # e.g. removed or not readable since the outputs were listed
+        error = 'os error: {}'.format(e)
+    return {'error': error, 'n_events': n_events}
+
+
+def get_expected_events(config):
+    """Get the number of events each run of the step should contain.
+
+    Parameters
+    ----------
+    config : dict
+        The config of the step.
+
+    Returns
+    -------
+    int or None
+        The number of events, None if it is not known.
+    """
+    if config.get('n_events_per_run', None) is None:
+        return None
+    n_events = config['n_events_per_run']
+    oversampling_factor = config.get('oversampling_factor', None)
+    if oversampling_factor is not None:
+        # deferred replicas are created in the step after step 0
+        if not (config.get('defer_oversampling', False) and
+                config['step'] == 0):
+            n_events *= oversampling_factor
+    return n_events
+
+
+def load_cache(cache_path):
+    if os.path.isfile(cache_path):
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def store_cache(cache_path, cache):
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f)
+    os.rename(tmp_path, cache_path)
+
+
+def get_output_files(config):
+    """Get the existing outputs of the runs of a step.
+
+    Parameters
+    ----------
+    config : dict
+        The filled config of the step.
+
+    Returns
+    -------
+    list of str
+        The paths of the existing outputs.
+    """
+    existing_files = {}
+    outputs = []
+    for i in range(config['n_runs']):
+        final_out = config['outfile_pattern'].format(
+            run_number=i, run_folder=get_run_folder(i))
+        final_out = final_out.replace(' ', '0')
+        output_folder = os.path.dirname(final_out)
+        # list each run folder once instead of a stat per run
+        if output_folder not in existing_files:
+            if os.path.isdir(output_folder):
+                existing_files[output_folder] = set(os.listdir(output_folder))
+            else:
+                existing_files[output_folder] = set()
+        if os.path.basename(final_out) in existing_files[output_folder]:
+            outputs.append(final_out)
+    return outputs
+
+
+def verify_outputs(paths, cache, n_jobs=1):
+    """Verify files in parallel, unchanged files are taken from the cache.
+
+    Parameters
+    ----------
+    paths : list of str
+        The files to verify.
+    cache : dict
+        The results of earlier verifications, updated in place. Results
+        are reused if the mtime and the size of the file are unchanged
+        and the I3 frames were read, or still can not be read, as well.
+    n_jobs : int, optional
+        Number of parallel processes.
+
+    Returns
+    -------
+    dict
+        The result of verify_file for each path.
+    """
+    results = {}
+    to_verify = []
+    stats = {}
+    read_frames = dataio is not None
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stats[path] = [st.st_mtime, st.st_size]
+        except OSError:
+            stats[path] = None
+        entry = cache.get(path, None)
+        if entry is not None and entry['stat'] == stats[path] and \
+                entry.get('read_frames', False) == read_frames:
+            results[path] = entry['result']
+        else:
+            to_verify.append(path)
+
+    if to_verify:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            chunksize = max(1, len(to_verify) // (4 * n_jobs))
+            with click.progressbar(
+                    executor.map(verify_file, to_verify, chunksize=chunksize),
+                    length=len(to_verify)) as bar:
+                for path, result in zip(to_verify, bar):
+                    results[path] = result
+                    if stats[path] is not None:
+                        cache[path] = {'stat': stats[path], 'result': result,
+                                       'read_frames': read_frames}
+    return results
+
+
+@click.command()
+@click.argument('config_file', type=click.Path(exists=True))
+@click.option('-j', '--n_jobs', default=1,
+              help='Number of parallel processes')
+@click.option('--check_events/--no-check_events', default=False,
+              help='Check the number of events against n_events_per_run '
+                   'times oversampling_factor. Only for steps that keep '
+                   'all events.')
+@click.option('--remove/--no-remove', default=False,
+              help='Rename broken outputs to *.corrupt, so that --resume '
+                   'processes the runs again.')
+def main(config_file, n_jobs, check_events, remove):
+    """Verify the outputs of a step.
+
+    CONFIG_FILE is the filled config of the step in its processing
+    folder.
+    """
+    config_file = click.format_filename(config_file)
+    with open(config_file, 'r') as stream:
+        config = yaml.full_load(stream)
+    if dataio is None:
+        click.echo('icetray not found, only the bz2 streams are checked!')
+
+    outputs = get_output_files(config)
+    click.echo('Verifying {} outputs with {} processes!'.format(
+        len(outputs), n_jobs))
+    cache_path = os.path.join(config['processing_folder'], CACHE_FILE)
+    cache = load_cache(cache_path)
+    try:
+        results = verify_outputs(outputs, cache, n_jobs=n_jobs)
+    finally:
+        store_cache(cache_path, cache)
+
+    expected_events = None
+    if check_events:
+        expected_events = get_expected_events(config)
+    broken = []
+    for path in outputs:
+        error = results[path]['error']
+        n_events = results[path]['n_events']
+        if error is None and expected_events is not None and \
+                n_events is not None and n_events != expected_events:
+            error = 'found {} instead of {} events'.format(
+                n_events, expected_events)
+        if error is not None:
+            broken.append(path)
+            click.echo('{}: {}'.format(path, error))
+            if remove and os.path.isfile(path):
+                os.rename(path, path + '.corrupt')
+    click.echo('{} of {} outputs are broken!'.format(
+        len(broken), len(outputs)))
+
+
+if __name__ == '__main__':
+    main()